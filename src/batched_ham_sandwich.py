@@ -0,0 +1,319 @@
+"""
+Description:
+Batched version of the (unweighted) ham-sandwich algo in ham_sandwich.py.
+
+All regions of a level are independent instances, so instead of running one bisection loop per region
+the dual lines of every region are stored as one segmented array (one segment per region and color) and
+all searches are advanced in lockstep, with the median levels of every segment computed by a single sort.
+The same floating-point operations as get_ham_sandwich_cut are used, so the cuts are identical.
+Regions that need exact arithmetic (see get_ham_sandwich_cut) or have multiplicities are solved one at a time.
+"""
+
+from typing import Optional
+
+import numpy as np
+from shapely import get_coordinates
+
+from ham_sandwich import (
+    _dual_to_cut,
+    get_ham_sandwich_cut,
+    level_crossings,
+)
+from point_set import ColorPointSet
+from utils.exact import has_degenerate_duals
+from utils.geometry import Line
+
+
+def _group_starts(group_lens: np.ndarray) -> np.ndarray:
+    return np.cumsum(group_lens) - group_lens
+
+
+def _grouped_medians(group: np.ndarray, y: np.ndarray, local_idx: np.ndarray, pert_idx: np.ndarray):
+    """
+    Perturbed median level of each group of lines (see find_perturbed_median_level), where
+    group is non-decreasing. Returns (levels, perturbation indices, group sizes, order of the lines
+    within their group).
+    """
+    # for tied levels the line with the smaller index is higher
+    order = np.lexsort((-local_idx, y, group))
+    group_lens = np.diff(np.flatnonzero(np.diff(group, prepend=-1, append=group[-1] + 1)))
+    starts = _group_starts(group_lens)
+    half = group_lens // 2
+    odd = group_lens % 2 == 1
+    upper = order[starts + half]
+    lower = order[starts + half - (~odd)]
+    level = np.where(odd, y[upper], (y[lower] + y[upper]) / 2)
+    pert = np.where(odd, pert_idx[upper], np.minimum(pert_idx[lower], pert_idx[upper]))
+    return level, pert, group_lens, order
+
+
+def _level_signs(level: np.ndarray, pert: np.ndarray) -> np.ndarray:
+    # vectorized ham_sandwich._perturbed_sign for pairs of groups (2 * i, 2 * i + 1)
+    sign = np.sign(level[0::2] - level[1::2]).astype(int)
+    ties = sign == 0
+    sign[ties] = np.where(pert[0::2][ties] < pert[1::2][ties], 1, -1)
+    return sign
+
+
+class _SegmentedDuals:
+    """
+    Dual lines of several 2-color point sets. Segment 2 * r + c holds the duals of color c of region r,
+    and segments are stored contiguously in order.
+    """
+
+    def __init__(self, point_sets: list[ColorPointSet]) -> None:
+        self.n_regions = len(point_sets)
+        coords = [
+            get_coordinates(list(p_s.color_sets[c]))
+            for p_s in point_sets
+            for c in (0, 1)
+        ]
+        self.seg_lens = np.array([len(xy) for xy in coords], dtype=int)
+        self.seg = np.repeat(np.arange(len(coords)), self.seg_lens)
+        self.region = self.seg // 2
+        self.region_lens = self.seg_lens[0::2] + self.seg_lens[1::2]
+        self.region_starts = _group_starts(self.region_lens)
+        xy = np.concatenate(coords)
+        # dual of point (x, y) is the line with slope x, y-intercept -y
+        self.slopes = xy[:, 0]
+        self.y_ints = -xy[:, 1]
+        # index of each line within its color, and within its region (i.e., perturbation index)
+        self.local_idx = np.arange(len(xy)) - _group_starts(self.seg_lens)[self.seg]
+        n1 = self.seg_lens[0::2]
+        self.pert_idx = self.local_idx + np.where(self.seg % 2 == 1, n1[self.region], 0)
+
+    def evaluate(self, regions: np.ndarray, x: np.ndarray):
+        """
+        Evaluate the perturbed median levels of the given regions at x (one value per region, regions
+        may repeat). Returns (levels, perturbation indices, segment ranks), where levels holds the
+        levels of both colors for each evaluation and segment ranks is the rank of every line
+        within its segment (lines in the order of the evaluations).
+        """
+        lens = self.region_lens[regions]
+        inst = np.repeat(np.arange(len(regions)), lens)
+        lines = self.region_starts[regions][inst] + (
+            np.arange(len(inst)) - _group_starts(lens)[inst]
+        )
+        y = self.y_ints[lines] + (x[inst] * self.slopes[lines])
+        group = 2 * inst + (self.seg[lines] % 2)
+        level, pert, group_lens, order = _grouped_medians(
+            group, y, self.local_idx[lines], self.pert_idx[lines]
+        )
+        ranks = np.empty(len(lines), dtype=int)
+        ranks[order] = np.arange(len(lines)) - np.repeat(_group_starts(group_lens), group_lens)
+        return level, pert, ranks
+
+    def lines_of(self, regions: np.ndarray) -> np.ndarray:
+        # indices of all lines of the given (distinct, increasing) regions
+        return np.flatnonzero(np.isin(self.region, regions))
+
+
+def _medians_at_infinity(duals: _SegmentedDuals, direction: int):
+    """
+    Vectorized ham_sandwich._median_at_infinity, returns (slopes, y-intercepts, perturbation indices)
+    for every segment.
+    """
+    order = np.lexsort(
+        (-duals.local_idx, duals.y_ints, direction * duals.slopes, duals.seg)
+    )
+    starts = _group_starts(duals.seg_lens)
+    half = duals.seg_lens // 2
+    odd = duals.seg_lens % 2 == 1
+    upper = order[starts + half]
+    lower = order[starts + half - (~odd)]
+    slope = np.where(odd, duals.slopes[upper], (duals.slopes[lower] + duals.slopes[upper]) / 2)
+    y_int = np.where(odd, duals.y_ints[upper], (duals.y_ints[lower] + duals.y_ints[upper]) / 2)
+    pert = np.where(odd, duals.pert_idx[upper], np.minimum(duals.pert_idx[lower], duals.pert_idx[upper]))
+    return slope, y_int, pert
+
+
+def _vertex_bounds(duals: _SegmentedDuals) -> np.ndarray:
+    # vectorized ham_sandwich._vertex_bound (over both colors) for every region
+    order = np.lexsort((duals.slopes, duals.region))
+    slopes = duals.slopes[order]
+    region = duals.region[order]
+    gaps = np.diff(slopes)
+    same = (region[1:] == region[:-1]) & (gaps != 0)
+    min_gap = np.full(duals.n_regions, np.inf)
+    np.minimum.at(min_gap, region[1:][same], gaps[same])
+    y_max = np.full(duals.n_regions, -np.inf)
+    y_min = np.full(duals.n_regions, np.inf)
+    np.maximum.at(y_max, duals.region, duals.y_ints)
+    np.minimum.at(y_min, duals.region, duals.y_ints)
+    bounds = np.zeros(duals.n_regions)
+    has_gap = ~np.isinf(min_gap)
+    bounds[has_gap] = (y_max[has_gap] - y_min[has_gap]) / min_gap[has_gap]
+    return bounds
+
+
+def _search_brackets(duals: _SegmentedDuals):
+    """
+    Vectorized ham_sandwich._search_bracket. Returns (left ends, right ends, has crossing).
+    """
+    bound = _vertex_bounds(duals) + 1
+    ends = []
+    signs = []
+    for direction in (-1, 1):
+        slope, y_int, pert = _medians_at_infinity(duals, direction)
+        s1, s2 = slope[0::2], slope[1::2]
+        b1, b2 = y_int[0::2], y_int[1::2]
+        tied = s1 == s2
+        root = np.full(duals.n_regions, np.nan)
+        root[~tied] = (b2[~tied] - b1[~tied]) / (s1[~tied] - s2[~tied])
+        end = direction * bound
+        beyond = ~tied & (direction * root >= bound)
+        end[beyond] = 2 * root[beyond]
+        sign = np.sign(direction * (s1 - s2)).astype(int)
+        sign[tied] = _level_signs(np.stack([b1, b2], 1).ravel(), pert)[tied]
+        ends.append(end)
+        signs.append(sign)
+    return ends[0], ends[1], signs[0] != signs[1]
+
+
+def _intersection_xs(duals: _SegmentedDuals, left_ranks, right_ranks, left_x, right_x):
+    """
+    Vectorized ham_sandwich.get_intersection_xs for every segment, given the ranks of the lines at
+    the ends of the intervals. Returns (regions, xs).
+    """
+    # lines in their order at the left end of their segment
+    by_left = np.lexsort((left_ranks, duals.seg))
+    seg = duals.seg[by_left]
+    r = right_ranks[by_left]
+    max_disp = int(np.max(np.abs(r - left_ranks[by_left]))) if len(r) > 0 else 0
+    regions = []
+    xs = []
+    for delta in range(1, 2 * max_disp + 1):
+        (p,) = np.nonzero((seg[:-delta] == seg[delta:]) & (r[:-delta] > r[delta:]))
+        l1, l2 = by_left[p], by_left[p + delta]
+        # same as get_line_intersection_x(l1, l2)
+        parallel = np.isclose(duals.slopes[l1], duals.slopes[l2])
+        l1, l2 = l1[~parallel], l2[~parallel]
+        x = (duals.y_ints[l2] - duals.y_ints[l1]) / (duals.slopes[l1] - duals.slopes[l2])
+        region = duals.region[l1]
+        inside = (left_x[region] < x) & (x < right_x[region])
+        regions.append(region[inside])
+        xs.append(x[inside])
+    if len(xs) == 0:
+        return np.empty(0, dtype=int), np.empty(0)
+    return np.concatenate(regions), np.concatenate(xs)
+
+
+def _median_intersections(duals, regions, left_x, right_x, left_ranks, right_ranks):
+    """
+    Vectorized ham_sandwich.median_intersection for the given regions (the ranks of the lines of
+    every other region must be 0). Returns the cuts for each region.
+    """
+    bp_regions, bp_xs = _intersection_xs(duals, left_ranks, right_ranks, left_x, right_x)
+    bp_regions = np.concatenate([bp_regions, regions, regions])
+    bp_xs = np.concatenate([bp_xs, left_x[regions], right_x[regions]])
+    # sorted unique breakpoints of each region
+    order = np.lexsort((bp_xs, bp_regions))
+    bp_regions, bp_xs = bp_regions[order], bp_xs[order]
+    keep = np.ones(len(bp_xs), dtype=bool)
+    keep[1:] = (bp_regions[1:] != bp_regions[:-1]) | (bp_xs[1:] != bp_xs[:-1])
+    bp_regions, bp_xs = bp_regions[keep], bp_xs[keep]
+
+    level, pert, _ = duals.evaluate(bp_regions, bp_xs)
+    cuts = {}
+    bounds = np.flatnonzero(np.diff(bp_regions, prepend=-1, append=duals.n_regions))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        r = bp_regions[start]
+        levels = [
+            (
+                bp_xs[b],
+                (level[2 * b], pert[2 * b]),
+                (level[2 * b + 1], pert[2 * b + 1]),
+            )
+            for b in range(start, end)
+        ]
+
+        def level_sign(x, r=r):
+            lvl, prt, _ = duals.evaluate(np.array([r]), np.array([x]))
+            return int(_level_signs(lvl, prt)[0])
+
+        crossings = level_crossings(levels, level_sign)
+        cuts[r] = [_dual_to_cut(x, y) for x, y in crossings]
+    return [cuts[r] for r in regions]
+
+
+def _find_cuts_batched(point_sets: list[ColorPointSet]) -> list[Optional[list[Line]]]:
+    """
+    Vectorized ham_sandwich._find_cuts (floating-point only) for several point sets.
+    """
+    duals = _SegmentedDuals(point_sets)
+    left_x, right_x, crossing = _search_brackets(duals)
+    min_width = (right_x - left_x) * np.finfo(np.float64).eps
+    left_sign = np.zeros(duals.n_regions, dtype=int)
+    left_ranks = np.zeros(len(duals.seg), dtype=int)
+    right_ranks = np.zeros(len(duals.seg), dtype=int)
+    active = np.flatnonzero(crossing)
+    lines = duals.lines_of(active)
+    level, pert, left_ranks[lines] = duals.evaluate(active, left_x[active])
+    left_sign[active] = _level_signs(level, pert)
+    _, _, right_ranks[lines] = duals.evaluate(active, right_x[active])
+
+    # binary search, all regions in lockstep
+    while len(active) > 0:
+        footrule = np.bincount(
+            duals.region, np.abs(left_ranks - right_ranks), minlength=duals.n_regions
+        )
+        mid_x = (left_x + right_x) / 2.0
+        searching = (
+            (footrule > duals.region_lens)
+            & (right_x - left_x > min_width)
+            & (left_x < mid_x)
+            & (mid_x < right_x)
+        )
+        active = active[searching[active]]
+        if len(active) == 0:
+            break
+        lines = duals.lines_of(active)
+        level, pert, mid_ranks = duals.evaluate(active, mid_x[active])
+        mid_sign = _level_signs(level, pert)
+        # [left, mid] if the sign changes in the left half, else [mid, right]
+        go_left = mid_sign != left_sign[active]
+        right_x[active[go_left]] = mid_x[active[go_left]]
+        left_x[active[~go_left]] = mid_x[active[~go_left]]
+        left_sign[active[~go_left]] = mid_sign[~go_left]
+        line_left = np.isin(duals.region[lines], active[go_left])
+        right_ranks[lines[line_left]] = mid_ranks[line_left]
+        left_ranks[lines[~line_left]] = mid_ranks[~line_left]
+
+    results = [None] * duals.n_regions
+    regions = np.flatnonzero(crossing)
+    if len(regions) > 0:
+        region_cuts = _median_intersections(
+            duals, regions, left_x, right_x, left_ranks, right_ranks
+        )
+        for r, cuts in zip(regions, region_cuts):
+            results[r] = cuts
+    return results
+
+
+def get_ham_sandwich_cuts(
+    point_sets: list[ColorPointSet], exact: Optional[bool] = None
+) -> list[list[Line]]:
+    """
+    Same as calling get_ham_sandwich_cut(p_s, exact) for each p_s in point_sets, but the regions
+    which use floating-point arithmetic (and have no multiplicities) are solved together.
+    """
+    use_batch = []
+    for p_s in point_sets:
+        if p_s.n_colors != 2:
+            raise ValueError("Ham-sandwich cuts in 2D only can support 2 colors!")
+        non_empty = all(len(p_s.color_sets[c]) > 0 for c in (0, 1))
+        use_exact = exact if exact is not None else has_degenerate_duals(p_s)
+        use_batch.append(non_empty and not use_exact and p_s.multiplicities is None)
+    batch = [p_s for p_s, b in zip(point_sets, use_batch) if b]
+    batch_cuts = iter(_find_cuts_batched(batch) if len(batch) > 0 else [])
+    results = []
+    for p_s, b in zip(point_sets, use_batch):
+        if not b:
+            results.append(get_ham_sandwich_cut(p_s, exact))
+            continue
+        cuts = next(batch_cuts)
+        if cuts is None:
+            # the levels have the same sign at both ends, which is rare, see ham_sandwich._find_cuts
+            cuts = get_ham_sandwich_cut(p_s, False)
+        results.append(cuts)
+    return results
@@ -0,0 +1,194 @@
+"""
+Description:
+Per-level checkpoints of the iterative ham-sandwich cuts, so a long run can be resumed from the deepest
+completed level instead of starting over (e.g., after a failure at the last level or to continue with a larger k).
+
+A checkpoint of depth d holds everything needed to compute level d: the cuts and segments of levels 0, ..., d - 1,
+the polygons of the regions at depth d, the partition of the points into these regions and the points on the cuts.
+Points are stored as their indices into the color sets of the input point set, so resumed regions contain the
+same Point objects. Checkpoints are .npz files (no pickled objects) keyed by a hash of the input point set and
+the parameters that affect the cuts.
+"""
+
+import os
+import tempfile
+import zipfile
+from typing import Optional
+
+import numpy as np
+from shapely import Point, Polygon, from_wkb, to_wkb
+
+from point_set import ColorPointSet
+from utils.cut_cache import hash_point_set
+from utils.geometry import Line, decode_lines, encode_lines
+
+# bump if the format (or the cut algorithm) changes in a way that invalidates stored checkpoints
+CHECKPOINT_VERSION = 3
+_CHECKPOINT_EXT = ".npz"
+
+
+def checkpoint_key(
+    point_set: ColorPointSet, exact: Optional[bool], domain: Optional[Polygon]
+) -> str:
+    domain_wkb = None if domain is None else to_wkb(domain, hex=True)
+    return hash_point_set(
+        point_set, exact=exact, domain=domain_wkb, checkpoint=CHECKPOINT_VERSION
+    )
+
+
+def _encode_wkb(geoms: list) -> tuple[np.ndarray, np.ndarray]:
+    # concatenated WKB of geoms and the offset of each one
+    wkbs = [to_wkb(g) for g in geoms]
+    offsets = np.cumsum([0] + [len(w) for w in wkbs])
+    return np.frombuffer(b"".join(wkbs), dtype=np.uint8), offsets
+
+
+def _decode_wkb(data: np.ndarray, offsets: np.ndarray) -> list:
+    data = data.tobytes()
+    return [from_wkb(data[start:end]) for start, end in zip(offsets, offsets[1:])]
+
+
+class LevelCheckpoints:
+    """
+    Directory of per-level checkpoints, see get_iterative_hs_cuts.
+    Only the deepest checkpoint of each input is kept, unless keep_shallower is set (then a later run with
+    a smaller k can also resume, but the checkpoints of every level accumulate until they are deleted).
+    """
+
+    def __init__(self, checkpoint_dir: str, keep_shallower: bool = False) -> None:
+        self.checkpoint_dir = checkpoint_dir
+        self.keep_shallower = keep_shallower
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def _path(self, key: str, depth: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"{key}_depth{depth}{_CHECKPOINT_EXT}")
+
+    def save(
+        self,
+        key: str,
+        depth: int,
+        point_set: ColorPointSet,
+        point_sets: list[ColorPointSet],
+        polygons: list[Polygon],
+        cut_lines: list[Line],
+        cut_segments: dict,
+        points_on_cuts: list[Point],
+    ):
+        """
+        Save the state of the iterative cuts once the regions at depth have been found.
+        The regions and points on cuts must contain Point objects of point_set.
+        """
+        index_of = {
+            id(p): (c, i)
+            for c, c_points in point_set.color_sets.items()
+            for i, p in enumerate(c_points)
+        }
+        region_ids, region_colors, region_rows, region_mults = [], [], [], []
+        for j, p_s in enumerate(point_sets):
+            for c, c_points in p_s.color_sets.items():
+                region_ids.extend([j] * len(c_points))
+                region_colors.extend([c] * len(c_points))
+                region_rows.extend(index_of[id(p)][1] for p in c_points)
+                if p_s.multiplicities is not None:
+                    # points on a cut can have part of their multiplicity in each region
+                    region_mults.extend(p_s.multiplicities[c])
+        on_cuts = np.array([index_of[id(p)] for p in points_on_cuts], dtype=np.int64)
+        segments = [l for level in range(depth) for l in cut_segments[level]]
+        polygon_wkb, polygon_offsets = _encode_wkb(polygons)
+        arrays = {
+            "key": np.array(key),
+            "depth": np.array(depth),
+            "n_regions": np.array(len(point_sets)),
+            "region_ids": np.array(region_ids, dtype=np.int64),
+            "region_colors": np.array(region_colors, dtype=np.int64),
+            "region_rows": np.array(region_rows, dtype=np.int64),
+            "region_mults": np.array(region_mults, dtype=np.int64),
+            "polygon_wkb": polygon_wkb,
+            "polygon_offsets": polygon_offsets,
+            **{f"cuts_{name}": array for name, array in encode_lines(cut_lines).items()},
+            "segments": np.array(
+                [(l.p1.x, l.p1.y, l.p2.x, l.p2.y) for l in segments], dtype=np.float64
+            ).reshape(-1, 4),
+            "segment_levels": np.repeat(
+                np.arange(depth), [len(cut_segments[level]) for level in range(depth)]
+            ),
+            "points_on_cuts": on_cuts.reshape(-1, 2),
+        }
+        # write to a temp file first so a crash never leaves a partial checkpoint
+        fd, tmp_path = tempfile.mkstemp(dir=self.checkpoint_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, self._path(key, depth))
+        if not self.keep_shallower:
+            for shallower in range(1, depth):
+                try:
+                    os.remove(self._path(key, shallower))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, key: str, depth: int, point_set: ColorPointSet) -> Optional[tuple]:
+        """
+        Returns (regions, polygons, cut_lines, cut_segments, points_on_cuts) at depth (see save),
+        or None if there is no valid checkpoint.
+        """
+        try:
+            with np.load(self._path(key, depth), allow_pickle=False) as f:
+                arrays = dict(f)
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
+        if str(arrays.get("key")) != key or int(arrays.get("depth", -1)) != depth:
+            return None
+        color_points = {
+            c: np.array(list(c_points), dtype=object)
+            for c, c_points in point_set.color_sets.items()
+        }
+        polygons = _decode_wkb(arrays["polygon_wkb"], arrays["polygon_offsets"])
+        # group the rows by (region, color) once, rows stay in their saved order within a group
+        order = np.lexsort((arrays["region_colors"], arrays["region_ids"]))
+        n_colors = len(point_set.color_sets)
+        keys = arrays["region_ids"][order] * n_colors + arrays["region_colors"][order]
+        bounds = np.searchsorted(keys, np.arange(len(polygons) * n_colors + 1))
+        rows = np.split(arrays["region_rows"][order], bounds[1:-1])
+        mults = None
+        if point_set.multiplicities is not None:
+            mults = np.split(arrays["region_mults"][order].astype(int), bounds[1:-1])
+        regions = []
+        for j, poly in enumerate(polygons):
+            # index of the slice of each color of region j
+            slices = {c: j * n_colors + c for c in point_set.color_sets}
+            multiplicities = None
+            if mults is not None:
+                multiplicities = {c: mults[i] for c, i in slices.items()}
+            regions.append(
+                ColorPointSet(
+                    color_sets={c: list(color_points[c][rows[i]]) for c, i in slices.items()},
+                    defining_poly=poly,
+                    multiplicities=multiplicities,
+                )
+            )
+        cut_segments = {level: [] for level in range(depth)}
+        for level, (x1, y1, x2, y2) in zip(arrays["segment_levels"], arrays["segments"]):
+            cut_segments[int(level)].append(Line(p1=Point(x1, y1), p2=Point(x2, y2)))
+        points_on_cuts = [color_points[c][i] for c, i in arrays["points_on_cuts"]]
+        return (
+            regions,
+            polygons,
+            decode_lines(
+                arrays["cuts_coefs"], arrays["cuts_exact_coefs"], arrays["cuts_exact"]
+            ),
+            cut_segments,
+            points_on_cuts,
+        )
+
+    def load_deepest(
+        self, key: str, max_depth: int, point_set: ColorPointSet
+    ) -> Optional[tuple[int, tuple]]:
+        """
+        Returns (depth, state) of the deepest valid checkpoint with depth <= max_depth (see load),
+        or None if there is none.
+        """
+        for depth in range(max_depth, 0, -1):
+            state = self.load(key, depth, point_set)
+            if state is not None:
+                return depth, state
+        return None
@@ -0,0 +1,165 @@
+"""
+Description:
+Compress a point set into weighted representatives before computing cuts.
+
+Real inputs often have many points at (nearly) the same location, e.g. census blocks sharing a centroid.
+Each representative stands for a group of points of the same color and gets the size of its group as its
+multiplicity (see ColorPointSet.multiplicities), so the cuts bisect the original points while only one dual
+line per representative is needed. Groups are either:
+    - exact duplicates (lossless), or
+    - the points in the same cell of a grid, represented by their centroid. No point is moved by more than
+      the cell diagonal, see Coreset.max_error.
+The regions found with the representatives can be expanded back to the original points with Coreset.expand.
+Representatives on a cut are split between the regions on both sides, so no points are lost.
+"""
+
+from typing import Optional
+
+import numpy as np
+from shapely import get_coordinates
+
+from point_set import ColorPointSet
+from utils.geometry import get_rectangular_region, xy_to_points
+
+
+class Coreset:
+    """
+    Representatives of a point set. members[c][i] are the indices (into the original color set c)
+    of the points represented by point_set.color_sets[c][i]. original_multiplicities are the multiplicities
+    of the original points (None if they have none).
+    """
+
+    def __init__(
+        self,
+        point_set: ColorPointSet,
+        original_sets: dict,
+        members: dict,
+        max_error: float,
+        original_multiplicities: Optional[dict] = None,
+    ) -> None:
+        self.point_set = point_set
+        self.original_sets = original_sets
+        self.members = members
+        self.max_error = max_error
+        self.original_multiplicities = original_multiplicities
+        # maps the coordinates of each representative to its index (per color)
+        self._index_of = {
+            c: {(p.x, p.y): i for i, p in enumerate(c_points)}
+            for c, c_points in point_set.color_sets.items()
+        }
+
+    def __len__(self):
+        return self.point_set.n_points
+
+    def expand(self, regions: list[ColorPointSet]) -> list[ColorPointSet]:
+        """
+        Replace the representatives in regions with the original points they represent.
+        A representative on a cut can be in two regions with part of its multiplicity in each (see
+        iterative_ham._get_new_point_sets), its original points are then handed out to the regions in order,
+        in proportion to these multiplicities. So every original point is in exactly one region, as long as
+        no multiplicity was lost. If the original points have multiplicities, the expanded regions keep them
+        and a point whose share straddles two regions is in both, with its multiplicity split between them.
+        """
+        # multiplicity of each representative handed out so far
+        handed_out = {c: np.zeros(len(m), dtype=int) for c, m in self.members.items()}
+        rep_mults = self.point_set.multiplicities
+        original_mults = self.original_multiplicities
+        expanded = []
+        for region in regions:
+            color_sets = {}
+            multiplicities = None if original_mults is None else {}
+            for c, c_points in region.color_sets.items():
+                idx, mults = [], []
+                for i, p in enumerate(c_points):
+                    rep = self._index_of[c][(p.x, p.y)]
+                    members = self.members[c][rep]
+                    member_mults = np.ones(len(members), dtype=int)
+                    if original_mults is not None:
+                        member_mults = original_mults[c][members]
+                    if region.multiplicities is None:
+                        idx.append(members)
+                        mults.append(member_mults)
+                        continue
+                    # share [start, end) of the representative's multiplicity in this region, scaled to the
+                    # units of the members' multiplicities (which each cover [offset, offset + multiplicity))
+                    start = handed_out[c][rep]
+                    end = start + region.multiplicities[c][i]
+                    handed_out[c][rep] = end
+                    total, rep_mult = np.sum(member_mults), rep_mults[c][rep]
+                    lo, hi = start * total // rep_mult, end * total // rep_mult
+                    offsets = np.cumsum(member_mults) - member_mults
+                    overlap = np.minimum(offsets + member_mults, hi) - np.maximum(offsets, lo)
+                    idx.append(members[overlap > 0])
+                    mults.append(overlap[overlap > 0])
+                idx = np.concatenate(idx) if len(idx) > 0 else np.empty(0, dtype=int)
+                mults = np.concatenate(mults) if len(mults) > 0 else np.empty(0, dtype=int)
+                order = np.argsort(idx, kind="stable")
+                color_sets[c] = list(self.original_sets[c][idx[order]])
+                if multiplicities is not None:
+                    multiplicities[c] = mults[order]
+            expanded.append(
+                ColorPointSet(
+                    color_sets=color_sets,
+                    defining_poly=region.defining_poly,
+                    multiplicities=multiplicities,
+                )
+            )
+        return expanded
+
+
+def _group(xy: np.ndarray, keys: np.ndarray, mults: np.ndarray):
+    # returns (centroid of each group, members of each group, group of each point, group sizes)
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    members = np.split(np.argsort(inverse, kind="stable"), np.cumsum(counts)[:-1])
+    sizes = np.bincount(inverse, weights=mults)
+    rep_x = np.bincount(inverse, weights=xy[:, 0] * mults) / sizes
+    rep_y = np.bincount(inverse, weights=xy[:, 1] * mults) / sizes
+    return np.column_stack((rep_x, rep_y)), members, inverse, sizes.astype(int)
+
+
+def aggregate_points(
+    point_set: ColorPointSet, cell_size: Optional[float] = None
+) -> Coreset:
+    """
+    Merge the points of each color of point_set into representatives. If cell_size is None only exact
+    duplicates are merged, otherwise all points in the same (cell_size x cell_size) grid cell.
+    If point_set already has multiplicities (e.g., a Voronoi sample) they are added up.
+    """
+    origin = np.array([point_set.lower_x, point_set.lower_y])
+    color_sets = {}
+    original_sets = {}
+    members = {}
+    multiplicities = {}
+    max_error = 0.0
+    for c, c_points in point_set.color_sets.items():
+        original_sets[c] = np.array(list(c_points), dtype=object)
+        xy = get_coordinates(list(c_points)).reshape(-1, 2)
+        if len(xy) == 0:
+            color_sets[c], members[c] = [], []
+            multiplicities[c] = np.empty(0, dtype=int)
+            continue
+        if cell_size is None:
+            keys = xy
+        else:
+            keys = np.floor((xy - origin) / cell_size).astype(np.int64)
+        mults = np.ones(len(xy), dtype=int)
+        if point_set.multiplicities is not None:
+            mults = point_set.multiplicities[c]
+        reps, members[c], inverse, multiplicities[c] = _group(xy, keys, mults)
+        if cell_size is None:
+            # exact duplicates, don't move them by rounding in the centroid
+            reps = xy[[m[0] for m in members[c]]]
+        max_error = max(max_error, float(np.max(np.hypot(*(xy - reps[inverse]).T))))
+        color_sets[c] = list(xy_to_points(reps[:, 0], reps[:, 1]))
+    bounding_poly = get_rectangular_region(
+        point_set.lower_x, point_set.upper_x, point_set.lower_y, point_set.upper_y
+    )
+    rep_set = ColorPointSet(
+        color_sets=color_sets,
+        defining_poly=bounding_poly,
+        multiplicities=multiplicities,
+    )
+    return Coreset(
+        rep_set, original_sets, members, max_error, point_set.multiplicities
+    )
@@ -0,0 +1,94 @@
+"""
+Description: Tests for the weighted representatives of coreset.py and voronoi.py.
+Run from src/ with: python -m pytest
+"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from coreset import aggregate_points
+from iterative_ham import get_iterative_hs_cuts
+from point_set import ColorPointSet
+from utils.constants import VORONOI_WEIGHT_AREA, WEIGHT_POPULATION
+from utils.region_stats import get_region_color_counts, get_region_majorities
+from voronoi import get_voronoi_sample
+
+logging.disable(logging.WARNING)
+
+
+def _coresets(point_set: ColorPointSet) -> list:
+    return [
+        aggregate_points(point_set, 1.0),
+        aggregate_points(point_set, 3.0),
+        get_voronoi_sample(point_set, 0.2),
+        get_voronoi_sample(point_set, 0.2, VORONOI_WEIGHT_AREA),
+    ]
+
+
+# representatives on a cut are split between both sides, so no weight is lost
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("k", [1, 2, 3])
+def test_regions_keep_multiplicities(seed, k):
+    np.random.seed(seed)
+    point_set = ColorPointSet(points_per_color=[300, 200], color_method="random")
+    for coreset in _coresets(point_set):
+        regions, _, _, _, err = get_iterative_hs_cuts(coreset.point_set, k, True)
+        assert not err
+        totals = get_region_color_counts(regions).sum(axis=0)
+        multiplicities = coreset.point_set.multiplicities
+        assert totals.tolist() == [int(np.sum(multiplicities[c])) for c in (0, 1)]
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("k", [1, 2, 3])
+def test_expand_returns_every_point_once(seed, k):
+    np.random.seed(seed)
+    point_set = ColorPointSet(points_per_color=[300, 200], color_method="random")
+    for coreset in _coresets(point_set):
+        regions, _, _, _, err = get_iterative_hs_cuts(coreset.point_set, k, True)
+        assert not err
+        expanded = coreset.expand(regions)
+        for c, c_points in point_set.color_sets.items():
+            expanded_ids = [id(p) for r in expanded for p in r.color_sets[c]]
+            assert sorted(expanded_ids) == sorted(id(p) for p in c_points)
+
+
+def _population_point_set(seed: int) -> ColorPointSet:
+    np.random.seed(seed)
+    return ColorPointSet(
+        points_per_color=[120, 100],
+        color_method="random",
+        weighting_method=WEIGHT_POPULATION,
+    )
+
+
+# with population centers, the regions of the centers, of an expanded coreset and of a full point set
+# (cut on a coreset) hold the whole population once
+@pytest.mark.parametrize("seed", [3, 4])
+@pytest.mark.parametrize("k", [1, 2, 3])
+def test_population_totals_add_up(seed, k):
+    point_set = _population_point_set(seed)
+    totals = [int(np.sum(point_set.multiplicities[c])) for c in (0, 1)]
+    results = [get_iterative_hs_cuts(point_set, k, True)]
+    for coreset in _coresets(point_set):
+        regions, cuts, segments, points_on_cuts, err = get_iterative_hs_cuts(
+            coreset.point_set, k, True
+        )
+        results.append((coreset.expand(regions), cuts, segments, points_on_cuts, err))
+        results.append(
+            get_iterative_hs_cuts(coreset.point_set, k, True, full_point_set=point_set)
+        )
+    for regions, _, _, _, err in results:
+        assert not err
+        assert get_region_color_counts(regions).sum(axis=0).tolist() == totals
+
+
+def test_majorities_count_population():
+    point_set = _population_point_set(3)
+    regions, _, _, points_on_cuts, err = get_iterative_hs_cuts(point_set, 2, True)
+    assert not err
+    populations = get_region_color_counts(regions)
+    majorities = get_region_majorities(point_set, points_on_cuts, regions, False)
+    assert majorities == np.argmax(populations, axis=1).tolist()
@@ -0,0 +1,108 @@
+"""
+Description:
+Export cut segments (see plot_k_cuts) directly to vector formats, without rendering a figure.
+Useful for large outputs (e.g., k >= 10) that are slow to draw with matplotlib, or to load the cuts in GIS tools.
+    - SVG: one path per level, colored like plot_k_cuts.
+    - GeoJSON: one MultiLineString feature per level, with the level as a property.
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+def segments_to_array(lines) -> np.ndarray:
+    """
+    (n, 2, 2) array of the endpoints of lines (a list of Line or an array that is already in this form).
+    """
+    if isinstance(lines, np.ndarray):
+        return lines.reshape(-1, 2, 2)
+    return np.array(
+        [((l.p1.x, l.p1.y), (l.p2.x, l.p2.y)) for l in lines], dtype=np.float64
+    ).reshape(-1, 2, 2)
+
+
+def get_level_colors(k: int) -> list:
+    """
+    RGBA color of each level, evenly spaced along matplotlib's "winter" colormap (blue to green).
+    Computed here so exporting cuts does not need matplotlib.
+    """
+    # same lookup as a matplotlib colormap with 256 entries
+    t = np.minimum((np.linspace(0, 1, k) * 256).astype(int), 255) / 255
+    return [(0.0, float(v), 1.0 - 0.5 * float(v), 1.0) for v in t]
+
+
+def to_hex(color: tuple) -> str:
+    # "#rrggbb" of an RGB(A) color with values in [0, 1]
+    return "#" + "".join(f"{int(round(v * 255)):02x}" for v in color[:3])
+
+
+def export_cuts_geojson(cut_segments: dict, save_path: str):
+    features = []
+    for level in sorted(cut_segments):
+        segments = segments_to_array(cut_segments[level])
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "MultiLineString",
+                    "coordinates": segments.tolist(),
+                },
+                "properties": {"level": int(level) + 1},
+            }
+        )
+    with open(save_path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+def export_cuts_svg(
+    cut_segments: dict,
+    k: int,
+    save_path: str,
+    bounds: tuple,
+    width: int = 1000,
+    stroke_width: float = 1.0,
+):
+    """
+    bounds = (lower_x, upper_x, lower_y, upper_y) is the area shown, width is the width of the image in pixels.
+    """
+    lower_x, upper_x, lower_y, upper_y = bounds
+    scale = width / (upper_x - lower_x)
+    height = (upper_y - lower_y) * scale
+    colors = get_level_colors(k)
+    paths = []
+    for level in sorted(cut_segments):
+        segments = segments_to_array(cut_segments[level])
+        # svg y-axis points down
+        px = (segments[..., 0] - lower_x) * scale
+        py = (upper_y - segments[..., 1]) * scale
+        d = " ".join(
+            f"M{x1:.2f} {y1:.2f}L{x2:.2f} {y2:.2f}"
+            for (x1, x2), (y1, y2) in zip(px, py)
+        )
+        paths.append(
+            f'<path d="{d}" stroke="{to_hex(colors[level])}" data-level="{level + 1}"/>'
+        )
+    with open(save_path, "w") as f:
+        f.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height:.0f}" '
+            f'viewBox="0 0 {width} {height:.2f}">\n'
+            f'<rect width="100%" height="100%" fill="none" stroke="black"/>\n'
+            f'<g fill="none" stroke-width="{stroke_width}">\n'
+        )
+        f.write("\n".join(paths))
+        f.write("\n</g>\n</svg>\n")
+
+
+def export_cuts(cut_segments: dict, k: int, save_path: str, bounds: tuple):
+    """
+    Export to SVG or GeoJSON based on the extension of save_path (.svg or .geojson/.json).
+    """
+    ext = os.path.splitext(save_path)[1].lower()
+    if ext == ".svg":
+        export_cuts_svg(cut_segments, k, save_path, bounds)
+    elif ext in (".geojson", ".json"):
+        export_cuts_geojson(cut_segments, save_path)
+    else:
+        raise NotImplementedError(f"Given cut export format not supported: {ext}")
@@ -0,0 +1,327 @@
+"""
+Description:
+Coordinator/worker version of get_iterative_hs_cuts for splitting the cut tree across processes/machines.
+
+The coordinator computes the top levels of the cut tree, then ships each region (the root of a subtree)
+to a worker which finishes that subtree independently. Subtrees share no data, so the results are merged
+back into one cut hierarchy in the same order as get_iterative_hs_cuts would produce.
+
+Workers are reached through a transport, which only needs a map(fn, tasks) method:
+    - LocalTransport: runs subtrees in this process (for testing/debugging)
+    - ProcessTransport: pool of local processes
+    - SocketTransport: workers connect over a socket, started (after the coordinator) on any machine with:
+        python distributed_ham.py --address HOST:PORT --authkey KEY
+Tasks and results only contain numpy arrays and WKB, so workers need this repo but no shared state.
+"""
+
+import argparse
+import math
+import multiprocessing
+from multiprocessing.connection import Client, Listener, wait
+from typing import Optional
+
+import numpy as np
+from shapely import Point, Polygon, dwithin, from_wkb, get_coordinates, points, to_wkb
+
+from iterative_ham import _split_full_point_set, get_iterative_hs_cuts
+from point_set import ColorPointSet
+from utils.geometry import (
+    Line,
+    get_rectangular_region,
+    line_from_coefs,
+    line_to_coefs,
+    xy_to_points,
+)
+
+
+class LocalTransport:
+    """
+    Runs every task in the calling process.
+    """
+
+    def map(self, fn, tasks: list) -> list:
+        return [fn(task) for task in tasks]
+
+    def close(self):
+        pass
+
+
+class ProcessTransport:
+    """
+    Runs the tasks on a pool of local worker processes.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.pool = multiprocessing.Pool(workers)
+
+    def map(self, fn, tasks: list) -> list:
+        return self.pool.map(fn, tasks, chunksize=1)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+class SocketTransport:
+    """
+    Coordinator end of a socket connection to the workers (see run_worker). Waits for n_workers to
+    connect, then hands out tasks one at a time to whichever worker is idle.
+    If local_workers > 0, that many of the workers are started as local processes (for testing).
+    """
+
+    def __init__(
+        self,
+        address: tuple,
+        authkey: bytes,
+        n_workers: int,
+        local_workers: int = 0,
+    ) -> None:
+        self.listener = Listener(address, authkey=authkey)
+        self.processes = [
+            multiprocessing.Process(
+                target=run_worker, args=(self.listener.address, authkey), daemon=True
+            )
+            for _ in range(local_workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.connections = [self.listener.accept() for _ in range(n_workers)]
+        self.workers = n_workers
+
+    def map(self, fn, tasks: list) -> list:
+        # if a task fails, no new tasks are sent and the results of the busy workers are read (so the next
+        # map doesn't receive them) before the first error is raised
+        results = [None] * len(tasks)
+        pending = list(enumerate(tasks))[::-1]
+        busy = {}
+        idle = list(self.connections)
+        error = None
+        while len(pending) > 0 or len(busy) > 0:
+            while len(pending) > 0 and len(idle) > 0:
+                conn = idle.pop()
+                task_id, task = pending.pop()
+                conn.send((task_id, fn, task))
+                busy[conn] = task_id
+            for conn in wait(list(busy)):
+                task_id, result = conn.recv()
+                if isinstance(result, Exception):
+                    error = error or result
+                    pending = []
+                results[task_id] = result
+                del busy[conn]
+                idle.append(conn)
+        if error is not None:
+            raise error
+        return results
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(None)
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.listener.close()
+
+
+def run_worker(address: tuple, authkey: bytes):
+    """
+    Worker end of a SocketTransport, runs tasks until the coordinator closes the connection.
+    """
+    with Client(address, authkey=authkey) as conn:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                return
+            if msg is None:
+                return
+            task_id, fn, task = msg
+            try:
+                result = fn(task)
+            except Exception as e:
+                result = e
+            conn.send((task_id, result))
+
+
+def _color_coords(point_set: ColorPointSet) -> dict:
+    return {
+        c: get_coordinates(list(c_points))
+        for c, c_points in point_set.color_sets.items()
+    }
+
+
+def _coords_to_point_set(
+    coords: dict, poly: Polygon, multiplicities: Optional[dict] = None
+) -> ColorPointSet:
+    color_sets = {c: xy_to_points(xy[:, 0], xy[:, 1]) for c, xy in coords.items()}
+    return ColorPointSet(
+        color_sets=color_sets, defining_poly=poly, multiplicities=multiplicities
+    )
+
+
+def _points_near(point_set: ColorPointSet, poly: Polygon, atol: float = 1e-8) -> dict:
+    # coordinates (per color) of the points of point_set within atol of poly, the tolerance is needed
+    # since the polygons of the subtree are computed from poly (rounding can move their edges slightly)
+    coords = {}
+    for c, xy in _color_coords(point_set).items():
+        coords[c] = xy[dwithin(poly, points(xy), atol)] if len(xy) > 0 else xy
+    return coords
+
+
+def _solve_subtree(task: dict) -> dict:
+    """
+    Worker side: build the subtree of the given region and return it in a picklable form.
+    """
+    poly = from_wkb(task["poly"])
+    point_set = _coords_to_point_set(task["coords"], poly, task["multiplicities"])
+    full_point_set = None
+    if task["full_coords"] is not None:
+        full_point_set = _coords_to_point_set(
+            task["full_coords"], poly, task["full_multiplicities"]
+        )
+    regions, cuts, segments, points_on_cuts, err = get_iterative_hs_cuts(
+        point_set,
+        task["k"],
+        task["calculate_final_regions"],
+        full_point_set,
+        exact=task["exact"],
+        domain=poly,
+    )
+    return {
+        "regions": [
+            (_color_coords(p_s), to_wkb(p_s.defining_poly), p_s.multiplicities)
+            for p_s in regions
+        ],
+        "cuts": [line_to_coefs(l) for l in cuts],
+        "segments": {
+            level: [(l.p1.x, l.p1.y, l.p2.x, l.p2.y) for l in level_segments]
+            for level, level_segments in segments.items()
+        },
+        "points_on_cuts": get_coordinates(points_on_cuts),
+        "err": err,
+    }
+
+
+def _merge_subtrees(top_result: tuple, subtrees: list[dict], top_k: int) -> tuple:
+    """
+    Merge the subtrees into the result of the top levels. At every level the regions of subtree s
+    are contiguous (and in order), so the cuts of each level are the concatenation of the
+    subtrees' cuts of that level.
+    """
+    _, top_cuts, top_segments, top_points_on_cuts, _ = top_result
+    regions = []
+    cuts = list(top_cuts)
+    segments = {level: list(top_segments[level]) for level in range(top_k)}
+    points_on_cuts = list(top_points_on_cuts)
+    err = False
+    # index of the first cut of each level within each subtree's cuts
+    offsets = [
+        np.cumsum([0] + [len(level_cuts) for level_cuts in subtree["segments"].values()])
+        for subtree in subtrees
+    ]
+    n_levels = max(len(subtree["segments"]) for subtree in subtrees)
+    for level in range(n_levels):
+        for subtree, offset in zip(subtrees, offsets):
+            if level not in subtree["segments"]:
+                continue
+            start, end = offset[level], offset[level + 1]
+            cuts.extend(map(line_from_coefs, subtree["cuts"][start:end]))
+            segments.setdefault(top_k + level, []).extend(
+                Line(p1=Point(x1, y1), p2=Point(x2, y2))
+                for x1, y1, x2, y2 in subtree["segments"][level]
+            )
+    for subtree in subtrees:
+        err = err or subtree["err"]
+        regions.extend(
+            _coords_to_point_set(coords, from_wkb(poly), mults)
+            for coords, poly, mults in subtree["regions"]
+        )
+        points_on_cuts.extend(map(Point, subtree["points_on_cuts"]))
+    return regions, cuts, segments, points_on_cuts, err
+
+
+def get_distributed_hs_cuts(
+    point_set: ColorPointSet,
+    k: int,
+    calculate_final_regions: bool,
+    transport,
+    full_point_set: Optional[ColorPointSet] = None,
+    top_k: Optional[int] = None,
+    exact: Optional[bool] = None,
+):
+    """
+    Same as get_iterative_hs_cuts, but the subtrees below level top_k are built by the workers of transport.
+    top_k defaults to ceil(log2(number of workers)) so there is at least one subtree per worker.
+    The final regions are only calculated (by the workers) if calculate_final_regions.
+    """
+    if top_k is None:
+        top_k = math.ceil(math.log2(max(getattr(transport, "workers", 1), 1)))
+    top_k = max(top_k, 1)
+    if k <= top_k:
+        return get_iterative_hs_cuts(
+            point_set, k, calculate_final_regions, full_point_set, exact=exact
+        )
+    top_result = get_iterative_hs_cuts(point_set, top_k, True, exact=exact)
+    top_regions, _, _, _, err = top_result
+    if err:
+        return top_result
+    full_regions = [None] * len(top_regions)
+    if full_point_set is not None and full_point_set.multiplicities is not None:
+        # split the weight of full points on the top cuts, like get_iterative_hs_cuts
+        domain = get_rectangular_region(
+            point_set.lower_x, point_set.upper_x, point_set.lower_y, point_set.upper_y
+        )
+        _, top_cuts, top_segments, _, _ = top_result
+        full_regions = _split_full_point_set(
+            full_point_set, domain, top_cuts, top_segments, top_k, []
+        )
+    tasks = []
+    for p_s, full_region in zip(top_regions, full_regions):
+        full_coords, full_multiplicities = None, None
+        if full_region is not None:
+            full_coords = _color_coords(full_region)
+            full_multiplicities = full_region.multiplicities
+        elif full_point_set is not None:
+            full_coords = _points_near(full_point_set, p_s.defining_poly)
+        tasks.append(
+            {
+                "coords": _color_coords(p_s),
+                "multiplicities": p_s.multiplicities,
+                "full_coords": full_coords,
+                "full_multiplicities": full_multiplicities,
+                "poly": to_wkb(p_s.defining_poly),
+                "k": k - top_k,
+                "calculate_final_regions": calculate_final_regions,
+                "exact": exact,
+            }
+        )
+    subtrees = transport.map(_solve_subtree, tasks)
+    return _merge_subtrees(top_result, subtrees, top_k)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="distributed_ham",
+        description="Worker for building subtrees of the cut tree (see SocketTransport)",
+    )
+    parser.add_argument(
+        "--address",
+        type=str,
+        required=True,
+        help="HOST:PORT of the coordinator",
+    )
+    parser.add_argument(
+        "--authkey",
+        type=str,
+        required=True,
+        help="shared secret used to authenticate with the coordinator",
+    )
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    host, port = args.address.rsplit(":", 1)
+    run_worker((host, int(port)), args.authkey.encode())
@@ -0,0 +1,451 @@
+"""
+Description:
+Long-running districting service with a small JSON-over-HTTP API (asyncio, standard library only).
+
+Datasets are loaded once and kept in shared memory in the columnar format of shared_points.py. Jobs are run
+on a pool of worker processes, which build the points of a dataset the first time they use it and then keep
+them, so repeated (what-if) jobs on the same dataset only pay for computing the cuts.
+
+Start with:
+    python districting_service.py --port 8765 --workers 4 --data_dir data/
+    python districting_service.py --unix_socket /tmp/districting.sock
+API (all bodies are JSON):
+    GET    /health
+    GET    /datasets
+    POST   /datasets          {"dataset_id", "points_per_color", "seed", "color_method", "weight_method"}
+                              (generated points, weight_method population makes them weighted population centers)
+                              or {"dataset_id", "path"} (.npz with arrays x, y, color and optionally multiplicity,
+                              path is relative to --data_dir, files outside of it are refused)
+    DELETE /datasets/<id>
+    POST   /jobs              {"dataset_id", "k", "weight_method", "subsample_ratio", "subsample_method",
+                               "arithmetic", "seed", "wait"}, returns the result if wait (default) else the job id
+    GET    /jobs/<id>         status of a job, and its result once it is done
+The result of a job holds the cuts (slope, y_int, x_int) in level order, the cut segments of each level, the
+polygon of each region (WKT) and the per-region statistics of utils.region_stats.get_region_stats.
+Finished jobs are forgotten --job_ttl seconds after they finish.
+
+weight_method is uniform or population (only for datasets with multiplicities), majority weighting is not
+supported: it adds synthetic weight points around a random choice of majority points for a given k, which only
+makes sense for generated point sets in the evaluations (see eval_main.py).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from typing import Optional
+
+import numpy as np
+from shapely import to_wkt
+
+from iterative_ham import get_iterative_hs_cuts
+from point_set import ColorPointSet, subsample
+from shared_points import PointsHandle, SharedPointArrays
+from utils.constants import *
+from utils.exact import is_exact
+from utils.geometry import Line, get_rectangular_region, xy_to_points
+from utils.region_stats import get_region_labels, get_region_stats
+from voronoi import get_voronoi_sample
+
+# maximum size of a request body in bytes
+_MAX_BODY_BYTES = 64 * 1024 * 1024
+# weight methods of datasets and jobs, see the module docstring
+_WEIGHT_METHODS = (WEIGHT_UNIFORM, WEIGHT_POPULATION)
+# generated datasets are drawn from the global random state, one at a time so equal seeds give equal points
+_generate_lock = threading.Lock()
+
+
+class ServiceError(Exception):
+    """
+    Error in a request, returned to the client with the given HTTP status.
+    """
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _dataset_path(path: str, data_dir: Optional[str]) -> str:
+    # path of a dataset file, which must be inside of data_dir
+    if data_dir is None:
+        raise ServiceError(
+            HTTPStatus.FORBIDDEN, "loading files is disabled, start with --data_dir"
+        )
+    data_dir = os.path.realpath(data_dir)
+    full_path = os.path.realpath(os.path.join(data_dir, path))
+    if os.path.commonpath([data_dir, full_path]) != data_dir:
+        raise ServiceError(HTTPStatus.FORBIDDEN, f"path is outside of the data dir: {path}")
+    return full_path
+
+
+def load_dataset(spec: dict, data_dir: Optional[str] = None) -> ColorPointSet:
+    """
+    Generate (points_per_color, seed, color_method) or load (path to an .npz file in data_dir) the points
+    of a dataset.
+    """
+    if "path" in spec:
+        with np.load(_dataset_path(str(spec["path"]), data_dir), allow_pickle=False) as f:
+            x, y, color = f["x"], f["y"], f["color"].astype(np.int64)
+            multiplicity = f["multiplicity"] if "multiplicity" in f else None
+        n_colors = int(color.max()) + 1 if len(color) > 0 else 0
+        rows = {c: np.flatnonzero(color == c) for c in range(n_colors)}
+        multiplicities = None
+        if multiplicity is not None:
+            multiplicities = {c: multiplicity[r].astype(int) for c, r in rows.items()}
+        return ColorPointSet(
+            color_sets={c: xy_to_points(x[r], y[r]) for c, r in rows.items()},
+            defining_poly=get_rectangular_region(x.min(), x.max(), y.min(), y.max()),
+            multiplicities=multiplicities,
+        )
+    if "points_per_color" not in spec:
+        raise ServiceError(
+            HTTPStatus.BAD_REQUEST, "dataset needs either points_per_color or path"
+        )
+    if spec.get("weight_method", WEIGHT_UNIFORM) not in _WEIGHT_METHODS:
+        raise ServiceError(
+            HTTPStatus.BAD_REQUEST, f"weight_method must be one of: {_WEIGHT_METHODS}"
+        )
+    with _generate_lock:
+        np.random.seed(spec.get("seed", 42))
+        return ColorPointSet(
+            points_per_color=spec["points_per_color"],
+            color_method=spec.get("color_method", RANDOM),
+            weighting_method=spec.get("weight_method"),
+        )
+
+
+# points of each dataset used by this worker process, keyed by the name of its shared memory block
+_worker_point_sets: dict = {}
+
+
+def _dataset_key(handle: PointsHandle) -> str:
+    return handle.block_names["x"]
+
+
+def _worker_point_set(handle: PointsHandle, live_keys: set) -> ColorPointSet:
+    # drop the points of datasets that were removed since the last job of this worker
+    for key in set(_worker_point_sets) - live_keys:
+        del _worker_point_sets[key]
+    key = _dataset_key(handle)
+    if key not in _worker_point_sets:
+        arrays = SharedPointArrays.attach(handle)
+        # point_set copies the rows, so the block is not needed afterwards
+        _worker_point_sets[key] = arrays.point_set()
+        arrays.close()
+    return _worker_point_sets[key]
+
+
+def _line_to_json(l: Line) -> list:
+    # (slope, y_int, x_int), exact coefficients are sent as strings
+    coefs = [None, None, l.x_int] if l.is_vertical() else [l.slope, l.y_int, None]
+    return [str(v) if is_exact(v) else v for v in coefs]
+
+
+def run_job(handle: PointsHandle, params: dict, live_keys: set) -> dict:
+    """
+    Compute the cuts of a job (see the module docstring) on the dataset of handle, runs in a worker process.
+    live_keys are the keys (see _dataset_key) of the datasets that are still loaded.
+    """
+    t0 = time.time()
+    point_set = _worker_point_set(handle, live_keys)
+    weight_method = params.get("weight_method", WEIGHT_UNIFORM)
+    if weight_method == WEIGHT_UNIFORM and point_set.multiplicities is not None:
+        point_set = ColorPointSet(
+            color_sets=point_set.color_sets, defining_poly=point_set.defining_poly
+        )
+    np.random.seed(params.get("seed", 42))
+    full_point_set = None
+    ratio = params.get("subsample_ratio")
+    if ratio is not None:
+        full_point_set = point_set
+        if params.get("subsample_method", SUBSAMPLE_RANDOM) == SUBSAMPLE_VORONOI:
+            point_set = get_voronoi_sample(point_set, ratio).point_set
+        else:
+            point_set = subsample(point_set, ratio)
+    exact = ARITHMETIC_TO_EXACT[params.get("arithmetic", ARITHMETIC_AUTO)]
+    regions, cuts, cut_segments, _, err = get_iterative_hs_cuts(
+        point_set, params["k"], True, full_point_set, exact=exact
+    )
+    result = {
+        "err": err,
+        "cuts": [_line_to_json(l) for l in cuts],
+        "segments": {
+            str(level): [[l.p1.x, l.p1.y, l.p2.x, l.p2.y] for l in segments]
+            for level, segments in cut_segments.items()
+        },
+    }
+    if not err:
+        labels, colors, weights, _ = get_region_labels(regions)
+        stats = get_region_stats(
+            labels, colors, weights, len(regions), len(point_set.color_sets)
+        )
+        result["regions"] = [to_wkt(r.defining_poly) for r in regions]
+        result["stats"] = {name: v.tolist() for name, v in stats._asdict().items()}
+    result["seconds"] = time.time() - t0
+    return result
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, dict]:
+    # returns (method, path, json body) of an HTTP/1.1 request
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise ServiceError(HTTPStatus.BAD_REQUEST, "malformed request line")
+    method, path, _ = request_line
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    n_bytes = int(headers.get("content-length", 0))
+    if n_bytes > _MAX_BODY_BYTES:
+        raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request too large")
+    body = {}
+    if n_bytes > 0:
+        try:
+            body = json.loads(await reader.readexactly(n_bytes))
+        except json.JSONDecodeError as e:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "request body must be a JSON object")
+    return method, path.rstrip("/"), body
+
+
+def _write_response(writer: asyncio.StreamWriter, status: HTTPStatus, body: dict):
+    payload = json.dumps(body).encode()
+    writer.write(
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        "Connection: close\r\n\r\n".encode()
+        + payload
+    )
+
+
+class DistrictingService:
+    """
+    State of the service: loaded datasets, submitted jobs and the worker pool (see the module docstring).
+    """
+
+    def __init__(
+        self, workers: int = 1, data_dir: Optional[str] = None, job_ttl: float = 3600.0
+    ) -> None:
+        # workers are started lazily from within the event loop, forking them then would hand them the
+        # listening socket and open connections of the server (so closed connections never reach EOF)
+        self.pool = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        # dataset files can only be loaded from here (None to disable loading files)
+        self.data_dir = data_dir
+        # seconds that finished jobs are kept
+        self.job_ttl = job_ttl
+        # dataset id -> SharedPointArrays
+        self.datasets = {}
+        # job id -> (dataset id, asyncio.Future of the result)
+        self.jobs = {}
+        # job id -> time the job finished
+        self._finished_at = {}
+        self._job_ids = itertools.count()
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            method, path, body = await _read_request(reader)
+            status, response = HTTPStatus.OK, await self.route(method, path, body)
+        except ServiceError as e:
+            status, response = e.status, {"error": str(e)}
+        except Exception as e:
+            logging.exception("Request failed")
+            status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        _write_response(writer, status, response)
+        await writer.drain()
+        writer.close()
+
+    async def route(self, method: str, path: str, body: dict) -> dict:
+        self.expire_jobs()
+        parts = path.strip("/").split("/")
+        if method == "GET" and parts == ["health"]:
+            return {"status": "ok", "datasets": len(self.datasets), "jobs": len(self.jobs)}
+        if parts[0] == "datasets":
+            if method == "GET" and len(parts) == 1:
+                return {"datasets": self.describe_datasets()}
+            if method == "POST" and len(parts) == 1:
+                return await self.add_dataset(body)
+            if method == "DELETE" and len(parts) == 2:
+                return self.remove_dataset(parts[1])
+        if parts[0] == "jobs":
+            if method == "POST" and len(parts) == 1:
+                return await self.submit_job(body)
+            if method == "GET" and len(parts) == 2:
+                return self.job_status(parts[1])
+        raise ServiceError(HTTPStatus.NOT_FOUND, f"no route for {method} {path}")
+
+    def describe_datasets(self) -> dict:
+        return {
+            dataset_id: {
+                "n_points": arrays.handle.n_rows,
+                "n_colors": arrays.handle.n_colors,
+                "bounds": arrays.handle.bounds,
+                "has_multiplicities": arrays.handle.has_multiplicities,
+            }
+            for dataset_id, arrays in self.datasets.items()
+        }
+
+    async def add_dataset(self, spec: dict) -> dict:
+        dataset_id = str(spec.get("dataset_id", ""))
+        if dataset_id == "" or dataset_id in self.datasets:
+            raise ServiceError(
+                HTTPStatus.BAD_REQUEST, f"missing or existing dataset_id: {dataset_id!r}"
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            point_set = await loop.run_in_executor(
+                None, load_dataset, spec, self.data_dir
+            )
+        except (OSError, KeyError, ValueError) as e:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"could not load dataset: {e}")
+        self.datasets[dataset_id] = SharedPointArrays.from_point_set(point_set)
+        return {"dataset_id": dataset_id, **self.describe_datasets()[dataset_id]}
+
+    def remove_dataset(self, dataset_id: str) -> dict:
+        if dataset_id not in self.datasets:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"unknown dataset: {dataset_id}")
+        if any(d == dataset_id and not f.done() for d, f in self.jobs.values()):
+            raise ServiceError(HTTPStatus.CONFLICT, "dataset has running jobs")
+        self.datasets.pop(dataset_id).unlink()
+        return {"dataset_id": dataset_id, "removed": True}
+
+    async def submit_job(self, params: dict) -> dict:
+        dataset_id = str(params.get("dataset_id", ""))
+        if dataset_id not in self.datasets:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"unknown dataset: {dataset_id}")
+        if not isinstance(params.get("k"), int) or params["k"] < 0:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "k must be a non-negative int")
+        weight_method = params.get("weight_method", WEIGHT_UNIFORM)
+        if weight_method not in _WEIGHT_METHODS:
+            raise ServiceError(
+                HTTPStatus.BAD_REQUEST, f"weight_method must be one of: {_WEIGHT_METHODS}"
+            )
+        handle = self.datasets[dataset_id].handle
+        if weight_method == WEIGHT_POPULATION and not handle.has_multiplicities:
+            raise ServiceError(
+                HTTPStatus.BAD_REQUEST,
+                f"weight_method {WEIGHT_POPULATION} needs a dataset with multiplicities",
+            )
+        if params.get("arithmetic", ARITHMETIC_AUTO) not in ARITHMETIC_TO_EXACT:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "unknown arithmetic")
+        job_id = str(next(self._job_ids))
+        loop = asyncio.get_running_loop()
+        live_keys = {_dataset_key(arrays.handle) for arrays in self.datasets.values()}
+        future = loop.run_in_executor(self.pool, run_job, handle, params, live_keys)
+        future.add_done_callback(
+            lambda _: self._finished_at.setdefault(job_id, time.monotonic())
+        )
+        self.jobs[job_id] = (dataset_id, future)
+        if not params.get("wait", True):
+            return {"job_id": job_id}
+        await asyncio.wait([future])
+        return self.job_status(job_id)
+
+    def expire_jobs(self):
+        # forget jobs that finished more than job_ttl seconds ago
+        now = time.monotonic()
+        for job_id, finished_at in list(self._finished_at.items()):
+            if now - finished_at > self.job_ttl:
+                del self._finished_at[job_id]
+                self.jobs.pop(job_id, None)
+
+    def job_status(self, job_id: str) -> dict:
+        if job_id not in self.jobs:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"unknown job: {job_id}")
+        dataset_id, future = self.jobs[job_id]
+        status = {"job_id": job_id, "dataset_id": dataset_id}
+        if not future.done():
+            return {**status, "status": "running"}
+        if future.exception() is not None:
+            return {**status, "status": "failed", "error": str(future.exception())}
+        return {**status, "status": "done", "result": future.result()}
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        for arrays in self.datasets.values():
+            arrays.unlink()
+        self.datasets = {}
+
+
+async def serve(
+    service: DistrictingService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix_socket: Optional[str] = None,
+):
+    if unix_socket is not None:
+        server = await asyncio.start_unix_server(service.handle_connection, unix_socket)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+    # stop serving on SIGTERM as on Ctrl+C, so the datasets are released (see close)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+    logging.info(f"Serving on {unix_socket or f'{host}:{port}'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if unix_socket is not None and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="districting_service",
+        description="Long-running service that computes iterative ham-sandwich cuts over HTTP",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="host to bind to")
+    parser.add_argument("--port", type=int, default=8765, help="port to bind to")
+    parser.add_argument(
+        "--unix_socket",
+        type=str,
+        default=None,
+        help="path of a unix socket to serve on instead of host/port (optional)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to run jobs",
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=None,
+        help="directory that datasets can be loaded from (optional, loading files is disabled without it)",
+    )
+    parser.add_argument(
+        "--job_ttl",
+        type=float,
+        default=3600.0,
+        help="number of seconds that the results of finished jobs are kept",
+    )
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    service = DistrictingService(args.workers, args.data_dir, args.job_ttl)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_socket))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        service.close()
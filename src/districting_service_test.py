@@ -0,0 +1,80 @@
+"""
+Description: Tests for the HTTP API of districting_service.py.
+Run from src/ with: python -m pytest
+"""
+
+import asyncio
+import json
+import logging
+
+import pytest
+
+from districting_service import DistrictingService
+
+logging.disable(logging.WARNING)
+
+
+async def _request(port: int, method: str, path: str, body: dict = None) -> tuple:
+    # raw HTTP request that reads the response until the server closes the connection
+    payload = b"" if body is None else json.dumps(body).encode()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+        + payload
+    )
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), timeout=60)
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content)
+
+
+def _run_with_service(requests):
+    # run the coroutine requests(port) against a service on a free port
+    async def main():
+        service = DistrictingService(workers=1)
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        try:
+            async with server:
+                return await requests(server.sockets[0].getsockname()[1])
+        finally:
+            service.close()
+
+    return asyncio.run(main())
+
+
+# the worker processes must not keep the connection of the request that started them open
+def test_job_response_reaches_eof():
+    async def requests(port):
+        dataset = {"dataset_id": "a", "points_per_color": [30, 20], "seed": 1}
+        assert (await _request(port, "POST", "/datasets", dataset))[0] == 200
+        status, job = await _request(port, "POST", "/jobs", {"dataset_id": "a", "k": 2})
+        assert status == 200
+        assert job["status"] == "done"
+        assert len(job["result"]["regions"]) == 4
+        status, health = await _request(port, "GET", "/health")
+        assert status == 200 and health["jobs"] == 1
+
+    _run_with_service(requests)
+
+
+@pytest.mark.parametrize("body", [[1], "x"])
+def test_body_must_be_object(body):
+    async def requests(port):
+        status, response = await _request(port, "POST", "/datasets", body)
+        assert status == 400
+        assert "JSON object" in response["error"]
+
+    _run_with_service(requests)
+
+
+def test_population_weighting_needs_multiplicities():
+    async def requests(port):
+        dataset = {"dataset_id": "a", "points_per_color": [30, 20]}
+        assert (await _request(port, "POST", "/datasets", dataset))[0] == 200
+        job = {"dataset_id": "a", "k": 1, "weight_method": "population"}
+        status, response = await _request(port, "POST", "/jobs", job)
+        assert status == 400
+        assert "multiplicities" in response["error"]
+
+    _run_with_service(requests)
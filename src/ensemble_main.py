@@ -0,0 +1,298 @@
+"""
+Description:
+Monte Carlo ensembles of districtings, to estimate the distribution of majority_share (see eval_main.py) over
+thousands of runs instead of a few seeds.
+
+A run is one draw of a base point set (random seed): a new subsample of it (--subsample_ratio) and/or a new
+random choice of majority weights (--weight_method majority). The base point set of a seed is generated once
+and shared by all of its draws, and without majority weighting the cut hierarchy of a draw is built once for
+all k (see iterative_hs_cuts_over_k). Seeds are split over worker processes, each of which only sends back a
+ShareSummary per (points_per_color, k), so memory does not grow with the number of runs.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from eval_main import _get_ppcs, _get_run_majority_share, _k_dependent_point_set
+from iterative_ham import get_iterative_hs_cuts, iterative_hs_cuts_over_k
+from main import list_of_int
+from point_set import ColorPointSet, subsample
+from results_store import get_format, save_results
+from utils.constants import *
+
+
+class ShareSummary:
+    """
+    Streaming summary of the majority_share of a set of runs with the same k.
+    Shares are multiples of 1/2^k, so their distribution is kept exactly as counts of the number of
+    majority regions. Mean/variance use Welford's algorithm and summaries of disjoint runs can be merged.
+    """
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+        self.n = 0
+        self.n_failed = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # region_counts[i] = number of runs where the majority color won i regions
+        self.region_counts = np.zeros(2**k + 1, dtype=np.int64)
+        self.total_runtime = 0.0
+
+    def update(self, majority_share: float, runtime: float = 0.0):
+        self.total_runtime += runtime
+        if majority_share < 0:
+            # cuts could not be computed (see _get_run_majority_share)
+            self.n_failed += 1
+            return
+        self.n += 1
+        delta = majority_share - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (majority_share - self.mean)
+        self.region_counts[int(round(majority_share * 2**self.k))] += 1
+
+    def merge(self, other: "ShareSummary"):
+        # Chan et al. parallel variance
+        n = self.n + other.n
+        if n > 0:
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta**2 * self.n * other.n / n
+            self.mean += delta * other.n / n
+        self.n = n
+        self.n_failed += other.n_failed
+        self.region_counts += other.region_counts
+        self.total_runtime += other.total_runtime
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def quantile(self, q: float) -> float:
+        # smallest share with at least q of the runs at or below it
+        cum_counts = np.cumsum(self.region_counts)
+        i = np.searchsorted(cum_counts, q * self.n, side="left")
+        return min(i, 2**self.k) / 2**self.k
+
+    def to_row(self) -> dict:
+        n_runs = self.n + self.n_failed
+        return {
+            "k": self.k,
+            "n_runs": n_runs,
+            "n_failed": self.n_failed,
+            "mean_share": self.mean,
+            "std_share": self.std,
+            "p05_share": self.quantile(0.05),
+            "median_share": self.quantile(0.5),
+            "p95_share": self.quantile(0.95),
+            "mean_runtime": self.total_runtime / max(n_runs, 1),
+            # region_counts[i] = runs where the majority color won i of the 2^k regions
+            "region_counts": self.region_counts.tolist(),
+        }
+
+
+class EnsembleTask(NamedTuple):
+    points_per_color: list[int]
+    seeds: list[int]
+    n_draws: int
+    k_vals: list[int]
+    weight_method: str
+    subsample_ratio: Optional[float]
+
+
+def _draw_point_sets(
+    base: ColorPointSet, k: int, task: EnsembleTask
+) -> tuple[ColorPointSet, Optional[ColorPointSet]]:
+    # (point set to cut, full point set if subsampled) for one draw from base
+    point_set = base
+    if task.weight_method == WEIGHT_MAJORITY:
+        point_set = base.reweighted(k)
+    if task.subsample_ratio is None:
+        return point_set, None
+    return subsample(point_set, task.subsample_ratio), point_set
+
+
+def run_task(task: EnsembleTask) -> dict:
+    """
+    Run every draw of every seed in task, returns {k: ShareSummary}.
+    Draw d of seed s is seeded with (s, d), or (s, d, k) if its point set depends on k, so results do not
+    depend on how seeds are split into tasks or on the other k in task.
+    """
+    summaries = {k: ShareSummary(k) for k in task.k_vals}
+    k_dependent = _k_dependent_point_set(task.weight_method)
+    k_groups = [[k] for k in task.k_vals] if k_dependent else [list(task.k_vals)]
+    for seed in task.seeds:
+        np.random.seed(seed)
+        base = ColorPointSet(points_per_color=task.points_per_color, color_method=RANDOM)
+        for draw in range(task.n_draws):
+            for ks in k_groups:
+                np.random.seed([seed, draw, ks[0]] if k_dependent else [seed, draw])
+                t0 = time.time()
+                point_set, og_point_set = _draw_point_sets(base, max(ks), task)
+                if len(ks) == 1:
+                    result = get_iterative_hs_cuts(point_set, ks[0], True, og_point_set)
+                    results = [(ks[0], result)]
+                else:
+                    results = iterative_hs_cuts_over_k(
+                        point_set, ks, True, og_point_set
+                    )
+                for k, result in results:
+                    t_stats = time.time()
+                    majority_share = _get_run_majority_share(
+                        result,
+                        point_set,
+                        og_point_set,
+                        task.points_per_color,
+                        task.weight_method,
+                    )
+                    # runtime includes the shared work for levels < k
+                    summaries[k].update(majority_share, time.time() - t0)
+                    t0 += time.time() - t_stats
+    return summaries
+
+
+def get_ensemble_tasks(
+    ppcs: list[list[int]],
+    seeds: list[int],
+    n_draws: int,
+    k_vals: list[int],
+    weight_method: str,
+    subsample_ratio: Optional[float] = None,
+    seeds_per_task: int = 1,
+) -> list[EnsembleTask]:
+    if weight_method != WEIGHT_MAJORITY and subsample_ratio is None and n_draws > 1:
+        logging.warning(
+            "Draws of a seed are identical without weighting/subsampling, using n_draws=1"
+        )
+        n_draws = 1
+    return [
+        EnsembleTask(
+            ppc,
+            [int(s) for s in seeds[i : i + seeds_per_task]],
+            n_draws,
+            list(k_vals),
+            weight_method,
+            subsample_ratio,
+        )
+        for ppc in ppcs
+        for i in range(0, len(seeds), seeds_per_task)
+    ]
+
+
+def _init_worker():
+    logging.basicConfig(level=logging.CRITICAL)
+
+
+def run_ensemble(tasks: list[EnsembleTask], workers: int = 1) -> dict:
+    """
+    Run the tasks in a pool of workers (in this process if workers == 1) and merge their summaries as they
+    finish, returns {(tuple(points_per_color), k): ShareSummary}.
+    """
+    summaries = {}
+
+    def _merge(task, task_summaries):
+        for k, summary in task_summaries.items():
+            key = (tuple(task.points_per_color), k)
+            if key in summaries:
+                summaries[key].merge(summary)
+            else:
+                summaries[key] = summary
+
+    if workers == 1:
+        _init_worker()
+        for task in tasks:
+            _merge(task, run_task(task))
+        return summaries
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        # imap keeps the order of tasks (to match results to them), results are still merged as they come
+        for task, task_summaries in zip(tasks, pool.imap(run_task, tasks)):
+            _merge(task, task_summaries)
+    return summaries
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="ensemble_main",
+        description="Estimate the distribution of majority_share over a Monte Carlo ensemble of districtings",
+    )
+    parser.add_argument(
+        "--save_path",
+        type=str,
+        required=True,
+        help="path to save the summary to. should end with .csv, .parquet or .arrow",
+    )
+    parser.add_argument(
+        "--n_seeds", type=int, default=100, help="number of base point sets per ratio"
+    )
+    parser.add_argument(
+        "--n_draws",
+        type=int,
+        default=10,
+        help="number of draws (weights/subsamples) per base point set",
+    )
+    parser.add_argument(
+        "--k_vals",
+        type=list_of_int,
+        default=[2, 3, 4],
+        help="numbers of iterations (comma separated)",
+    )
+    parser.add_argument(
+        "--total_points", type=int, default=500, help="number of points per point set"
+    )
+    parser.add_argument(
+        "--weight_method",
+        type=str,
+        default=WEIGHT_UNIFORM,
+        help=f"how to weight points, choose from: {WEIGHT_UNIFORM, WEIGHT_MAJORITY}",
+    )
+    parser.add_argument(
+        "--subsample_ratio",
+        type=float,
+        default=None,
+        help="cut a random subsample of this ratio of each point set (optional)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of worker processes",
+    )
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # raises if the format of save_path is not supported
+    get_format(args.save_path)
+    save_dir = os.path.dirname(args.save_path)
+    if len(save_dir) > 0:
+        os.makedirs(save_dir, exist_ok=True)
+
+    ratios = [1 / 4, 1 / 3, 2 / 5]
+    ppcs = _get_ppcs(args.total_points, ratios)
+    tasks = get_ensemble_tasks(
+        ppcs,
+        list(range(args.n_seeds)),
+        args.n_draws,
+        args.k_vals,
+        args.weight_method,
+        args.subsample_ratio,
+    )
+    print(f"Running {len(tasks)} tasks on {args.workers} workers...")
+    summaries = run_ensemble(tasks, args.workers)
+    rows = [
+        {
+            "points_per_color": list(ppc),
+            "weight_method": args.weight_method,
+            "subsample_ratio": args.subsample_ratio,
+            **summary.to_row(),
+        }
+        for (ppc, _), summary in sorted(summaries.items())
+    ]
+    save_results(rows, args.save_path)
+    print("Saved results to:", args.save_path)
@@ -10,14 +10,15 @@ import argparse
 import logging
 import os
 import time
+from typing import Optional
 
 import numpy as np
-import pandas as pd
-from tqdm import tqdm
 
-from iterative_ham import get_iterative_hs_cuts
+from iterative_ham import get_iterative_hs_cuts, iterative_hs_cuts_over_k
 from point_set import ColorPointSet, subsample
+from results_store import CSV, get_eval_schema, get_format, save_results
 from utils.constants import *
+from utils.cut_cache import CutCache
 from utils.geometry import get_points_near_cuts
 from utils.region_stats import get_region_majorities
 
@@ -37,7 +38,7 @@ def _get_majority_share(region_majorites: np.ndarray, majority_color: int):
     return majority_count / len(region_majorites)
 
 
-def _eval_run(
+def _get_eval_point_sets(
     k: int,
     points_per_color: tuple,
     seed: int,
@@ -58,9 +59,17 @@ def _eval_run(
         # will swap back to original set for final eval
         og_point_set = point_set
         point_set = sub_point_set
-    regions, cuts, _, points_on_cuts, err = get_iterative_hs_cuts(
-        point_set, k, True, og_point_set
-    )
+    return point_set, og_point_set
+
+
+def _get_run_majority_share(
+    result: tuple,
+    point_set: ColorPointSet,
+    og_point_set: Optional[ColorPointSet],
+    points_per_color: tuple,
+    weight_method: str,
+):
+    regions, cuts, _, points_on_cuts, err = result
     # if using weighted case, then consider all points close to a cut to be on the cut
     majority_color = np.argmax(points_per_color)
     if weight_method == WEIGHT_MAJORITY:
@@ -70,10 +79,10 @@ def _eval_run(
         points_near_cuts = get_points_near_cuts(
             point_set.color_sets[majority_color], cuts, cut_tol
         )
-        points_on_cuts.extend(points_near_cuts)
+        points_on_cuts = points_on_cuts + points_near_cuts
         points_on_cuts = list(set(points_on_cuts))
     if not err:
-        if subsample_points:
+        if og_point_set is not None:
             point_set = og_point_set
         exclude_weights = weight_method == WEIGHT_MAJORITY
         majorities = get_region_majorities(
@@ -84,28 +93,119 @@ def _eval_run(
         return -1
 
 
-def evaluate_params(
+def _eval_run(
+    k: int,
+    points_per_color: tuple,
+    seed: int,
+    weight_method: str,
+    subsample_points: bool,
+    subsample_ratio: float,
+    cache: Optional[CutCache] = None,
+):
+    """
+    Returns (majority_share, {stage: runtime of stage}).
+    """
+    t0 = time.time()
+    point_set, og_point_set = _get_eval_point_sets(
+        k, points_per_color, seed, weight_method, subsample_points, subsample_ratio
+    )
+    t_cut = time.time()
+    result = get_iterative_hs_cuts(point_set, k, True, og_point_set, cache)
+    t_stats = time.time()
+    majority_share = _get_run_majority_share(
+        result, point_set, og_point_set, points_per_color, weight_method
+    )
+    stage_times = {
+        "generate_time": t_cut - t0,
+        "cut_time": t_stats - t_cut,
+        "stats_time": time.time() - t_stats,
+    }
+    return majority_share, stage_times
+
+
+def _eval_runs_over_k(
+    k_vals: list[int],
+    points_per_color: tuple,
+    seed: int,
+    weight_method: str,
+    subsample_points: bool,
+    subsample_ratio: float,
+    cache: Optional[CutCache] = None,
+):
+    """
+    Same as calling _eval_run for each k, but the cut hierarchy is only built once.
+    Only valid when the point set does not depend on k (i.e., not for majority weighting).
+    Yields (k, majority_share, {stage: runtime of stage}), where the generation and cut times include the
+    shared work for levels < k (but not the stats of other k).
+    """
+    t0 = time.time()
+    point_set, og_point_set = _get_eval_point_sets(
+        max(k_vals), points_per_color, seed, weight_method, subsample_points, subsample_ratio
+    )
+    generate_time = time.time() - t0
+    cut_time = 0.0
+    t_cut = time.time()
+    for k, result in iterative_hs_cuts_over_k(
+        point_set, k_vals, True, og_point_set, cache
+    ):
+        cut_time += time.time() - t_cut
+        t_stats = time.time()
+        majority_share = _get_run_majority_share(
+            result, point_set, og_point_set, points_per_color, weight_method
+        )
+        stage_times = {
+            "generate_time": generate_time,
+            "cut_time": cut_time,
+            "stats_time": time.time() - t_stats,
+        }
+        yield k, majority_share, stage_times
+        t_cut = time.time()
+
+
+def _k_dependent_point_set(weight_method: str) -> bool:
+    # majority weighting picks its weighted points based on the number of regions (2^k)
+    return weight_method == WEIGHT_MAJORITY
+
+
+def iter_eval_rows(
     k_vals: list[int],
     ppcs: list[list[int]],
     seeds: list[int],
     use_subsampling: bool,
     subsample_ratios: list[float],
     weight_method: str,
+    cache: Optional[CutCache] = None,
 ):
+    """
+    Yields the result rows of each (seed, points_per_color) as soon as they are computed.
+    runtime is the sum of the stage times (generate_time, cut_time, stats_time).
+    """
+    from tqdm import tqdm
+
     if subsample_ratios is None:
         assert not (use_subsampling)
         subsample_ratios = [0.0]
-    results_rows = []
     for seed in tqdm(seeds, desc="seed progress", unit="seed"):
         for ppc in ppcs:
+            # (k, sr) -> (majority_share, stage_times)
+            run_results = {}
+            if _k_dependent_point_set(weight_method):
+                for k in k_vals:
+                    for sr in subsample_ratios:
+                        run_results[(k, sr)] = _eval_run(
+                            k, ppc, seed, weight_method, use_subsampling, sr, cache
+                        )
+            else:
+                # build cut hierarchy once up to max(k_vals) and reuse shallower levels
+                for sr in subsample_ratios:
+                    for k, majority_share, stage_times in _eval_runs_over_k(
+                        k_vals, ppc, seed, weight_method, use_subsampling, sr, cache
+                    ):
+                        run_results[(k, sr)] = (majority_share, stage_times)
             for k in k_vals:
                 for sr in subsample_ratios:
-                    t0 = time.time()
-                    majority_share = _eval_run(
-                        k, ppc, seed, weight_method, use_subsampling, sr
-                    )
-                    runtime = time.time() - t0  # in seconds
-                    row = {
+                    majority_share, stage_times = run_results[(k, sr)]
+                    yield {
                         "k": k,
                         "points_per_color": ppc,
                         "seed": seed,
@@ -113,10 +213,38 @@ def evaluate_params(
                         "use_subsampling": use_subsampling,
                         "subsample_ratio": sr,
                         "majority_share": majority_share,
-                        "runtime": runtime,
+                        "runtime": sum(stage_times.values()),  # in seconds
+                        **stage_times,
                     }
-                    results_rows.append(row)
-    return results_rows
+
+
+def evaluate_params(
+    k_vals: list[int],
+    ppcs: list[list[int]],
+    seeds: list[int],
+    use_subsampling: bool,
+    subsample_ratios: list[float],
+    weight_method: str,
+    cache: Optional[CutCache] = None,
+):
+    return list(
+        iter_eval_rows(
+            k_vals,
+            ppcs,
+            seeds,
+            use_subsampling,
+            subsample_ratios,
+            weight_method,
+            cache,
+        )
+    )
+
+
+def _save_rows(rows, save_path: str):
+    # rows are written as they are computed unless saving to csv
+    schema = None if get_format(save_path) == CSV else get_eval_schema()
+    save_results(rows, save_path, schema)
+    print("Saved results to:", save_path)
 
 
 def weighted_main(
@@ -124,12 +252,11 @@ def weighted_main(
     k_vals: list[int],
     seeds: list[int],
     ppcs: list[list[int]],
+    cache: Optional[CutCache] = None,
 ):
     print("Running evaluation...")
-    rows = evaluate_params(k_vals, ppcs, seeds, False, None, WEIGHT_MAJORITY)
-    df = pd.DataFrame.from_dict(rows)
-    df.to_csv(save_path)
-    print("Saved results to:", save_path)
+    rows = iter_eval_rows(k_vals, ppcs, seeds, False, None, WEIGHT_MAJORITY, cache)
+    _save_rows(rows, save_path)
 
 
 def subsample_main(
@@ -137,15 +264,16 @@ def subsample_main(
     k_vals: list[int],
     seeds: list[int],
     ppcs: list[list[int]],
+    cache: Optional[CutCache] = None,
 ):
     # subsampling
     subsample_ratios = [0.1, 0.2, 0.4]
 
     print("Running evaluation...")
-    rows = evaluate_params(k_vals, ppcs, seeds, True, subsample_ratios, WEIGHT_UNIFORM)
-    df = pd.DataFrame.from_dict(rows)
-    df.to_csv(save_path)
-    print("Saved results to:", save_path)
+    rows = iter_eval_rows(
+        k_vals, ppcs, seeds, True, subsample_ratios, WEIGHT_UNIFORM, cache
+    )
+    _save_rows(rows, save_path)
 
 
 def parse_args():
@@ -163,7 +291,19 @@ def parse_args():
         "--save_path",
         type=str,
         required=True,
-        help="path to save results file to. should end with .csv",
+        help="path to save results file to. should end with .csv, .parquet or .arrow",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="directory used to cache computed cuts between runs (optional)",
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=int,
+        default=512,
+        help="maximum size of the cut cache in MB, least recently used cuts are evicted first",
     )
     args = parser.parse_args()
     return args
@@ -171,9 +311,8 @@ def parse_args():
 
 if __name__ == "__main__":
     args = parse_args()
-    assert args.save_path.endswith(
-        ".csv"
-    ), f"save_path must end with .csv, given:{args.save_path}"
+    # raises if the format of save_path is not supported
+    get_format(args.save_path)
 
     # make sure save dir exists
     save_dir = os.path.dirname(args.save_path)
@@ -187,10 +326,13 @@ if __name__ == "__main__":
     seeds = np.arange(0, 10, dtype="int")
     ratios = [1 / 4, 1 / 3, 2 / 5]
     ppcs = _get_ppcs(total_points, ratios)
+    cache = None
+    if args.cache_dir is not None:
+        cache = CutCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
 
     if args.method.lower() == "weighted":
-        weighted_main(args.save_path, k_vals, seeds, ppcs)
+        weighted_main(args.save_path, k_vals, seeds, ppcs, cache)
     elif args.method.lower() == "subsampling":
-        subsample_main(args.save_path, k_vals, seeds, ppcs)
+        subsample_main(args.save_path, k_vals, seeds, ppcs, cache)
     else:
         raise ValueError(f"Unrecognized method: {args.method}")
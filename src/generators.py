@@ -0,0 +1,235 @@
+"""
+Description:
+Vectorized generators of synthetic colored point sets (see the color sampling methods in utils/constants.py).
+Each generator returns columnar arrays (x, y, colors) for a rectangular domain bounds =
+(lower_x, upper_x, lower_y, upper_y), so benchmark-scale inputs (10^7+ points) take seconds to generate.
+    - RANDOM: uniform points, colors independent of location.
+    - CLUSTERED: segregated clusters, each dominated by one color.
+    - POPULATION_CENTERS: gaussian clusters around centers of varying (log-normal) population and color mix.
+    - GRADIENT: uniform points, the share of each color changes gradually across the domain.
+The rng defaults to np.random, so np.random.seed makes the output reproducible.
+Run as a script to save a point set as an .npz file (x, y, color) that districting_service.py can load.
+"""
+
+import argparse
+
+import numpy as np
+
+from utils.constants import *
+
+DEFAULT_BOUNDS = (LOWER_X, UPPER_X, LOWER_Y, UPPER_Y)
+
+
+def get_square_bounds(domain_size: float) -> tuple:
+    # square domain centered at the origin
+    half = domain_size / 2
+    return (-half, half, -half, half)
+
+
+def uniform_points(n_points: int, bounds: tuple, rng=np.random) -> tuple:
+    lower_x, upper_x, lower_y, upper_y = bounds
+    x = rng.uniform(lower_x, upper_x, n_points)
+    y = rng.uniform(lower_y, upper_y, n_points)
+    return x, y
+
+
+def _color_column(points_per_color: list[int]) -> np.ndarray:
+    # colors[i] = c for the points_per_color[c] points of each color, in order of color
+    return np.repeat(np.arange(len(points_per_color)), points_per_color)
+
+
+def _normal_in_bounds(
+    mean_x: np.ndarray, mean_y: np.ndarray, std: np.ndarray, bounds: tuple, rng
+) -> tuple:
+    # sample a point around each mean, points outside bounds are drawn again (not clipped, which
+    # would put many points on the same boundary line)
+    lower_x, upper_x, lower_y, upper_y = bounds
+    x = np.empty(len(mean_x))
+    y = np.empty(len(mean_y))
+    todo = np.arange(len(mean_x))
+    while len(todo) > 0:
+        x[todo] = rng.normal(mean_x[todo], std[todo])
+        y[todo] = rng.normal(mean_y[todo], std[todo])
+        inside = (
+            (x[todo] >= lower_x)
+            & (x[todo] <= upper_x)
+            & (y[todo] >= lower_y)
+            & (y[todo] <= upper_y)
+        )
+        todo = todo[~inside]
+    return x, y
+
+
+def _sample_around_centers(
+    points_per_color: list[int],
+    center_x: np.ndarray,
+    center_y: np.ndarray,
+    center_std: np.ndarray,
+    color_weights: np.ndarray,
+    bounds: tuple,
+    rng,
+) -> tuple:
+    """
+    color_weights[i, c] is the (relative) number of points of color c around center i.
+    Each point of color c picks a center with probability proportional to color_weights[:, c].
+    """
+    center_idx = np.empty(sum(points_per_color), dtype=np.int64)
+    start = 0
+    for c, n in enumerate(points_per_color):
+        p = color_weights[:, c] / np.sum(color_weights[:, c])
+        center_idx[start : start + n] = rng.choice(len(p), size=n, p=p)
+        start += n
+    x, y = _normal_in_bounds(
+        center_x[center_idx], center_y[center_idx], center_std[center_idx], bounds, rng
+    )
+    return x, y, _color_column(points_per_color)
+
+
+def clustered_points(
+    points_per_color: list[int],
+    bounds: tuple,
+    rng=np.random,
+    n_clusters: int = 8,
+    segregation: float = 0.8,
+    spread: float = 0.05,
+) -> tuple:
+    """
+    n_clusters clusters of equal size, cluster i is dominated by color i % n_colors: a share
+    segregation + (1 - segregation) / n_colors of its points has that color (1 is fully segregated,
+    0 is not segregated at all). spread is the standard deviation of a cluster relative to the domain width.
+    """
+    n_colors = len(points_per_color)
+    center_x, center_y = uniform_points(n_clusters, bounds, rng)
+    center_std = np.full(n_clusters, spread * (bounds[1] - bounds[0]))
+    color_weights = np.full((n_clusters, n_colors), (1 - segregation) / n_colors)
+    color_weights[np.arange(n_clusters), np.arange(n_clusters) % n_colors] += segregation
+    return _sample_around_centers(
+        points_per_color, center_x, center_y, center_std, color_weights, bounds, rng
+    )
+
+
+def population_center_points(
+    points_per_color: list[int],
+    bounds: tuple,
+    rng=np.random,
+    n_centers: int = 20,
+    spread: float = 0.03,
+    population_sigma: float = 1.0,
+) -> tuple:
+    """
+    Points around n_centers population centers (e.g., cities). Populations are log-normal (parameter
+    population_sigma), so a few centers hold most points, and larger centers are more spread out.
+    The color mix of each center is drawn from a flat Dirichlet distribution.
+    spread is the standard deviation of an average center relative to the domain width.
+    """
+    n_colors = len(points_per_color)
+    center_x, center_y = uniform_points(n_centers, bounds, rng)
+    populations = rng.lognormal(0.0, population_sigma, n_centers)
+    center_std = (
+        spread * (bounds[1] - bounds[0]) * np.sqrt(populations / np.mean(populations))
+    )
+    color_mix = rng.dirichlet(np.ones(n_colors), n_centers)
+    color_weights = populations[:, None] * color_mix
+    return _sample_around_centers(
+        points_per_color, center_x, center_y, center_std, color_weights, bounds, rng
+    )
+
+
+def gradient_points(
+    points_per_color: list[int],
+    bounds: tuple,
+    rng=np.random,
+    angle: float = 0.0,
+    sharpness: float = 4.0,
+) -> tuple:
+    """
+    Uniform points where color 0 is most common at one side of the domain and the last color at the other,
+    along the direction angle (in radians, 0 is left to right). Larger sharpness gives a sharper transition.
+    """
+    lower_x, upper_x, lower_y, upper_y = bounds
+    n_points = sum(points_per_color)
+    x, y = uniform_points(n_points, bounds, rng)
+    # position along the gradient scaled to [0, 1]
+    dx, dy = np.cos(angle), np.sin(angle)
+    t = (x - lower_x) * dx + (y - lower_y) * dy
+    t_min = min(0.0, (upper_x - lower_x) * dx) + min(0.0, (upper_y - lower_y) * dy)
+    t_max = max(0.0, (upper_x - lower_x) * dx) + max(0.0, (upper_y - lower_y) * dy)
+    t = (t - t_min) / (t_max - t_min)
+    # rank the points by their noisy position, lowest ranks get color 0
+    score = sharpness * t + rng.logistic(size=n_points)
+    colors = np.empty(n_points, dtype=np.int64)
+    colors[np.argsort(score)] = _color_column(points_per_color)
+    return x, y, colors
+
+
+def generate_points(
+    color_method: str, points_per_color: list[int], bounds: tuple, rng=np.random
+) -> tuple:
+    """
+    Returns (x, y, colors) generated with the given color sampling method.
+    """
+    if color_method == RANDOM:
+        x, y = uniform_points(sum(points_per_color), bounds, rng)
+        return x, y, _color_column(points_per_color)
+    elif color_method == CLUSTERED:
+        return clustered_points(points_per_color, bounds, rng)
+    elif color_method == POPULATION_CENTERS:
+        return population_center_points(points_per_color, bounds, rng)
+    elif color_method == GRADIENT:
+        return gradient_points(points_per_color, bounds, rng)
+    else:
+        raise NotImplementedError(f"Given color_method not supported: {color_method}")
+
+
+def save_points_npz(save_path: str, x: np.ndarray, y: np.ndarray, colors: np.ndarray):
+    np.savez(save_path, x=x, y=y, color=colors)
+
+
+def list_of_int(arg):
+    return list(map(int, arg.split(",")))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="generators",
+        description="Generate a synthetic colored point set and save it as an .npz file",
+    )
+    parser.add_argument(
+        "--points_per_color",
+        required=True,
+        type=list_of_int,
+        help="number of points to use for each color",
+    )
+    parser.add_argument(
+        "--color_method",
+        type=str,
+        default=CLUSTERED,
+        help=f"method for sampling color points, choose from: {RANDOM, CLUSTERED, POPULATION_CENTERS, GRADIENT}",
+    )
+    parser.add_argument(
+        "--domain_size",
+        type=float,
+        default=None,
+        help="width/height of the (square) domain, defaults to the domain in utils/constants.py",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument(
+        "--save_path", type=str, required=True, help="path to save the .npz file to"
+    )
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    import time
+
+    args = parse_args()
+    bounds = DEFAULT_BOUNDS
+    if args.domain_size is not None:
+        bounds = get_square_bounds(args.domain_size)
+    np.random.seed(args.seed)
+    t0 = time.time()
+    x, y, colors = generate_points(args.color_method, args.points_per_color, bounds)
+    print(f"Generated {len(x)} points in {time.time() - t0:.2f}s")
+    save_points_npz(args.save_path, x, y, colors)
+    print("Saved points to:", args.save_path)
@@ -4,16 +4,25 @@ Date: 4/6/2024
 Description:
 Implementation of (unweighted) ham-sandwich algo in 2D.
 Based on the implementation here: https://github.com/anjali411/Ham-Sandwich-Cut/blob/master/hamSandwichCut.py
+
+Degenerate inputs are handled with a simulation of simplicity (SoS) style perturbation, see:
+https://arxiv.org/abs/math/9410209. Dual line i (over both colors) is treated as if it were raised by
+eps^(i+1) for an infinitesimal eps > 0, so ties between median levels are always broken the same way
+and no points need to be moved.
+
+Points can have (integer) multiplicities, see ColorPointSet.multiplicities. A point with multiplicity w
+is treated as w copies of the point with consecutive indices, without creating the copies.
 """
 
-import logging
+from typing import Optional
 
 import numpy as np
-from shapely import LineString, MultiPoint, Point
+from shapely import get_coordinates
 
 from point_set import ColorPointSet
-from utils.dual import uw_dual_to_lines
-from utils.geometry import Line, get_line_intersection
+from utils.dual import uw_dual_to_exact_lines, uw_dual_to_lines
+from utils.exact import exact_median, has_degenerate_duals, is_exact, to_fraction
+from utils.geometry import Line, get_line_intersection_x
 
 
 def get_line_y_intercepts(lines: list[Line]):
@@ -23,98 +32,421 @@ def get_line_y_intercepts(lines: list[Line]):
 
 def find_median_level(x: float, lines: list[Line]):
     y_vals = [line.get_y(x) for line in lines]
+    if is_exact(x):
+        return exact_median(y_vals)
     return np.median(y_vals)
 
 
-def odd_intersection(interval, c1_duals, c2_duals):
-    left = interval[0]
-    right = interval[1]
+def _perturbed_order(x: float, lines: list[Line]):
+    """
+    Returns (y-values at x, order of the perturbed lines at x from lowest to highest).
+    """
+    y_vals = [line.get_y(x) for line in lines]
+    # for tied levels the line with the smaller index is higher
+    if is_exact(x):
+        order = sorted(range(len(y_vals)), key=lambda i: (y_vals[i], -i))
+        return y_vals, np.array(order, dtype=int)
+    return y_vals, np.lexsort((-np.arange(len(y_vals)), y_vals))
+
+
+def _n_copies(lines: list, weights: Optional[np.ndarray] = None) -> int:
+    return len(lines) if weights is None else int(np.sum(weights))
+
+
+def _median_positions(
+    order, first_index: int = 0, weights: Optional[np.ndarray] = None
+) -> list[tuple]:
+    """
+    Returns (line, perturbation index) of the middle copy (or two middle copies) in order.
+    The copies of line i (see weights) have indices starting at first_index + sum(weights[:i]),
+    and are tied so the copy with the largest index is the lowest.
+    """
+    n = _n_copies(order, weights)
+    mid = n // 2
+    ranks = [mid] if n % 2 == 1 else [mid - 1, mid]
+    if weights is None:
+        return [(order[r], first_index + order[r]) for r in ranks]
+    order = np.asarray(order)
+    sorted_weights = weights[order]
+    cum_weights = np.cumsum(sorted_weights)
+    starts = np.cumsum(weights) - weights
+    positions = []
+    for r in ranks:
+        p = int(np.searchsorted(cum_weights, r, side="right"))
+        i = order[p]
+        # number of copies of line i below this copy
+        t = r - (cum_weights[p] - sorted_weights[p])
+        positions.append((i, first_index + int(starts[i] + weights[i] - 1 - t)))
+    return positions
+
+
+def _order_median(
+    y_vals: list,
+    order: np.ndarray,
+    first_index: int = 0,
+    weights: Optional[np.ndarray] = None,
+):
+    positions = _median_positions(order, first_index, weights)
+    if len(positions) == 1:
+        i, idx = positions[0]
+        return y_vals[i], idx
+    (i, idx_i), (j, idx_j) = positions
+    return (y_vals[i] + y_vals[j]) / 2, min(idx_i, idx_j)
+
+
+def find_perturbed_median_level(
+    x: float,
+    lines: list[Line],
+    first_index: int = 0,
+    weights: Optional[np.ndarray] = None,
+):
+    """
+    Median level at x of the perturbed lines, where lines[i] has index first_index + i
+    (or weights[i] copies, see _median_positions).
+    Returns (level, index of the dominant perturbation term of the level). The level is the same
+    as find_median_level.
+    """
+    y_vals, order = _perturbed_order(x, lines)
+    return _order_median(y_vals, order, first_index, weights)
+
+
+def _sign(v) -> int:
+    return int(v > 0) - int(v < 0)
 
-    lm_c1 = find_median_level(left, c1_duals)
-    lm_c2 = find_median_level(left, c2_duals)
 
-    rm_c1 = find_median_level(right, c1_duals)
-    rm_c2 = find_median_level(right, c2_duals)
+def _perturbed_sign(m1: tuple, m2: tuple) -> int:
+    """
+    Sign of m1 - m2 for perturbed levels (see find_perturbed_median_level), never 0.
+    """
+    d = _sign(m1[0] - m2[0])
+    if d != 0:
+        return d
+    # the level with the smallest index has the largest perturbation
+    return 1 if m1[1] < m2[1] else -1
 
+
+def _level_sign(
+    x: float, c1_duals: list[Line], c2_duals: list[Line], weights: Optional[tuple] = None
+) -> int:
+    w1, w2 = weights if weights is not None else (None, None)
+    return _perturbed_sign(
+        find_perturbed_median_level(x, c1_duals, 0, w1),
+        find_perturbed_median_level(x, c2_duals, _n_copies(c1_duals, w1), w2),
+    )
+
+
+def odd_intersection(interval, c1_duals, c2_duals, weights: Optional[tuple] = None):
     # see Remark (3.1) of https://www.cs.jhu.edu/~misha/Spring16/Lo94.pdf
-    return (lm_c1 - lm_c2) * (rm_c1 - rm_c2) < 0
-
-
-def get_intersections(interval, duals):
-    intersections = []
-    for i in range(len(duals)):
-        for j in range(len(duals)):
-            if i < j:
-                intersection_ = get_line_intersection(duals[i], duals[j])
-                if intersection_ is None:
-                    logging.warn(
-                        f"Dual-lines {i} and {j} are parallel - results may be incorrect. Check that points are in general position."
-                    )
-                elif intersection_.x == np.inf:
-                    pass
-                elif interval[0] < intersection_.x and interval[1] > intersection_.x:
-                    intersections.append(intersection_)
-                else:
-                    pass
-
-    intersections.sort(key=lambda I: I.x)
-    return intersections
-
-
-def get_med_linestring(interval, duals, intersections):
-    med_levels = [Point(interval[0], find_median_level(interval[0], duals))]
-    med_levels.extend(
-        [Point(inter.x, find_median_level(inter.x, duals)) for inter in intersections]
+    # the perturbed levels never tie, so a crossing at either end of the interval is not missed
+    left_sign = _level_sign(interval[0], c1_duals, c2_duals, weights)
+    right_sign = _level_sign(interval[1], c1_duals, c2_duals, weights)
+    return left_sign != right_sign
+
+
+def _ranks(order: np.ndarray) -> np.ndarray:
+    # position of each line in order
+    ranks = np.empty(len(order), dtype=int)
+    ranks[order] = np.arange(len(order))
+    return ranks
+
+
+def get_intersection_xs(interval, duals):
+    """
+    Returns the sorted x-coordinates of the intersections between dual lines inside of interval.
+    Exact if the dual lines are exact.
+    Two lines cross inside of the interval iff their order at the two ends is inverted, so only
+    the inverted pairs are checked rather than all pairs.
+    """
+    n = len(duals)
+    if n < 2:
+        return []
+    _, left_order = _perturbed_order(interval[0], duals)
+    _, right_order = _perturbed_order(interval[1], duals)
+    # rank at the right end of the lines in their order at the left end
+    r = _ranks(right_order)[left_order]
+    # an inverted pair (p < q, r[p] > r[q]) has q - p < 2 * max |r[p] - p|
+    max_disp = int(np.max(np.abs(r - np.arange(n))))
+    xs = set()
+    for delta in range(1, min(2 * max_disp, n - 1) + 1):
+        for p in np.nonzero(r[:-delta] > r[delta:])[0]:
+            l1, l2 = duals[left_order[p]], duals[left_order[p + delta]]
+            x = get_line_intersection_x(l1, l2)
+            if x is not None and interval[0] < x < interval[1]:
+                xs.add(x)
+    return sorted(xs)
+
+
+def _midpoint(interval):
+    if is_exact(interval[0]):
+        return (interval[0] + interval[1]) / 2
+    return float((interval[0] + interval[1]) / 2.0)
+
+
+def _dual_to_cut(x, y) -> Line:
+    # dual of point (x, y) is the line with slope x, y-intercept -y
+    if is_exact(x):
+        return Line(slope=x, y_int=-y)
+    return Line(slope=float(x), y_int=-float(y))
+
+
+def level_crossings(levels: list, level_sign) -> list[tuple]:
+    """
+    Get the points (x, y) where the perturbed median levels cross, given the levels (x, m1, m2) at
+    every breakpoint of the median levels in increasing order of x (see median_intersection).
+    level_sign(x) is the perturbed sign of m1 - m2 at x.
+    """
+    crossings = []
+    sign = _perturbed_sign(levels[0][1], levels[0][2])
+    for (x0, m1_0, m2_0), (x1, m1_1, m2_1) in zip(levels, levels[1:]):
+        d0 = _sign(m1_0[0] - m2_0[0])
+        d1 = _sign(m1_1[0] - m2_1[0])
+        if d0 * d1 < 0:
+            if sign != d0:
+                crossings.append((x0, m1_0[0]))
+            # crossing strictly inside of this piece
+            t = (m1_0[0] - m2_0[0]) / ((m1_0[0] - m2_0[0]) - (m1_1[0] - m2_1[0]))
+            crossings.append((x0 + t * (x1 - x0), m1_0[0] + t * (m1_1[0] - m1_0[0])))
+            sign = d1
+            continue
+        if d0 != 0 or d1 != 0:
+            piece_sign = d0 if d0 != 0 else d1
+        else:
+            # levels overlap on this piece, only the perturbation decides
+            piece_sign = level_sign(_midpoint((x0, x1)))
+        if piece_sign != sign:
+            crossings.append((x0, m1_0[0]))
+            sign = piece_sign
+    x_end, m1_end, m2_end = levels[-1]
+    if _perturbed_sign(m1_end, m2_end) != sign:
+        crossings.append((x_end, m1_end[0]))
+    return crossings
+
+
+def median_intersection(interval, c1_duals, c2_duals, weights: Optional[tuple] = None):
+    """
+    Get the cuts (duals of the points where the perturbed median levels cross) inside of interval.
+    The median levels are piecewise-linear with breakpoints at the intersections of the dual lines,
+    so evaluate both at every breakpoint and solve for the crossings on each linear piece.
+    weights is None or the multiplicities (c1 weights, c2 weights) of the dual lines.
+    """
+    xs = {interval[0], interval[1]}
+    xs.update(get_intersection_xs(interval, c1_duals))
+    xs.update(get_intersection_xs(interval, c2_duals))
+    xs = sorted(xs)
+    w1, w2 = weights if weights is not None else (None, None)
+    n1 = _n_copies(c1_duals, w1)
+    levels = [
+        (
+            x,
+            find_perturbed_median_level(x, c1_duals, 0, w1),
+            find_perturbed_median_level(x, c2_duals, n1, w2),
+        )
+        for x in xs
+    ]
+    crossings = level_crossings(
+        levels, lambda x: _level_sign(x, c1_duals, c2_duals, weights)
+    )
+    return [_dual_to_cut(x, y) for x, y in crossings]
+
+
+def _median_at_infinity(
+    lines: list[Line],
+    direction: int,
+    first_index: int = 0,
+    weights: Optional[np.ndarray] = None,
+):
+    """
+    Returns (slope, y-intercept, perturbation index) of the perturbed median level as
+    x -> direction * inf, where the order of the lines no longer changes.
+    """
+    order = sorted(
+        range(len(lines)),
+        key=lambda i: (direction * lines[i].slope, lines[i].y_int, -i),
     )
-    med_levels.extend([Point(interval[1], find_median_level(interval[1], duals))])
-    return LineString(med_levels)
+    positions = _median_positions(order, first_index, weights)
+    if len(positions) == 1:
+        i, idx = positions[0]
+        return lines[i].slope, lines[i].y_int, idx
+    (i, idx_i), (j, idx_j) = positions
+    slope = (lines[i].slope + lines[j].slope) / 2
+    y_int = (lines[i].y_int + lines[j].y_int) / 2
+    return slope, y_int, min(idx_i, idx_j)
+
+
+def _vertex_bound(lines: list[Line]):
+    """
+    Bound on |x| for every vertex of the arrangement of lines: two lines with slopes a1 != a2
+    and intercepts b1, b2 cross at x = (b2 - b1) / (a1 - a2).
+    """
+    slopes = sorted(set(l.slope for l in lines))
+    y_ints = [l.y_int for l in lines]
+    if len(slopes) < 2:
+        return 0
+    min_gap = min(s2 - s1 for s1, s2 in zip(slopes, slopes[1:]))
+    return (max(y_ints) - min(y_ints)) / min_gap
+
+
+def _search_bracket(
+    c1_duals: list[Line],
+    c2_duals: list[Line],
+    exact: bool,
+    weights: Optional[tuple] = None,
+):
+    """
+    Get an interval which contains every crossing of the perturbed median levels, and whether
+    the levels cross an odd number of times in it (their signs at the two ends differ).
+    Outside of the vertex bound both medians are fixed (averages of) lines, so a crossing there
+    (only possible for even-sized colors) can be solved for directly.
+    """
+    w1, w2 = weights if weights is not None else (None, None)
+    n1 = _n_copies(c1_duals, w1)
+    bound = _vertex_bound(c1_duals + c2_duals) + 1
+    if exact:
+        bound = to_fraction(bound)
+    ends = []
+    signs = []
+    for direction in (-1, 1):
+        s1, b1, i1 = _median_at_infinity(c1_duals, direction, 0, w1)
+        s2, b2, i2 = _median_at_infinity(c2_duals, direction, n1, w2)
+        end = direction * bound
+        if s1 != s2:
+            root = (b2 - b1) / (s1 - s2)
+            # a crossing exactly at the bound would be hidden by the perturbation there
+            if direction * root >= bound:
+                end = 2 * root
+            sign = _sign(direction * (s1 - s2))
+        else:
+            sign = _perturbed_sign((b1, i1), (b2, i2))
+        ends.append(end)
+        signs.append(sign)
+    return (ends[0], ends[1]), signs[0] != signs[1]
+
 
+class _SearchEnd:
+    """
+    State of the perturbed median levels at one end of the search interval.
+    """
 
-def median_intersection(interval, c1_duals, c2_duals):
-    c1_intersections = get_intersections(interval, c1_duals)
-    c2_intersections = get_intersections(interval, c2_duals)
+    def __init__(
+        self,
+        x: float,
+        c1_duals: list[Line],
+        c2_duals: list[Line],
+        weights: Optional[tuple] = None,
+    ) -> None:
+        self.x = x
+        w1, w2 = weights if weights is not None else (None, None)
+        y1, order1 = _perturbed_order(x, c1_duals)
+        y2, order2 = _perturbed_order(x, c2_duals)
+        self.sign = _perturbed_sign(
+            _order_median(y1, order1, 0, w1),
+            _order_median(y2, order2, _n_copies(c1_duals, w1), w2),
+        )
+        self.ranks = (_ranks(order1), _ranks(order2))
 
-    c1_med_linestring = get_med_linestring(interval, c1_duals, c1_intersections)
-    c2_med_linestring = get_med_linestring(
-        interval,
-        c2_duals,
-        c2_intersections,
+
+def _vertices_upper_bound(left: _SearchEnd, right: _SearchEnd) -> int:
+    # the number of inverted pairs (= vertices between the ends) is at most the
+    # Spearman footrule distance between the orders at the ends
+    return sum(
+        int(np.sum(np.abs(l_ranks - r_ranks)))
+        for l_ranks, r_ranks in zip(left.ranks, right.ranks)
     )
 
-    ham_cut_points = c1_med_linestring.intersection(c2_med_linestring)
-    if isinstance(ham_cut_points, LineString):
-        ham_cut_points = list(ham_cut_points.coords)
-    elif isinstance(ham_cut_points, MultiPoint):
-        ham_cut_points = list(ham_cut_points.geoms)
-    elif isinstance(ham_cut_points, Point):
-        ham_cut_points = [ham_cut_points]
-    ham_cut_dual = uw_dual_to_lines(ham_cut_points)
-    return ham_cut_dual
 
+def _find_cuts(
+    c1_duals: list[Line],
+    c2_duals: list[Line],
+    exact: bool,
+    weights: Optional[tuple] = None,
+):
+    """
+    Binary search for the crossing(s) of the median levels. Returns None if the median levels
+    never cross.
+    The search stops once few enough arrangement vertices remain in the interval to check all
+    of them directly, since the median levels are linear between vertices. The check is exact
+    for any interval, so stopping early only costs time.
+    If the levels have the same sign at both ends of the bracket they cross an even number of
+    times, possibly zero (e.g., for points on a grid). Bisection cannot find these crossings, so
+    the levels are checked at every vertex of the bracket instead, which is slower but rare
+    (the median slopes at both ends must be equal).
+    """
+    bracket, odd_crossings = _search_bracket(c1_duals, c2_duals, exact, weights)
+    if not odd_crossings:
+        ham_cuts = median_intersection(bracket, c1_duals, c2_duals, weights)
+        return ham_cuts if len(ham_cuts) > 0 else None
+    max_vertices = len(c1_duals) + len(c2_duals)
+    left = _SearchEnd(bracket[0], c1_duals, c2_duals, weights)
+    right = _SearchEnd(bracket[1], c1_duals, c2_duals, weights)
+    # many lines can meet at a single vertex, so also stop at floating-point resolution
+    min_width = (bracket[1] - bracket[0]) * np.finfo(np.float64).eps
 
-def get_ham_sandwich_cut(point_set: ColorPointSet):
+    # binary search
+    while _vertices_upper_bound(left, right) > max_vertices:
+        mid_x = _midpoint((left.x, right.x))
+        if right.x - left.x <= min_width or not (left.x < mid_x < right.x):
+            break
+        mid = _SearchEnd(mid_x, c1_duals, c2_duals, weights)
+        if mid.sign != left.sign:
+            right = mid
+        else:
+            left = mid
+    ham_cuts = median_intersection((left.x, right.x), c1_duals, c2_duals, weights)
+    return ham_cuts
+
+
+def _vertical_cut(
+    c1_points: list, c2_points: list, exact: bool, weights: Optional[tuple] = None
+) -> list[Line]:
+    """
+    If the perturbed median levels never cross then the cut is vertical, which can happen
+    when both colors have the same median x-coordinate (e.g., for points on a grid).
+    A vertical line x=x_v bisects a color iff x_v is between its middle x-values.
+    """
+    lower, upper = -np.inf, np.inf
+    for c, c_points in enumerate((c1_points, c2_points)):
+        xs = get_coordinates(list(c_points))[:, 0]
+        order = np.argsort(xs, kind="stable")
+        xs = xs[order]
+        if weights is None:
+            cum_weights = np.arange(1, len(xs) + 1)
+        else:
+            cum_weights = np.cumsum(weights[c][order])
+        n = cum_weights[-1]
+        lower = max(lower, xs[np.searchsorted(cum_weights, (n - 1) // 2, side="right")])
+        upper = min(upper, xs[np.searchsorted(cum_weights, n // 2, side="right")])
+    if lower > upper:
+        return []
+    x_int = to_fraction(lower) if exact else float(lower)
+    return [Line(x_int=x_int)]
+
+
+def get_ham_sandwich_cut(point_set: ColorPointSet, exact: Optional[bool] = None):
+    """
+    Get the ham-sandwich cut(s) of the given 2-color point set.
+    If exact is True, the search is done with rational arithmetic, which gives correct cuts for
+    degenerate inputs (e.g., points sharing coordinates). If exact is None, exact arithmetic is only
+    used when the input is degenerate and the (faster) floating-point search is used otherwise.
+    If point_set has multiplicities the cut bisects the points counted with their multiplicities.
+    No cuts are returned if either color has no points.
+    """
     if point_set.n_colors != 2:
         raise ValueError("Ham-sandwich cuts in 2D only can support 2 colors!")
-    min_interval_size = 1
     c1_points = point_set.color_sets[0]
     c2_points = point_set.color_sets[1]
+    if len(c1_points) == 0 or len(c2_points) == 0:
+        return []
+    if exact is None:
+        exact = has_degenerate_duals(point_set)
+    weights = None
+    if point_set.multiplicities is not None:
+        weights = (point_set.multiplicities[0], point_set.multiplicities[1])
 
     # get duals and y-intercepts of dual lines
-    c1_duals = uw_dual_to_lines(c1_points)
-    c2_duals = uw_dual_to_lines(c2_points)
-
-    # get initial interval for binary search
-    # theoretically should be (-inf, +inf), but very large values work for most cases
-    interval = (-1e11, 1e11)
-
-    # binary search
-    while (interval[1] - interval[0]) > min_interval_size:
-        mid = float((interval[0] + interval[1]) / 2.0)
-        left_int = [interval[0], mid]
-        right_int = [mid, interval[1]]
-        if odd_intersection(left_int, c1_duals, c2_duals):
-            interval = left_int
-        else:
-            interval = right_int
-    ham_cuts = median_intersection(interval, c1_duals, c2_duals)
+    to_duals = uw_dual_to_exact_lines if exact else uw_dual_to_lines
+    c1_duals = to_duals(c1_points)
+    c2_duals = to_duals(c2_points)
+    ham_cuts = _find_cuts(c1_duals, c2_duals, exact, weights)
+    if ham_cuts is None:
+        ham_cuts = _vertical_cut(c1_points, c2_points, exact, weights)
     return ham_cuts
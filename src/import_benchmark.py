@@ -0,0 +1,123 @@
+"""
+Description:
+Import-time benchmark for the compute entry points.
+
+Each module is imported in a fresh interpreter (so nothing is cached by earlier imports) and the script fails
+if a compute module pulls in a plotting/dataframe library or takes longer than the time budget to import.
+The libraries every compute module needs (BASELINE_MODULES) are imported first in the same interpreter and
+their time is not counted, so the budget measures the imports of this repo rather than the speed of the machine.
+Run it after changing imports, e.g.: python import_benchmark.py --repeats 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# modules used by compute-only runs, none of them should import HEAVY_MODULES
+COMPUTE_MODULES = [
+    "ham_sandwich",
+    "iterative_ham",
+    "point_set",
+    "coreset",
+    "checkpoint",
+    "cut_export",
+    "results_store",
+    "distributed_ham",
+    "streaming_ham_sandwich",
+    "eval_main",
+    "ensemble_main",
+    "main",
+]
+# only needed to draw figures or to save results
+HEAVY_MODULES = ["matplotlib", "pandas", "pyarrow", "tqdm", "PyQt5"]
+# needed by every compute module, imported before the timed import
+BASELINE_MODULES = ["numpy", "shapely"]
+
+_PROBE = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+for m in json.loads(sys.argv[3]):
+    importlib.import_module(m)
+t1 = time.perf_counter()
+importlib.import_module(sys.argv[1])
+t2 = time.perf_counter()
+heavy = [m for m in json.loads(sys.argv[2]) if m in sys.modules]
+print(json.dumps({"baseline_seconds": t1 - t0, "seconds": t2 - t1, "heavy": heavy}))
+"""
+
+
+def time_import(module: str) -> dict:
+    """
+    Import module in a new interpreter (after BASELINE_MODULES), returns the time of the baseline imports,
+    the import time of module on top of them and the heavy modules it loaded.
+    """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            _PROBE,
+            module,
+            json.dumps(HEAVY_MODULES),
+            json.dumps(BASELINE_MODULES),
+        ],
+        cwd=src_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def run_benchmark(modules: list[str], repeats: int, budget: float) -> bool:
+    """
+    Print the median import time of each module (without the baseline imports), returns False if any module
+    loads a heavy module or exceeds budget seconds.
+    """
+    ok = True
+    print(f"{'module':<28}{'baseline (ms)':>14}{'median (ms)':>12}  heavy imports")
+    for module in modules:
+        results = [time_import(module) for _ in range(repeats)]
+        baseline = statistics.median(r["baseline_seconds"] for r in results)
+        median = statistics.median(r["seconds"] for r in results)
+        heavy = results[0]["heavy"]
+        failed = len(heavy) > 0 or median > budget
+        ok = ok and not failed
+        status = "FAIL" if failed else ""
+        print(
+            f"{module:<28}{baseline * 1000:>14.1f}{median * 1000:>12.1f}  {', '.join(heavy) or '-'} {status}"
+        )
+    return ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="import_benchmark",
+        description="Check that compute modules import quickly and without plotting/dataframe libraries",
+    )
+    parser.add_argument(
+        "--modules",
+        type=lambda arg: arg.split(","),
+        default=COMPUTE_MODULES,
+        help="modules to benchmark (comma separated)",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3, help="number of imports per module"
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.2,
+        help="maximum median import time of a module in seconds, not counting the baseline imports",
+    )
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not run_benchmark(args.modules, args.repeats, args.budget):
+        sys.exit(1)
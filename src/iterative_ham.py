@@ -6,22 +6,33 @@ Algorithm for performing iterative ham-sandwich cuts
 """
 
 import logging
-from typing import Optional
+import multiprocessing
+from functools import partial
+from typing import Callable, NamedTuple, Optional
 
+import numpy as np
 from shapely import Point, Polygon
 
+from batched_ham_sandwich import get_ham_sandwich_cuts
+from checkpoint import LevelCheckpoints, checkpoint_key
 from ham_sandwich import get_ham_sandwich_cut
 from point_set import ColorPointSet
+from shared_points import PointsHandle, SharedPointArrays
 from utils.geometry import (
     Line,
     get_line_poly_intersection,
     get_points_inside,
+    get_points_near,
     get_points_on_line,
     get_polygon,
     get_rectangular_region,
     get_vertices,
+    line_from_coefs,
+    line_to_coefs,
     sort_points_ccw,
 )
+from utils.cut_cache import CutCache, hash_point_set
+from utils.region_stats import get_region_color_counts
 
 
 def _get_new_polygons(
@@ -33,7 +44,9 @@ def _get_new_polygons(
     and the current_poly.
     """
     # each cut creates 2 new regions
-    new_points = get_vertices(current_poly) + [I1, I2]
+    vertices = get_vertices(current_poly)
+    # cut may pass through existing vertices (e.g., for points on a grid)
+    new_points = vertices + [I for I in (I1, I2) if I not in vertices]
     new_points = sort_points_ccw(new_points)
     # both new regions (polygons) will contain I1 and I2 - otherwise disjoint
     idx_1, idx_2 = new_points.index(I1), new_points.index(I2)
@@ -55,35 +68,113 @@ def _get_new_point_sets(
     second_poly: Polygon,
     points_on_cuts: list,
 ):
+    """
+    Split point_set into the points inside of first_poly and second_poly (the two sides of cut).
+    Points on the cut are in neither, unless point_set has multiplicities: then the multiplicity of each
+    point on the cut is split between the two sides (see _split_on_cut), so no weight is lost and both
+    sides stay balanced. Such a point is in both new point sets if its weight goes to both sides.
+    """
     first_color_set = {}
     second_color_set = {}
+    first_mults, second_mults = None, None
+    if point_set.multiplicities is not None:
+        first_mults, second_mults = {}, {}
     for c in point_set.color_sets:
         c_points = point_set.color_sets[c]
         c_points_on_cut = get_points_on_line(c_points, cut)
-        c_points_in_first = get_points_inside(c_points, first_poly)
-        c_points_in_second = get_points_inside(c_points, second_poly)
-
-        n_cut = len(c_points_on_cut)
-        if n_cut > 0 and c_points_on_cut[0] in c_points_in_first:
-            c_points_in_first.remove(c_points_on_cut[0])
-        if n_cut > 0 and c_points_on_cut[0] in c_points_in_second:
-            c_points_in_second.remove(c_points_on_cut[0])
-        if n_cut > 0:
+        on_cut_ids = {id(p) for p in c_points_on_cut}
+        # split points of earlier cuts are on the boundary of the polygons
+        in_poly = get_points_inside if point_set.multiplicities is None else get_points_near
+        c_points_in_first, c_points_in_second = (
+            [p for p in in_poly(c_points, poly) if id(p) not in on_cut_ids]
+            for poly in (first_poly, second_poly)
+        )
+        if len(c_points_on_cut) > 0:
             # for visualization purposes later
             points_on_cuts.extend(c_points_on_cut)
 
+        if point_set.multiplicities is not None:
+            mult_of = dict(zip(map(id, c_points), point_set.multiplicities[c]))
+            first_mults[c], second_mults[c], on_cut_mults = (
+                np.array([mult_of[id(p)] for p in ps], dtype=int)
+                for ps in (c_points_in_first, c_points_in_second, c_points_on_cut)
+            )
+            to_first, to_second = _split_on_cut(
+                on_cut_mults, np.sum(first_mults[c]), np.sum(second_mults[c])
+            )
+            for side, side_mults, to_side in (
+                (c_points_in_first, first_mults, to_first),
+                (c_points_in_second, second_mults, to_second),
+            ):
+                side.extend(p for p, m in zip(c_points_on_cut, to_side) if m > 0)
+                side_mults[c] = np.concatenate((side_mults[c], to_side[to_side > 0]))
+
         first_color_set[c] = c_points_in_first
         second_color_set[c] = c_points_in_second
 
-    new_p_s_first = ColorPointSet(color_sets=first_color_set, defining_poly=first_poly)
+    new_p_s_first = ColorPointSet(
+        color_sets=first_color_set,
+        defining_poly=first_poly,
+        multiplicities=first_mults,
+    )
     new_p_s_second = ColorPointSet(
-        color_sets=second_color_set, defining_poly=second_poly
+        color_sets=second_color_set,
+        defining_poly=second_poly,
+        multiplicities=second_mults,
     )
     return new_p_s_first, new_p_s_second
 
 
+def _split_on_cut(
+    on_cut_mults: np.ndarray, first_weight: int, second_weight: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Split the multiplicities of the points on a cut between the first and second side (which have
+    first_weight and second_weight off the cut). The first side is filled up to half of the total weight
+    (rounded down) in order of the points, the rest goes to the second side.
+    Returns the multiplicities given to (first side, second side), aligned with on_cut_mults.
+    """
+    on_cut_weight = int(np.sum(on_cut_mults))
+    total = int(first_weight + second_weight) + on_cut_weight
+    # a ham-sandwich cut has at most half of the weight on either side
+    n_first = min(max(total // 2 - int(first_weight), 0), on_cut_weight)
+    # weight of the points before each point
+    before = np.cumsum(on_cut_mults) - on_cut_mults
+    to_first = np.clip(n_first - before, 0, on_cut_mults)
+    return to_first, on_cut_mults - to_first
+
+
+def _split_full_point_set(
+    full_point_set: ColorPointSet,
+    domain: Polygon,
+    cut_lines: list[Line],
+    cut_segments: dict,
+    depth: int,
+    points_on_cuts: list,
+) -> list[ColorPointSet]:
+    """
+    Regions of full_point_set at depth, found by splitting it with the cuts (and segments) of each level
+    in turn, like the regions of the point set the cuts were computed on. So the weight of points on a cut
+    is split once, between the two regions on its sides. The points of full_point_set on the cuts of the
+    last level are added to points_on_cuts.
+    """
+    regions, polygons = [full_point_set], [domain]
+    cuts = iter(cut_lines)
+    for level in range(depth):
+        on_cut = points_on_cuts if level == depth - 1 else []
+        next_regions, next_polygons = [], []
+        for p_s, poly, segment in zip(regions, polygons, cut_segments[level]):
+            first_poly, second_poly = _get_new_polygons(poly, segment.p1, segment.p2)
+            next_regions.extend(
+                _get_new_point_sets(next(cuts), p_s, first_poly, second_poly, on_cut)
+            )
+            next_polygons.extend((first_poly, second_poly))
+        regions, polygons = next_regions, next_polygons
+    return regions
+
+
 def _sanity_check_points(p_s: ColorPointSet, i: int, k: int):
-    if len(p_s.color_sets[0]) == 0 or len(p_s.color_sets[0]) == 0:
+    if len(p_s.color_sets[0]) == 0 or len(p_s.color_sets[1]) == 0:
         logging.warning(
             f"Ran out of points at iteration {i}, you need to give more points with {k} cuts..."
         )
@@ -104,66 +195,589 @@ def _sanity_check_kth_cut(k_cuts: list, p_s: ColorPointSet, i: int) -> bool:
     return True
 
 
-def get_iterative_hs_cuts(
+def _get_cut(
+    p_s: ColorPointSet, cache: Optional[CutCache], exact: Optional[bool] = None
+) -> list[Line]:
+    if cache is None:
+        return get_ham_sandwich_cut(p_s, exact)
+    return cache.get_cuts(p_s, partial(get_ham_sandwich_cut, exact=exact), exact=exact)
+
+
+# points of the current run, set in each worker process of a _ParallelLevelSolver
+_worker_points: Optional[SharedPointArrays] = None
+
+
+def _init_worker(handle: PointsHandle):
+    global _worker_points
+    _worker_points = SharedPointArrays.attach(handle)
+
+
+def _solve_regions(regions: list[tuple], exact: Optional[bool]) -> list[list[tuple]]:
+    # regions are (rows, multiplicities) of each point set
+    point_sets = [_worker_points.point_set(*region) for region in regions]
+    return [
+        [line_to_coefs(l) for l in cuts]
+        for cuts in get_ham_sandwich_cuts(point_sets, exact)
+    ]
+
+
+class _ParallelLevelSolver:
+    """
+    Finds the cuts for the regions of a level using a pool of worker processes. The points are placed
+    in shared memory once, and each task only sends the rows of its regions.
+    """
+
+    def __init__(self, point_set: ColorPointSet, workers: int) -> None:
+        self.workers = workers
+        self.points = SharedPointArrays.from_point_set(point_set)
+        try:
+            self.pool = multiprocessing.Pool(
+                workers, initializer=_init_worker, initargs=(self.points.handle,)
+            )
+        except Exception:
+            self.points.unlink()
+            raise
+
+    def __call__(
+        self, point_sets: list[ColorPointSet], exact: Optional[bool] = None
+    ) -> list[list[Line]]:
+        regions = [(self.points.rows_of(p_s), p_s.multiplicities) for p_s in point_sets]
+        # one chunk of regions per worker, each chunk is solved as a batch
+        chunk_size = -(-len(regions) // self.workers)
+        chunks = [regions[i : i + chunk_size] for i in range(0, len(regions), chunk_size)]
+        results = self.pool.starmap(_solve_regions, [(c, exact) for c in chunks])
+        return [
+            [line_from_coefs(c) for c in cuts] for chunk in results for cuts in chunk
+        ]
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.points.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _get_level_cuts(
+    point_sets: list[ColorPointSet],
+    cache: Optional[CutCache],
+    exact: Optional[bool] = None,
+    solve_level=get_ham_sandwich_cuts,
+) -> list[Optional[list[Line]]]:
+    """
+    Get the cuts for all regions of a level at once with solve_level(point_sets, exact)
+    (see batched_ham_sandwich). Regions missing a color are skipped (None).
+    """
+    level_cuts = [None] * len(point_sets)
+    keys = {}
+    to_solve = []
+    for j, p_s in enumerate(point_sets):
+        if any(len(c_points) == 0 for c_points in p_s.color_sets.values()):
+            continue
+        if cache is not None:
+            keys[j] = hash_point_set(p_s, exact=exact)
+            level_cuts[j] = cache.get(keys[j])
+        if level_cuts[j] is None:
+            to_solve.append(j)
+    solved = []
+    if len(to_solve) > 0:
+        solved = solve_level([point_sets[j] for j in to_solve], exact)
+    for j, cuts in zip(to_solve, solved):
+        level_cuts[j] = cuts
+        if cache is not None:
+            cache.put(keys[j], cuts)
+    return level_cuts
+
+
+def iterative_hs_cuts_over_k(
     point_set: ColorPointSet,
-    k: int,
+    k_vals: list[int],
     calculate_final_regions: bool,
     full_point_set: Optional[ColorPointSet] = None,
-) -> tuple[list[Line], list[Line]]:
+    cache: Optional[CutCache] = None,
+    exact: Optional[bool] = None,
+    batched: bool = True,
+    workers: int = 1,
+    domain: Optional[Polygon] = None,
+    checkpoints: Optional[LevelCheckpoints] = None,
+    check_budget: Optional[Callable[[], None]] = None,
+):
     """
-    Perform k-rounds of ham-sandwich cuts. full_point_set should be provided if using a subsample for point_set
+    Equivalent to calling get_iterative_hs_cuts for each k in k_vals, but the cut hierarchy is only built once
+    (up to max(k_vals)). Yields (k, result) in increasing order of k as soon as level k is complete,
+    where result is what get_iterative_hs_cuts would have returned for that k.
     """
-    point_sets = [point_set]
-    # rectangle bounding initial region
-    domain = get_rectangular_region(
-        point_set.lower_x, point_set.upper_x, point_set.lower_y, point_set.upper_y
+    args = (
+        point_set,
+        k_vals,
+        calculate_final_regions,
+        full_point_set,
+        cache,
+        exact,
+        domain,
+        checkpoints,
+        check_budget,
     )
+    if workers > 1:
+        with _ParallelLevelSolver(point_set, workers) as solve_level:
+            yield from _build_levels(*args, solve_level)
+    else:
+        yield from _build_levels(*args, get_ham_sandwich_cuts if batched else None)
+
+
+def _build_levels(
+    point_set: ColorPointSet,
+    k_vals: list[int],
+    calculate_final_regions: bool,
+    full_point_set: Optional[ColorPointSet],
+    cache: Optional[CutCache],
+    exact: Optional[bool],
+    domain: Optional[Polygon],
+    checkpoints: Optional[LevelCheckpoints],
+    check_budget: Optional[Callable[[], None]],
+    solve_level,
+):
+    # see iterative_hs_cuts_over_k, solve_level is None to find the cuts one region at a time
+    k_vals = sorted(set(k_vals))
+    max_k = k_vals[-1]
+    point_sets = [point_set]
+    if domain is None:
+        # rectangle bounding initial region
+        domain = get_rectangular_region(
+            point_set.lower_x, point_set.upper_x, point_set.lower_y, point_set.upper_y
+        )
     point_set_polygons = [domain]
+    # points of a weighted full point set on earlier cuts are near the polygons on both sides, so it is
+    # split level by level (see _split_full_point_set). Unweighted points on a cut are not in any region.
+    replay_full = full_point_set is not None and full_point_set.multiplicities is not None
     # maps color to points placed on cut - just maintained here for visualization later
     points_on_cuts = []
     cut_lines = []
     cut_segments = {}  # for visualization purposes
-    error_occurred = False
-    for i in range(k):
+    if k_vals[0] == 0:
+        yield 0, (point_sets, [], {}, [], False)
+    start_level = 0
+    if checkpoints is not None:
+        key = checkpoint_key(point_set, exact, domain)
+        # levels before the smallest k are not yielded, so they can be skipped
+        resumed = checkpoints.load_deepest(key, k_vals[0] - 1, point_set)
+        if resumed is not None:
+            start_level, state = resumed
+            (
+                point_sets,
+                point_set_polygons,
+                cut_lines,
+                cut_segments,
+                points_on_cuts,
+            ) = state
+            logging.info(f"Resuming iterative cuts from level {start_level} checkpoint")
+    for i in range(start_level, max_k):
+        # regions at level i are split again if some k needs deeper levels,
+        # and are the final regions for k = i + 1 (if requested)
+        split_level = i < (max_k - 1)
+        final_level = (i + 1) in k_vals
         cut_segments[i] = []
         next_point_sets = []
         next_point_set_polygons = []
-        for p_s, poly in zip(point_sets, point_set_polygons):
-            if not (_sanity_check_points(p_s, i, k)):
+        final_point_sets = []
+        final_points_on_cuts = list(points_on_cuts)
+        error_occurred = False
+        level_cuts = [None] * len(point_sets)
+        if solve_level is not None:
+            if check_budget is not None:
+                check_budget()
+            level_cuts = _get_level_cuts(point_sets, cache, exact, solve_level)
+        for p_s, poly, k_cuts in zip(point_sets, point_set_polygons, level_cuts):
+            if k_cuts is None and check_budget is not None:
+                check_budget()
+            if not (_sanity_check_points(p_s, i, max_k)):
                 error_occurred = True
-                i = i + 1
                 break
             # get cut
-            k_cuts = get_ham_sandwich_cut(p_s)
+            if k_cuts is None:
+                k_cuts = _get_cut(p_s, cache, exact)
             if not (_sanity_check_kth_cut(k_cuts, p_s, i)):
                 error_occurred = True
-                i = i + 1
                 break
             hs_line = k_cuts[0]
             I1, I2 = get_line_poly_intersection(hs_line, poly)
-            if i < (k - 1) or calculate_final_regions:
+            if split_level or (final_level and calculate_final_regions):
                 # calculate new intersections and regions created by cut
                 first_poly, second_poly = _get_new_polygons(poly, I1, I2)
+            if split_level:
                 next_point_set_polygons.append(first_poly)
                 next_point_set_polygons.append(second_poly)
-
-                # use polygons to determine next point sets
-                if i == (k - 1) and full_point_set is not None:
-                    p_s = full_point_set
+                on_cut = []
                 new_p_s_first, new_p_s_second = _get_new_point_sets(
-                    hs_line, p_s, first_poly, second_poly, points_on_cuts
+                    hs_line, p_s, first_poly, second_poly, on_cut
                 )
+                points_on_cuts.extend(on_cut)
                 next_point_sets.append(new_p_s_first)
                 next_point_sets.append(new_p_s_second)
-            else:
+            if final_level and calculate_final_regions and not replay_full:
+                # use polygons to determine final point sets
+                if full_point_set is not None:
+                    final_point_sets.extend(
+                        _get_new_point_sets(
+                            hs_line,
+                            full_point_set,
+                            first_poly,
+                            second_poly,
+                            final_points_on_cuts,
+                        )
+                    )
+                elif split_level:
+                    final_point_sets.append(new_p_s_first)
+                    final_point_sets.append(new_p_s_second)
+                    final_points_on_cuts.extend(on_cut)
+                else:
+                    final_point_sets.extend(
+                        _get_new_point_sets(
+                            hs_line, p_s, first_poly, second_poly, final_points_on_cuts
+                        )
+                    )
+            elif final_level and not calculate_final_regions:
                 # still get points that were on cut for visualization
                 c1_on_cut = get_points_on_line(p_s.color_sets[0], hs_line)
                 c2_on_cut = get_points_on_line(p_s.color_sets[1], hs_line)
-                points_on_cuts.extend(c1_on_cut)
-                points_on_cuts.extend(c2_on_cut)
+                final_points_on_cuts.extend(c1_on_cut)
+                final_points_on_cuts.extend(c2_on_cut)
 
             cut_lines.append(hs_line)
             cut_segments[i].append(Line(p1=I1, p2=I2))
+        if error_occurred:
+            # all remaining k depend on this level
+            for k in k_vals:
+                if k > i:
+                    yield k, (
+                        next_point_sets,
+                        list(cut_lines),
+                        dict(cut_segments),
+                        points_on_cuts,
+                        True,
+                    )
+            return
+        if split_level and checkpoints is not None:
+            checkpoints.save(
+                key,
+                i + 1,
+                point_set,
+                next_point_sets,
+                next_point_set_polygons,
+                cut_lines,
+                cut_segments,
+                points_on_cuts,
+            )
+        if final_level and calculate_final_regions and replay_full:
+            # all cuts of the level are known, split the full points
+            final_point_sets = _split_full_point_set(
+                full_point_set,
+                domain,
+                cut_lines,
+                cut_segments,
+                i + 1,
+                final_points_on_cuts,
+            )
+        if final_level:
+            segments = {level: list(cut_segments[level]) for level in range(i + 1)}
+            result = (
+                final_point_sets,
+                list(cut_lines),
+                segments,
+                final_points_on_cuts,
+                False,
+            )
+            yield i + 1, result
         point_sets = next_point_sets
         point_set_polygons = next_point_set_polygons
-    return point_sets, cut_lines, cut_segments, points_on_cuts, error_occurred
+
+
+def get_iterative_hs_cuts(
+    point_set: ColorPointSet,
+    k: int,
+    calculate_final_regions: bool,
+    full_point_set: Optional[ColorPointSet] = None,
+    cache: Optional[CutCache] = None,
+    exact: Optional[bool] = None,
+    batched: bool = True,
+    workers: int = 1,
+    domain: Optional[Polygon] = None,
+    checkpoints: Optional[LevelCheckpoints] = None,
+    lazy: bool = False,
+    check_budget: Optional[Callable[[], None]] = None,
+) -> tuple[list[Line], list[Line]]:
+    """
+    Perform k-rounds of ham-sandwich cuts. full_point_set should be provided if using a subsample for point_set.
+    If cache is given, cuts for regions that were already seen (e.g., by a run with smaller k) are reused.
+    See get_ham_sandwich_cut for exact. If batched, the cuts for all regions of a level are found together
+    (same results, less overhead for many small regions). If workers > 1, the regions of each level are
+    split between that many processes (the points are shared with them through shared memory).
+    domain is the (convex) region containing point_set, defaults to the bounding rectangle of point_set.
+    If checkpoints are given, the state after each level is saved and the run resumes from the deepest saved
+    level (< k) for the same point_set, exact and domain (e.g., after a crash or to continue with a larger k).
+    If lazy, no cuts are computed up front and a LazyCutTree is returned instead, which finds the cut of a
+    region the first time it is accessed (batched, workers and checkpoints are not used).
+    check_budget is called before each cut is computed (before each level if batched or workers > 1) and may
+    raise an exception to stop the computation, see job_queue.py.
+    """
+    if lazy:
+        return LazyCutTree(point_set, k, full_point_set, cache, exact, domain)
+    for _, result in iterative_hs_cuts_over_k(
+        point_set,
+        [k],
+        calculate_final_regions,
+        full_point_set,
+        cache,
+        exact,
+        batched,
+        workers,
+        domain,
+        checkpoints,
+        check_budget,
+    ):
+        return result
+
+
+class LevelResult(NamedTuple):
+    """
+    State of the cut hierarchy once level k is complete, see iter_hs_levels.
+    regions, cuts, segments, points_on_cuts and err are what get_iterative_hs_cuts would return for k.
+    """
+
+    k: int
+    regions: list[ColorPointSet]
+    cuts: list[Line]
+    segments: dict
+    points_on_cuts: list
+    err: bool
+    # polygon of each region
+    polygons: list[Polygon]
+    # color_counts[i, c] = number of points of color c in regions[i]
+    color_counts: np.ndarray
+
+
+def iter_hs_levels(
+    point_set: ColorPointSet,
+    k: int,
+    calculate_final_regions: bool,
+    full_point_set: Optional[ColorPointSet] = None,
+    cache: Optional[CutCache] = None,
+    exact: Optional[bool] = None,
+    batched: bool = True,
+    workers: int = 1,
+    domain: Optional[Polygon] = None,
+    checkpoints: Optional[LevelCheckpoints] = None,
+    check_budget: Optional[Callable[[], None]] = None,
+):
+    """
+    Progressive version of get_iterative_hs_cuts, yields a LevelResult for each level 1, ..., k as soon as it
+    is complete (the last one is the result of get_iterative_hs_cuts). The regions (and their statistics) of
+    every level are only calculated if calculate_final_regions. Stops after a level with an error.
+    Stop iterating (or close the generator) to skip the remaining levels.
+    Every level is yielded, so checkpoints are only written (for a later get_iterative_hs_cuts), not resumed from.
+    """
+    for level_k, result in iterative_hs_cuts_over_k(
+        point_set,
+        range(1, k + 1),
+        calculate_final_regions,
+        full_point_set,
+        cache,
+        exact,
+        batched,
+        workers,
+        domain,
+        checkpoints,
+        check_budget,
+    ):
+        regions, cuts, segments, points_on_cuts, err = result
+        yield LevelResult(
+            level_k,
+            regions,
+            cuts,
+            segments,
+            points_on_cuts,
+            err,
+            [p_s.defining_poly for p_s in regions],
+            get_region_color_counts(regions),
+        )
+        if err:
+            return
+
+
+class CutTreeNode:
+    """
+    Region of a LazyCutTree. The cut of the region and its two children (the regions on either side of the cut)
+    are only computed the first time they are accessed, and are then memoized.
+    """
+
+    def __init__(
+        self,
+        tree: "LazyCutTree",
+        parent: Optional["CutTreeNode"],
+        region: ColorPointSet,
+        polygon: Polygon,
+        depth: int,
+        index: int,
+    ) -> None:
+        self.tree = tree
+        self.parent = parent
+        # points used to find the cut
+        self.region = region
+        self.polygon = polygon
+        # position among the regions at depth (same order as the regions of get_iterative_hs_cuts)
+        self.depth = depth
+        self.index = index
+        self.err = False
+        self._cut = None
+        self._children = None
+        self._full_regions = None
+        self.points_on_cut = []
+
+    def is_leaf(self) -> bool:
+        return self.depth == self.tree.k
+
+    @property
+    def cut(self) -> Optional[Line]:
+        """
+        Ham-sandwich cut of the region, None for leaves or if no cut could be found (err is set).
+        """
+        if self._cut is None and not (self.is_leaf() or self.err):
+            self.err = True
+            if _sanity_check_points(self.region, self.depth, self.tree.k):
+                k_cuts = _get_cut(self.region, self.tree.cache, self.tree.exact)
+                if _sanity_check_kth_cut(k_cuts, self.region, self.depth):
+                    self._cut = k_cuts[0]
+                    self.err = False
+                    self.tree.n_cuts += 1
+        return self._cut
+
+    @property
+    def segment(self) -> Optional[Line]:
+        # part of the cut inside of the region
+        if self.cut is None:
+            return None
+        I1, I2 = get_line_poly_intersection(self.cut, self.polygon)
+        return Line(p1=I1, p2=I2)
+
+    @property
+    def children(self) -> tuple:
+        if self._children is None:
+            self._children = ()
+            if self.cut is not None:
+                I1, I2 = get_line_poly_intersection(self.cut, self.polygon)
+                first_poly, second_poly = _get_new_polygons(self.polygon, I1, I2)
+                regions = _get_new_point_sets(
+                    self.cut, self.region, first_poly, second_poly, self.points_on_cut
+                )
+                self._children = tuple(
+                    CutTreeNode(
+                        self.tree,
+                        self,
+                        r,
+                        r.defining_poly,
+                        self.depth + 1,
+                        2 * self.index + j,
+                    )
+                    for j, r in enumerate(regions)
+                )
+        return self._children
+
+    @property
+    def full_region(self) -> ColorPointSet:
+        """
+        All points of the region if the tree was built on a subsample (see get_iterative_hs_cuts), else region.
+        """
+        full_point_set = self.tree.full_point_set
+        if full_point_set is None or self.parent is None:
+            return self.region if full_point_set is None else full_point_set
+        parent = self.parent
+        if parent._full_regions is None:
+            # same as get_iterative_hs_cuts, the full points (of the parent if weighted) are split with
+            # the polygons of the regions
+            first, second = parent.children
+            if full_point_set.multiplicities is not None:
+                full_point_set = parent.full_region
+            parent._full_regions = _get_new_point_sets(
+                parent.cut, full_point_set, first.polygon, second.polygon, []
+            )
+        return parent._full_regions[self.index % 2]
+
+
+class LazyCutTree:
+    """
+    Hierarchy of iterative ham-sandwich cuts (up to depth k) where only the nodes that are accessed are built,
+    see get_iterative_hs_cuts with lazy=True. Useful when only some areas need fine regions.
+    """
+
+    def __init__(
+        self,
+        point_set: ColorPointSet,
+        k: int,
+        full_point_set: Optional[ColorPointSet] = None,
+        cache: Optional[CutCache] = None,
+        exact: Optional[bool] = None,
+        domain: Optional[Polygon] = None,
+    ) -> None:
+        self.k = k
+        self.cache = cache
+        self.exact = exact
+        # number of cuts computed so far
+        self.n_cuts = 0
+        if domain is None:
+            domain = get_rectangular_region(
+                point_set.lower_x, point_set.upper_x, point_set.lower_y, point_set.upper_y
+            )
+        self.full_point_set = full_point_set
+        self.root = CutTreeNode(self, None, point_set, domain, 0, 0)
+
+    def node(self, depth: int, index: int) -> Optional[CutTreeNode]:
+        """
+        Get region index at depth (i.e., get_iterative_hs_cuts(..., k=depth)[0][index]), building the nodes on
+        the path to it. Returns None if a cut on the path could not be found.
+        """
+        if not (0 <= depth <= self.k and 0 <= index < 2**depth):
+            raise IndexError(f"No region {index} at depth {depth} (k={self.k})")
+        node = self.root
+        for level in range(depth - 1, -1, -1):
+            if len(node.children) == 0:
+                return None
+            node = node.children[(index >> level) & 1]
+        return node
+
+    def locate(self, p: Point, depth: Optional[int] = None) -> Optional[CutTreeNode]:
+        """
+        Get the region at depth (defaults to k) containing p, building only the nodes on the path to it.
+        Returns None if p is outside of the domain or a cut on the path could not be found.
+        """
+        depth = self.k if depth is None else depth
+        node = self.root
+        if not node.polygon.covers(p):
+            return None
+        while node.depth < depth:
+            children = node.children
+            if len(children) == 0:
+                return None
+            # points on a cut belong to both regions, pick the first
+            node = children[0] if children[0].polygon.covers(p) else children[1]
+        return node
+
+    def nodes(self):
+        # all nodes built so far (breadth first)
+        level = [self.root]
+        while len(level) > 0:
+            yield from level
+            level = [c for n in level if n._children is not None for c in n._children]
+
+    def segments(self) -> dict:
+        """
+        Segments of the cuts computed so far by depth, see plot_k_cuts.
+        """
+        segments = {}
+        for n in self.nodes():
+            if n._cut is not None:
+                segments.setdefault(n.depth, []).append(n.segment)
+        return segments
@@ -0,0 +1,78 @@
+"""
+Description: Regression tests for the (iterative) ham-sandwich cuts.
+Run from src/ with: python -m pytest
+"""
+
+import logging
+
+import numpy as np
+import pytest
+from shapely import Point
+
+from batched_ham_sandwich import get_ham_sandwich_cuts
+from ham_sandwich import get_ham_sandwich_cut
+from iterative_ham import get_iterative_hs_cuts
+from point_set import ColorPointSet
+from utils.geometry import Line, get_rectangular_region
+
+logging.disable(logging.WARNING)
+
+
+def _grid_point_set(coords_per_color: list[list]) -> ColorPointSet:
+    color_sets = {
+        c: [Point(x, y) for x, y in coords] for c, coords in enumerate(coords_per_color)
+    }
+    return ColorPointSet(
+        color_sets=color_sets, defining_poly=get_rectangular_region(-1, 6, -1, 6)
+    )
+
+
+def _bisects(line: Line, coords: list) -> bool:
+    # at most half of the points strictly on either side of line
+    x, y = np.array(coords, dtype=float).T
+    if line.is_vertical():
+        side = np.sign(x - float(line.x_int))
+    else:
+        side = np.sign(y - (float(line.slope) * x + float(line.y_int)))
+    return max(np.sum(side > 0), np.sum(side < 0)) <= len(coords) // 2
+
+
+def _random_point_set(points_per_color: list[int], seed: int) -> ColorPointSet:
+    np.random.seed(seed)
+    return ColorPointSet(points_per_color=points_per_color, color_method="random")
+
+
+# unbalanced sets where a region at k=4 runs out of points of the minority color
+@pytest.mark.parametrize("points_per_color,seed", [([56, 7], 22), ([37, 6], 24)])
+@pytest.mark.parametrize("batched", [True, False])
+def test_region_without_color_is_an_error(points_per_color, seed, batched):
+    point_set = _random_point_set(points_per_color, seed)
+    regions, cuts, _, _, err = get_iterative_hs_cuts(
+        point_set, 4, True, batched=batched
+    )
+    assert err
+    assert regions == []
+
+
+def test_no_cut_without_color():
+    point_set = _random_point_set([5, 0], 0)
+    assert get_ham_sandwich_cut(point_set) == []
+
+
+# the median levels cross exactly at the end of the search bracket
+GRID_COORDS = [
+    [(4, 1), (1, 2), (0, 4), (3, 1)],
+    [(4, 0), (5, 5), (1, 3), (1, 1), (2, 4), (0, 4), (4, 5), (5, 3), (4, 3), (3, 1)]
+    + [(0, 4), (4, 3), (0, 4), (1, 2), (1, 5), (4, 1), (0, 1), (1, 2)],
+]
+
+
+@pytest.mark.parametrize("exact", [None, True, False])
+def test_grid_cut(exact):
+    point_set = _grid_point_set(GRID_COORDS)
+    for cuts in (
+        get_ham_sandwich_cut(point_set, exact),
+        get_ham_sandwich_cuts([point_set], exact)[0],
+    ):
+        assert len(cuts) > 0
+        assert all(_bisects(cuts[0], coords) for coords in GRID_COORDS)
@@ -0,0 +1,323 @@
+"""
+Description:
+Priority job queue around get_iterative_hs_cuts with time/memory budgets and cancellation.
+
+Some configurations (e.g., large k with few points, heavy majority weighting) take much longer than others.
+Each job can be given a JobBudget. Once a fraction (fallback_at) of it is used the job is restarted on a random
+subsample of its points (fallback_ratio, drawn with the seed of the job) with the rest of its budget.
+Time is checked by this process, which terminates a job once it used its share of max_seconds (even in the
+middle of a cut); memory is checked by the job between cuts (see check_budget of get_iterative_hs_cuts).
+
+Each job runs in its own process, at most `workers` at a time, lower priority values first.
+Cancelling a running job terminates its process. Memory is measured as the growth of the resident memory of
+the job's process. The result is sent back to this process, so its regions hold copies of the input points.
+"""
+
+import heapq
+import itertools
+import logging
+import multiprocessing
+import resource
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from iterative_ham import get_iterative_hs_cuts
+from point_set import ColorPointSet, subsample
+
+# states of a Job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_CANCELLED = "cancelled"
+JOB_OVER_BUDGET = "over_budget"
+JOB_FAILED = "failed"
+
+# seconds between checks of a running job for cancellation and its time limit
+_POLL_SECONDS = 0.05
+
+
+class JobBudget(NamedTuple):
+    # None means no limit
+    max_seconds: Optional[float] = None
+    max_memory_mb: Optional[float] = None
+    # subsample ratio used once fallback_at of the budget is used, None to never fall back
+    fallback_ratio: Optional[float] = None
+    fallback_at: float = 0.8
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def _rss_mb() -> float:
+    # current resident memory of this process
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        # peak instead of current memory (in KB on linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _BudgetCheck:
+    """
+    Passed as check_budget to get_iterative_hs_cuts in the process of a job, raises once limit (a fraction
+    of budget) is used since started_at.
+    """
+
+    def __init__(self, job_id: int, budget: JobBudget, started_at: float, limit: float) -> None:
+        self.job_id = job_id
+        self.budget = budget
+        self.started_at = started_at
+        self.limit = limit
+        # resident memory at the start of the process of the job, set by _run_job
+        self.start_rss_mb = 0.0
+
+    def __call__(self):
+        budget = self.budget
+        elapsed = time.time() - self.started_at
+        if budget.max_seconds is not None and elapsed > self.limit * budget.max_seconds:
+            raise BudgetExceeded(f"Job {self.job_id} used {elapsed:.1f}s")
+        used_mb = _rss_mb() - self.start_rss_mb
+        if budget.max_memory_mb is not None and used_mb > self.limit * budget.max_memory_mb:
+            raise BudgetExceeded(f"Job {self.job_id} used {used_mb:.0f}MB")
+
+
+class Job:
+    """
+    A call of get_iterative_hs_cuts(point_set, k, **kwargs) submitted to a JobQueue.
+    Once it is finished, result is what get_iterative_hs_cuts returned and approximate is set if the result was
+    computed on a subsample (full_point_set is then the original points). seed is used for the subsample.
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        point_set: ColorPointSet,
+        k: int,
+        priority: int,
+        budget: JobBudget,
+        seed: Optional[int],
+        kwargs: dict,
+    ) -> None:
+        self.job_id = job_id
+        self.point_set = point_set
+        self.k = k
+        self.priority = priority
+        self.budget = budget
+        self.seed = seed
+        self.kwargs = kwargs
+        self.state = JOB_QUEUED
+        self.result = None
+        self.error = None
+        self.approximate = False
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def cancel(self):
+        # a running job is terminated, a queued job is skipped
+        self._cancel.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+
+def _run_job(
+    job_id: int,
+    point_set: ColorPointSet,
+    full_point_set: Optional[ColorPointSet],
+    k: int,
+    kwargs: dict,
+    budget_check: _BudgetCheck,
+    conn,
+):
+    """
+    Entry point of the process of a job, sends back (state, result, error).
+    Only picklable arguments are passed (not the Job), so any start method of multiprocessing works.
+    """
+    try:
+        kwargs = {"batched": False, **kwargs}
+        if full_point_set is not None:
+            kwargs["full_point_set"] = full_point_set
+        calculate_final_regions = kwargs.pop("calculate_final_regions", True)
+        budget_check.start_rss_mb = _rss_mb()
+        result = get_iterative_hs_cuts(
+            point_set, k, calculate_final_regions, check_budget=budget_check, **kwargs
+        )
+        message = (JOB_DONE, result, None)
+    except BudgetExceeded as e:
+        message = (JOB_OVER_BUDGET, None, str(e))
+    except Exception as e:
+        logging.exception(f"Job {job_id} failed")
+        message = (JOB_FAILED, None, str(e))
+    conn.send(message)
+    conn.close()
+
+
+class JobQueue:
+    """
+    Runs submitted jobs in up to `workers` processes at a time, in order of priority (lowest first) then
+    submission. Finished jobs are removed from jobs job_ttl seconds after they finish.
+    """
+
+    def __init__(
+        self, workers: int = 1, job_ttl: float = 3600.0, start_method: Optional[str] = None
+    ) -> None:
+        # start_method of the job processes ("fork", "spawn", ...), None for the default of the platform
+        self._context = multiprocessing.get_context(start_method)
+        self._heap = []
+        self._ids = itertools.count()
+        self._lock = threading.Condition()
+        self._closed = False
+        self.job_ttl = job_ttl
+        self.jobs = {}
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True) for _ in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(
+        self,
+        point_set: ColorPointSet,
+        k: int,
+        priority: int = 0,
+        budget: Optional[JobBudget] = None,
+        seed: Optional[int] = None,
+        **kwargs,
+    ) -> Job:
+        """
+        Queue get_iterative_hs_cuts(point_set, k, **kwargs). Cuts are found one region at a time
+        (batched=False) unless given, so the memory budget is checked between cuts.
+        """
+        job_id = next(self._ids)
+        job = Job(job_id, point_set, k, priority, budget or JobBudget(), seed, kwargs)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("JobQueue is shut down")
+            self._expire_jobs()
+            self.jobs[job_id] = job
+            heapq.heappush(self._heap, (priority, job_id, job))
+            self._lock.notify()
+        return job
+
+    def cancel(self, job_id: int):
+        self.jobs[job_id].cancel()
+
+    def _expire_jobs(self):
+        # forget jobs that finished more than job_ttl seconds ago (called with the lock held)
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.done() and now - job.finished_at > self.job_ttl:
+                del self.jobs[job_id]
+
+    def _next_job(self) -> Optional[Job]:
+        with self._lock:
+            while len(self._heap) == 0 and not self._closed:
+                self._lock.wait()
+            if len(self._heap) == 0:
+                return None
+            return heapq.heappop(self._heap)[2]
+
+    def _work(self):
+        while (job := self._next_job()) is not None:
+            try:
+                if job._cancel.is_set():
+                    job.state = JOB_CANCELLED
+                else:
+                    job.state = JOB_RUNNING
+                    self._run(job)
+            except Exception as e:
+                logging.exception(f"Job {job.job_id} failed")
+                job.state, job.error = JOB_FAILED, str(e)
+            finally:
+                job.finished_at = time.time()
+                job._done.set()
+
+    def _run(self, job: Job):
+        # run job on its points, then (if it ran out of its fallback share of the budget) on a subsample
+        job.started_at = time.time()
+        budget = job.budget
+        can_fall_back = budget.fallback_ratio is not None
+        limit = budget.fallback_at if can_fall_back else 1.0
+        job.state, job.result, job.error = self._run_process(job, job.point_set, None, limit)
+        if job.state == JOB_OVER_BUDGET and can_fall_back:
+            logging.info(f"{job.error}, falling back to a subsample of ratio {budget.fallback_ratio}")
+            job.approximate = True
+            rng = np.random.default_rng(job.seed)
+            sub_point_set = subsample(job.point_set, budget.fallback_ratio, rng)
+            job.state, job.result, job.error = self._run_process(
+                job, sub_point_set, job.point_set, 1.0
+            )
+
+    def _run_process(
+        self,
+        job: Job,
+        point_set: ColorPointSet,
+        full_point_set: Optional[ColorPointSet],
+        limit: float,
+    ) -> tuple:
+        """
+        Run job on point_set in a new process and return (state, result, error). The process is terminated
+        once the job is cancelled or limit (a fraction) of its time budget is used.
+        """
+        budget = job.budget
+        deadline = None
+        if budget.max_seconds is not None:
+            deadline = job.started_at + limit * budget.max_seconds
+        budget_check = _BudgetCheck(job.job_id, budget, job.started_at, limit)
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_run_job,
+            args=(job.job_id, point_set, full_point_set, job.k, job.kwargs, budget_check, sender),
+            daemon=True,
+        )
+        try:
+            process.start()
+            sender.close()
+            while not receiver.poll(_POLL_SECONDS):
+                if job._cancel.is_set():
+                    return JOB_CANCELLED, None, None
+                if deadline is not None and time.time() > deadline:
+                    elapsed = time.time() - job.started_at
+                    return JOB_OVER_BUDGET, None, f"Job {job.job_id} used {elapsed:.1f}s"
+            try:
+                return receiver.recv()
+            except EOFError:
+                # the process died without sending a result
+                process.join()
+                return JOB_FAILED, None, f"Job {job.job_id} exited with code {process.exitcode}"
+        finally:
+            if process.is_alive():
+                process.terminate()
+            if process.pid is not None:
+                process.join()
+            sender.close()
+            receiver.close()
+
+    def shutdown(self, cancel_pending: bool = False):
+        """
+        Stop the workers once the queue is empty (or right away, cancelling all jobs, if cancel_pending).
+        """
+        with self._lock:
+            self._closed = True
+            if cancel_pending:
+                for job in self.jobs.values():
+                    job.cancel()
+            self._lock.notify_all()
+        for t in self._threads:
+            t.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
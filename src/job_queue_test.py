@@ -0,0 +1,88 @@
+"""
+Description: Tests for the cancellation, budgets and fallback of job_queue.py.
+Run from src/ with: python -m pytest
+"""
+
+import logging
+import time
+
+import numpy as np
+import pytest
+
+from job_queue import (
+    JOB_CANCELLED,
+    JOB_DONE,
+    JOB_OVER_BUDGET,
+    JOB_RUNNING,
+    JobBudget,
+    JobQueue,
+)
+from point_set import ColorPointSet
+from utils.region_stats import get_region_color_counts
+
+logging.disable(logging.WARNING)
+
+
+def _point_set(points_per_color: int, seed: int = 0) -> ColorPointSet:
+    np.random.seed(seed)
+    return ColorPointSet(
+        points_per_color=[points_per_color, points_per_color], color_method="random"
+    )
+
+
+# a job that takes several seconds (single cuts of 2000 points per color take about a second)
+def _slow_job(queue: JobQueue, budget=None, seed=None):
+    return queue.submit(_point_set(2000), 4, budget=budget, seed=seed)
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_job_done(start_method):
+    with JobQueue(start_method=start_method) as queue:
+        job = queue.submit(_point_set(20), 2)
+        assert job.wait(60)
+    assert job.state == JOB_DONE, job.error
+    assert not job.approximate
+    regions, _, _, _, err = job.result
+    assert not err
+    assert len(regions) == 4
+
+
+def test_cancel_running_job_and_run_next():
+    with JobQueue() as queue:
+        slow = _slow_job(queue)
+        fast = queue.submit(_point_set(20), 1)
+        while slow.state != JOB_RUNNING:
+            time.sleep(0.01)
+        queue.cancel(slow.job_id)
+        assert slow.wait(5)
+        assert fast.wait(60)
+    assert slow.state == JOB_CANCELLED
+    assert slow.result is None
+    assert fast.state == JOB_DONE
+
+
+def test_over_budget_terminates_job():
+    with JobQueue() as queue:
+        start = time.time()
+        job = _slow_job(queue, JobBudget(max_seconds=0.5))
+        assert job.wait(5)
+    assert job.state == JOB_OVER_BUDGET
+    assert job.result is None
+    assert time.time() - start < 3
+
+
+# the first cut outlasts fallback_at * max_seconds, the job falls back in the middle of it
+def test_fallback_to_subsample():
+    budget = JobBudget(max_seconds=4.0, fallback_ratio=0.02, fallback_at=0.2)
+    with JobQueue() as queue:
+        job = _slow_job(queue, budget, seed=3)
+        same_seed = _slow_job(queue, budget, seed=3)
+        assert job.wait(10) and same_seed.wait(10)
+    assert job.state == JOB_DONE, job.error
+    assert job.approximate
+    regions, _, _, points_on_cuts, err = job.result
+    assert not err
+    # the final regions hold the points of the full point set (except those on the cuts)
+    assert get_region_color_counts(regions).sum() + len(points_on_cuts) == 4000
+    lines = [str(line) for line in job.result[1]]
+    assert lines == [str(line) for line in same_seed.result[1]]
@@ -7,16 +7,23 @@ Description: Entry-point for code
 import argparse
 import logging
 import logging.config
+import os
+from functools import partial
 
 import numpy as np
 
+from checkpoint import LevelCheckpoints
+from coreset import aggregate_points
+from cut_export import export_cuts
+from generators import get_square_bounds
 from ham_sandwich import get_ham_sandwich_cut
-from iterative_ham import get_iterative_hs_cuts
+from iterative_ham import LevelResult, get_iterative_hs_cuts, iter_hs_levels
 from point_set import ColorPointSet, subsample
 from utils.constants import *
+from utils.cut_cache import CutCache
 from utils.geometry import get_points_near_cuts
 from utils.region_stats import get_region_majorities
-from visualization import plot_k_cuts, plot_lines, plot_point_set
+from voronoi import get_voronoi_sample
 
 
 def list_of_int(arg):
@@ -27,6 +34,36 @@ def list_of_float(arg):
     return list(map(float, arg.split(",")))
 
 
+def report_level(
+    level: LevelResult, point_set: ColorPointSet, fig_save_path, render: str
+):
+    # intermediate results of the iterative program, see --report_each_level
+    if len(level.regions) > 0:
+        print(f"Level {level.k} region color counts: {level.color_counts.tolist()}")
+    if fig_save_path is not None:
+        import matplotlib.pyplot as plt
+
+        from visualization import plot_k_cuts, plot_point_set
+
+        root, ext = os.path.splitext(fig_save_path)
+        plot_point_set(
+            point_set,
+            show=False,
+            plot_bbox=True,
+            hide_ticks=True,
+            hide_weighted_pts=True,
+            render=render,
+        )
+        plot_k_cuts(
+            level.segments,
+            level.k,
+            save_path=f"{root}_level{level.k}{ext}",
+            segments_only=True,
+            show=False,
+        )
+        plt.close()
+
+
 def parse_args():
     parser = argparse.ArgumentParser(
         prog="main",
@@ -49,21 +86,39 @@ def parse_args():
         "--weight_method",
         type=str,
         default=WEIGHT_UNIFORM,
-        help=f"how to weight points, choose from: {WEIGHT_UNIFORM, WEIGHT_MAJORITY}",
+        help=f"how to weight points, choose from: {WEIGHT_UNIFORM, WEIGHT_MAJORITY, WEIGHT_POPULATION}",
     )
     parser.add_argument(
         "--color_method",
         type=str,
         default=RANDOM,
-        help="method for sampling color points",
+        help=f"method for sampling color points, choose from: {RANDOM, CLUSTERED, POPULATION_CENTERS, GRADIENT}",
+    )
+    parser.add_argument(
+        "--domain_size",
+        type=float,
+        default=None,
+        help="width/height of the (square) domain of the points, defaults to the domain in utils/constants.py",
     )
     parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument(
+        "--render",
+        type=str,
+        default=RENDER_AUTO,
+        help=f"how to draw points, choose from: {RENDER_AUTO, RENDER_SCATTER, RENDER_RASTER} ({RENDER_AUTO} rasterizes sets of at least {RENDER_RASTER_MIN_POINTS} points)",
+    )
     parser.add_argument(
         "--fig_save_path",
         type=str,
         default=None,
         help="path to save figure to (optional)",
     )
+    parser.add_argument(
+        "--cuts_export_path",
+        type=str,
+        default=None,
+        help=f"({ITERATIVE_HAM_SANDWICH} only) path to export the cut segments to, as .svg or .geojson (optional)",
+    )
     parser.add_argument(
         "--show_fig",
         action="store_true",
@@ -80,6 +135,11 @@ def parse_args():
         action="store_true",
         help=f"({ITERATIVE_HAM_SANDWICH} only) calculate final regions formed by cuts and log their statistics",
     )
+    parser.add_argument(
+        "--report_each_level",
+        action="store_true",
+        help=f"({ITERATIVE_HAM_SANDWICH} only) print the region color counts (with --calculate_final_regions) and save a figure (with --fig_save_path) of each level as soon as it is complete",
+    )
     parser.add_argument(
         "--subsample_points",
         action="store_true",
@@ -91,35 +151,172 @@ def parse_args():
         default=0.1,
         help="ratio of points to sample, will sample floor(n_points * ratio) total points",
     )
+    parser.add_argument(
+        "--subsample_method",
+        type=str,
+        default=SUBSAMPLE_RANDOM,
+        help=f"how to subsample points, choose from: {SUBSAMPLE_RANDOM, SUBSAMPLE_VORONOI}",
+    )
+    parser.add_argument(
+        "--voronoi_weights",
+        type=str,
+        default=VORONOI_WEIGHT_POPULATION,
+        help=f"({SUBSAMPLE_VORONOI} subsampling only) how to weight the sampled points, choose from: {VORONOI_WEIGHT_POPULATION, VORONOI_WEIGHT_AREA}",
+    )
+    parser.add_argument(
+        "--aggregate_points",
+        action="store_true",
+        help="merge duplicate points into weighted representatives before performing HSC",
+    )
+    parser.add_argument(
+        "--aggregate_cell_size",
+        type=float,
+        default=None,
+        help="(--aggregate_points only) also merge all points in the same grid cell of this size (optional)",
+    )
+    parser.add_argument(
+        "--arithmetic",
+        type=str,
+        default=ARITHMETIC_AUTO,
+        help=f"arithmetic used to compute cuts, choose from: {ARITHMETIC_AUTO, ARITHMETIC_FLOAT, ARITHMETIC_EXACT}",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="directory used to cache computed cuts between runs (optional)",
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=int,
+        default=512,
+        help="maximum size of the cut cache in MB, least recently used cuts are evicted first",
+    )
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=None,
+        help=f"({ITERATIVE_HAM_SANDWICH} only) directory to save the state after each level to, reruns resume from the deepest saved level (optional)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to compute the cuts of each level (iterative program only)",
+    )
     args = parser.parse_args()
     return args
 
 
 if __name__ == "__main__":
     args = parse_args()
+    # plotting code (matplotlib) is only imported if a figure is shown or saved, as it is slow to import
+    draw_fig = args.show_fig or args.fig_save_path is not None
+    if draw_fig and not args.show_fig:
+        import matplotlib
+
+        # figures are only saved, don't start a GUI backend
+        matplotlib.use("Agg")
     np.random.seed(args.seed)
+    bounds = None
+    if args.domain_size is not None:
+        bounds = get_square_bounds(args.domain_size)
     point_set = ColorPointSet(
         points_per_color=args.points_per_color,
         color_method=args.color_method,
         weighting_method=args.weight_method,
         k=args.k,
+        bounds=bounds,
     )
     og_point_set = None
     if args.subsample_points:
-        sub_point_set = subsample(point_set, args.subsample_ratio)
+        if args.subsample_method == SUBSAMPLE_VORONOI:
+            sub_point_set = get_voronoi_sample(
+                point_set, args.subsample_ratio, args.voronoi_weights
+            ).point_set
+        elif args.subsample_method == SUBSAMPLE_RANDOM:
+            sub_point_set = subsample(point_set, args.subsample_ratio)
+        else:
+            raise NotImplementedError(
+                f"Given subsample_method not supported: {args.subsample_method}"
+            )
         # will swap back to original set for visualization
         og_point_set = point_set
         point_set = sub_point_set
+    # points used to compute the cuts
+    cut_point_set = point_set
+    coreset = None
+    if args.aggregate_points:
+        coreset = aggregate_points(point_set, args.aggregate_cell_size)
+        cut_point_set = coreset.point_set
+        logging.info(
+            f"Aggregated {point_set.n_points} points into {len(coreset)} representatives "
+            f"(max error: {coreset.max_error})"
+        )
+    exact = ARITHMETIC_TO_EXACT[args.arithmetic]
+    cache = None
+    if args.cache_dir is not None:
+        cache = CutCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
     if args.program == HAM_SANDWICH:
-        cuts = get_ham_sandwich_cut(point_set)
+        if cache is not None:
+            cuts = cache.get_cuts(
+                cut_point_set, partial(get_ham_sandwich_cut, exact=exact), exact=exact
+            )
+        else:
+            cuts = get_ham_sandwich_cut(cut_point_set, exact)
         if args.subsample_points:
             point_set = og_point_set
-        plot_point_set(point_set, show=False, plot_bbox=True, hide_ticks=True)
-        plot_lines(cuts, save_path=args.fig_save_path, show=args.show_fig)
+        if draw_fig:
+            from visualization import plot_lines, plot_point_set
+
+            plot_point_set(
+                point_set,
+                show=False,
+                plot_bbox=True,
+                hide_ticks=True,
+                render=args.render,
+            )
+            bounds = (
+                point_set.lower_x,
+                point_set.upper_x,
+                point_set.lower_y,
+                point_set.upper_y,
+            )
+            plot_lines(
+                cuts, save_path=args.fig_save_path, show=args.show_fig, bounds=bounds
+            )
     elif args.program == ITERATIVE_HAM_SANDWICH:
-        regions, cuts, cut_segments, points_on_cuts, err = get_iterative_hs_cuts(
-            point_set, args.k, args.calculate_final_regions, og_point_set
+        checkpoints = None
+        if args.checkpoint_dir is not None:
+            checkpoints = LevelCheckpoints(args.checkpoint_dir)
+        hs_args = (
+            cut_point_set,
+            args.k,
+            args.calculate_final_regions,
+            og_point_set,
+            cache,
+            exact,
         )
+        if args.report_each_level:
+            report_point_set = og_point_set if og_point_set is not None else point_set
+            for level in iter_hs_levels(
+                *hs_args, workers=args.workers, checkpoints=checkpoints
+            ):
+                if not level.err and level.k < args.k:
+                    report_level(
+                        level, report_point_set, args.fig_save_path, args.render
+                    )
+            regions, cuts, cut_segments, points_on_cuts, err = (
+                level.regions,
+                level.cuts,
+                level.segments,
+                level.points_on_cuts,
+                level.err,
+            )
+        else:
+            regions, cuts, cut_segments, points_on_cuts, err = get_iterative_hs_cuts(
+                *hs_args, workers=args.workers, checkpoints=checkpoints
+            )
         # if using weighted case, then consider all points close to a cut to be on the cut
         cut_tol = 0.01  # NOTE: if there is a point within cut_tol of two cuts this will cause an error
         if args.weight_method == WEIGHT_MAJORITY:
@@ -134,40 +331,57 @@ if __name__ == "__main__":
         if not err:
             if args.subsample_points:
                 point_set = og_point_set
+            if args.cuts_export_path is not None:
+                bounds = (
+                    point_set.lower_x,
+                    point_set.upper_x,
+                    point_set.lower_y,
+                    point_set.upper_y,
+                )
+                export_cuts(cut_segments, args.k, args.cuts_export_path, bounds)
             if args.calculate_final_regions:
+                if coreset is not None and og_point_set is None:
+                    regions = coreset.expand(regions)
                 exclude_weights = args.weight_method == WEIGHT_MAJORITY
                 majorities = get_region_majorities(
                     point_set, points_on_cuts, regions, exclude_weights
                 )
                 print(f"Region majorities: {majorities}")
-            # special_indices = points that were intersected by a cut
-            # used to make these points less opaque for visualization purposes
-            intersected_points = point_set.get_matching_indices(points_on_cuts)
-            plot_point_set(
-                point_set,
-                show=False,
-                special_indices=intersected_points,
-                plot_bbox=True,
-                hide_ticks=True,
-                hide_weighted_pts=True,
-            )
-            plot_k_cuts(
-                cut_segments,
-                args.k,
-                save_path=args.fig_save_path,
-                segments_only=True,
-                show=args.show_fig,
-            )
+            if draw_fig:
+                from visualization import plot_k_cuts, plot_point_set
+
+                # special_indices = points that were intersected by a cut
+                # used to make these points less opaque for visualization purposes
+                intersected_points = point_set.get_matching_indices(points_on_cuts)
+                plot_point_set(
+                    point_set,
+                    show=False,
+                    special_indices=intersected_points,
+                    plot_bbox=True,
+                    hide_ticks=True,
+                    hide_weighted_pts=True,
+                    render=args.render,
+                )
+                plot_k_cuts(
+                    cut_segments,
+                    args.k,
+                    save_path=args.fig_save_path,
+                    segments_only=True,
+                    show=args.show_fig,
+                )
         else:
             logging.error(
                 "An error occured, please check the message above and/or your input points"
             )
     elif args.program == VISUALIZE_POINTS:
-        plot_point_set(point_set, save_path=args.fig_save_path)
-    # elif args.program == VORONOI_SAMPLING:
-    # (sampled_points, voronoi) = get_voronoi_sample(point_set)
-    # plot_point_set(sampled_points, show=False)
-    # plot_lines(voronoi, save_path=args.fig_save_path, show=args.show_fig)
+        # this program always draws the points, shown unless they are only saved
+        from visualization import plot_point_set
 
+        plot_point_set(
+            point_set,
+            show=args.show_fig or args.fig_save_path is None,
+            save_path=args.fig_save_path,
+            render=args.render,
+        )
     else:
         raise NotImplementedError(f"Given program not implemented: {args.program}")
@@ -5,14 +5,21 @@ File for plotting results from eval_main.py
 """
 
 import argparse
-import ast
+import multiprocessing
 import os
 from typing import Optional
 
+import matplotlib
+
+# non-interactive backend, figures are only saved (must be set before pyplot is imported)
+matplotlib.use("Agg")
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from results_store import read_results
+
 
 # ci == confidence interval
 def plot_xy_ci(
@@ -66,10 +73,11 @@ def parse_args():
         description="Script to plot eval metrics",
     )
     parser.add_argument(
+        "--results_path",
         "--csv_path",
         type=str,
         required=True,
-        help=f"path to results csv file",
+        help=f"path to results file (.csv, .parquet or .arrow)",
     )
     parser.add_argument(
         "--save_dir",
@@ -77,13 +85,19 @@ def parse_args():
         required=True,
         help="directory to save figures to",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to render figures",
+    )
     args = parser.parse_args()
     return args
 
 
 if __name__ == "__main__":
     args = parse_args()
-    df = pd.read_csv(args.csv_path, converters={"points_per_color": ast.literal_eval})
+    df = read_results(args.results_path)
     ideal_majority_share_col = r"$\delta$"
     majority_share_col = "majorityShare"
     majority_share_dist_from_ideal_col = r"$\mu$"
@@ -98,31 +112,42 @@ if __name__ == "__main__":
     )
     df[ideal_majority_share_col] = 1 - df[color_ratio]
     os.makedirs(args.save_dir, exist_ok=True)
-    plot_grouping(
-        df,
-        color_ratio,
-        majority_share_col,
-        os.path.join(args.save_dir, "color_ratio.png"),
-        ideal_majority_share_col,
-    )
-    plot_grouping(
-        df,
-        color_ratio,
-        majority_share_dist_from_ideal_col,
-        os.path.join(args.save_dir, "color_ratio_dist.png"),
-    )
-    plot_grouping(
-        df,
-        "k",
-        majority_share_dist_from_ideal_col,
-        os.path.join(args.save_dir, "k.png"),
-    )
+    # (args of plot_grouping) for each figure
+    plots = [
+        (
+            df,
+            color_ratio,
+            majority_share_col,
+            os.path.join(args.save_dir, "color_ratio.png"),
+            ideal_majority_share_col,
+        ),
+        (
+            df,
+            color_ratio,
+            majority_share_dist_from_ideal_col,
+            os.path.join(args.save_dir, "color_ratio_dist.png"),
+        ),
+        (
+            df,
+            "k",
+            majority_share_dist_from_ideal_col,
+            os.path.join(args.save_dir, "k.png"),
+        ),
+    ]
 
     sub_df = df[df["use_subsampling"]]
     if len(sub_df) > 0:
-        plot_grouping(
-            df,
-            "subsample_ratio",
-            majority_share_dist_from_ideal_col,
-            os.path.join(args.save_dir, "sub_ratio.png"),
+        plots.append(
+            (
+                df,
+                "subsample_ratio",
+                majority_share_dist_from_ideal_col,
+                os.path.join(args.save_dir, "sub_ratio.png"),
+            )
         )
+    if args.workers > 1:
+        with multiprocessing.Pool(args.workers) as pool:
+            pool.starmap(plot_grouping, plots)
+    else:
+        for plot_args in plots:
+            plot_grouping(*plot_args)
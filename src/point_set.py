@@ -5,14 +5,16 @@ Description: Class for generating/storing points in a 2D region.
 Will sample and color the points according to the given parameters.
 """
 
+import copy
 from typing import Optional
 
 import numpy as np
 from shapely import Polygon
 
+from generators import generate_points
 from utils.constants import *
 from utils.geometry import get_rectangular_region, get_vertices, xy_to_points
-from utils.weighting import get_biased_weights_random
+from utils.weighting import get_biased_weights_random, get_population_weights
 
 
 class ColorPointSet:
@@ -25,14 +27,25 @@ class ColorPointSet:
         spreads: np.ndarray = None,
         color_sets: Optional[dict] = None,
         defining_poly: Optional[Polygon] = None,
+        multiplicities: Optional[dict] = None,
+        bounds: Optional[tuple] = None,
     ) -> None:
+        """
+        Points are generated in bounds = (lower_x, upper_x, lower_y, upper_y), defaults to the domain
+        in utils/constants.py.
+        """
         self.lower_x = LOWER_X
         self.upper_x = UPPER_X
         self.lower_y = LOWER_Y
         self.upper_y = UPPER_Y
+        if bounds is not None:
+            self.lower_x, self.upper_x, self.lower_y, self.upper_y = bounds
+        # multiplicities[c][i] = number of points represented by color_sets[c][i] (see coreset.py)
+        self.multiplicities = None
+        self.weighting_method = weighting_method
 
         if color_sets is not None and defining_poly is not None:
-            self._alt_init(color_sets, defining_poly)
+            self._alt_init(color_sets, defining_poly, multiplicities)
             return
 
         self.n_points = sum(points_per_color)
@@ -40,32 +53,34 @@ class ColorPointSet:
         self.n_colors = len(points_per_color)
         self.points_per_color = points_per_color
 
-        self.x, self.y = self._uniform_random()
+        # colors[i] = m indicates point (x[i], y[i]) is color m, m in [0, n_colors]
+        self.x, self.y, self.colors = generate_points(
+            color_method,
+            points_per_color,
+            (self.lower_x, self.upper_x, self.lower_y, self.upper_y),
+        )
         self.is_weight = np.zeros(
             len(self.x), dtype="bool"
         )  # is_weight[i] == if point i is just a "weight"
-        # colors[i] = m indicates point (x[i], y[i]) is color m, m in [0, n_colors]
         self.unique_colors = np.arange(self.n_colors)
-        self.colors = self._get_point_colors()
         self.points = xy_to_points(self.x, self.y)
         self.color_sets = self._get_color_sets()
         self.og_color_sets = self.color_sets
         if weighting_method is not None and weighting_method == WEIGHT_MAJORITY:
-            n_regions = 2**k
-            self.weights = get_biased_weights_random(
-                self.colors, points_per_color, n_regions
-            )
-            # even spread
-            spreads = [0.01] * len(self.weights)
-            self.spreads = np.array(spreads)
-            self._cluster()
+            self._weight_majority(k)
         elif weighting_method is not None and weighting_method == WEIGHT_POPULATION:
-            # TODO:
-            raise NotImplementedError()
+            self._weight_population()
 
-    def _alt_init(self, color_sets: dict, defining_poly: Polygon):
+    def _alt_init(
+        self,
+        color_sets: dict,
+        defining_poly: Polygon,
+        multiplicities: Optional[dict] = None,
+    ):
         # don't need all attributes if using this initialization
         self.color_sets = color_sets
+        self.defining_poly = defining_poly
+        self.multiplicities = multiplicities
         self.n_colors = len(color_sets)
         self.n_points = sum([len(c_set) for c_set in color_sets.values()])
 
@@ -76,6 +91,57 @@ class ColorPointSet:
         self.lower_y = min(vertices, key=lambda p: p.y).y
         self.upper_y = max(vertices, key=lambda p: p.y).y
 
+    def _weight_majority(self, k: int):
+        n_regions = 2**k
+        self.weights = get_biased_weights_random(
+            self.colors, self.points_per_color, n_regions
+        )
+        # even spread
+        spreads = [0.01] * len(self.weights)
+        self.spreads = np.array(spreads)
+        self._cluster()
+
+    def _weight_population(self):
+        # each point is a population center, its population is its multiplicity (used directly by the
+        # weighted cut) so no points are sampled around it (see sample_population)
+        self.weights = get_population_weights(self.n_points, POPULATION_MEAN)
+        self.spreads = POPULATION_SPREAD * np.sqrt(self.weights / POPULATION_MEAN)
+        self.multiplicities = {
+            color: self.weights[self.colors == color] for color in self.unique_colors
+        }
+
+    def sample_population(
+        self, max_points: Optional[int] = None, seed: int = 0
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sample the individual points (x, y, colors) around the population centers (WEIGHT_POPULATION), e.g.,
+        to visualize them. If the total population is larger than max_points, max_points points are sampled
+        with each center chosen proportionally to its population. Uses its own random generator (seed),
+        so sampling does not change the global random state.
+        """
+        rng = np.random.default_rng(seed)
+        total = int(np.sum(self.weights))
+        if max_points is not None and total > max_points:
+            idx = rng.choice(len(self.weights), size=max_points, p=self.weights / total)
+        else:
+            idx = np.repeat(np.arange(len(self.weights)), self.weights)
+        # uniform in a disk around the center (same as _cluster)
+        r = self.spreads[idx] * np.sqrt(rng.random(len(idx)))
+        theta = rng.uniform(0, 2 * np.pi, len(idx))
+        x = self.x[idx] + r * np.cos(theta)
+        y = self.y[idx] + r * np.sin(theta)
+        return x, y, self.colors[idx]
+
+    def reweighted(self, k: int) -> "ColorPointSet":
+        """
+        Copy of this (unweighted) point set with a new random draw of majority weights for 2^k regions,
+        same as generating it with weighting_method=WEIGHT_MAJORITY but without sampling the points again.
+        """
+        assert not np.any(self.is_weight), "point set is already weighted"
+        weighted = copy.copy(self)
+        weighted._weight_majority(k)
+        return weighted
+
     def get_matching_indices(self, query_ps: list, atol: float = 1e-8) -> np.ndarray:
         """
         Used for helping visualize/set opacity of points on cut-line
@@ -90,27 +156,13 @@ class ColorPointSet:
         return np.array(indices)
 
     def _get_color_sets(self):
-        # colors_lists[i] = (x[j], y[j]) where color[j]=i
+        # colors_lists[i] = (x[j], y[j]) where color[j]=i, shares the Point objects of self.points
         color_sets = {}
         for color in self.unique_colors:
-            idx = self.colors == color
-            color_sets[color] = xy_to_points(self.x[idx], self.y[idx])
+            color_sets[color] = self.points[self.colors == color]
         self.color_sets = color_sets
         return color_sets
 
-    def _get_point_colors(self) -> np.ndarray:
-        if self.color_method == RANDOM:
-            return self._random_colors()
-        else:
-            raise NotImplementedError(
-                f"Given color_method not supported: {self.color_method}"
-            )
-
-    def _uniform_random(self) -> tuple[np.ndarray, np.ndarray]:
-        x = np.random.uniform(self.lower_x, self.upper_x, self.n_points)
-        y = np.random.uniform(self.lower_y, self.upper_y, self.n_points)
-        return x, y
-
     def _cluster(self) -> tuple[np.ndarray, np.ndarray]:
         x = self.x
         y = self.y
@@ -158,29 +210,22 @@ class ColorPointSet:
             self.points_per_color[u] = c
         self.color_sets = self._get_color_sets()
 
-    def _random_colors(self) -> np.ndarray:
-        # for random case this is overly complicated, but want code to be adapatable
-        # to other color-sampling techniques (e.g., based on location)
-        colors = []
-        for i, n in enumerate(self.points_per_color):
-            i_arr = [i] * n
-            colors.extend(i_arr)
-        colors = np.array(colors)
-        return np.array(colors)
-
     def __len__(self):
         return self.n_points
 
 
-def subsample(point_set: ColorPointSet, ratio: float):
+def subsample(
+    point_set: ColorPointSet, ratio: float, rng: Optional[np.random.Generator] = None
+):
     """
     Return subset of ColorPointSet by sampling ratio * (n_points) points from point_set.
     Will sample from color_sets to (approximately) preserve the ratio of points per color.
+    Sampled points keep their multiplicities (if any).
+    Points are drawn with rng if given, otherwise with the global random state.
     """
+    points_per_color = [len(point_set.color_sets[c]) for c in range(point_set.n_colors)]
     sub_n_points = np.floor(point_set.n_points * ratio)
-    sub_points_per_color = list(
-        map(lambda n: int(np.floor(ratio * n)), point_set.points_per_color)
-    )
+    sub_points_per_color = list(map(lambda n: int(np.floor(ratio * n)), points_per_color))
     remainder = sub_n_points - np.sum(sub_points_per_color)
     for i in range(int(remainder)):
         sub_points_per_color[i] += 1
@@ -190,9 +235,19 @@ def subsample(point_set: ColorPointSet, ratio: float):
         point_set.lower_x, point_set.upper_x, point_set.lower_y, point_set.upper_y
     )
     sub_cset = {}
+    sub_multiplicities = None if point_set.multiplicities is None else {}
     for color in point_set.color_sets:
-        sub_cset[color] = np.random.choice(
-            point_set.color_sets[color], size=sub_points_per_color[color], replace=False
+        idx = (np.random if rng is None else rng).choice(
+            len(point_set.color_sets[color]),
+            size=sub_points_per_color[color],
+            replace=False,
         )
-    sub_point_set = ColorPointSet(color_sets=sub_cset, defining_poly=sub_bounding_poly)
+        sub_cset[color] = np.array(list(point_set.color_sets[color]), dtype=object)[idx]
+        if sub_multiplicities is not None:
+            sub_multiplicities[color] = point_set.multiplicities[color][idx]
+    sub_point_set = ColorPointSet(
+        color_sets=sub_cset,
+        defining_poly=sub_bounding_poly,
+        multiplicities=sub_multiplicities,
+    )
     return sub_point_set
@@ -0,0 +1,233 @@
+"""
+Description:
+Render the district maps (points + iterative cuts) of a sweep over seeds and k in parallel.
+
+Each worker process handles one seed (or one (seed, k) pair for majority weighting, where the point set
+depends on k) and uses the non-interactive Agg backend, so no display is needed and figures are only saved.
+With --checkpoint_dir/--cache_dir the cuts saved by earlier runs are reused instead of being computed again.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+from typing import NamedTuple, Optional
+
+import matplotlib
+
+# non-interactive backend, figures are only saved (must be set before pyplot is imported)
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from checkpoint import LevelCheckpoints
+from ensemble_main import _init_worker
+from eval_main import _k_dependent_point_set
+from iterative_ham import iterative_hs_cuts_over_k
+from main import list_of_int
+from point_set import ColorPointSet
+from utils.constants import *
+from utils.cut_cache import CutCache
+from visualization import plot_k_cuts, plot_point_set
+
+
+class RenderJob(NamedTuple):
+    points_per_color: list[int]
+    seed: int
+    k_vals: list[int]
+    color_method: str
+    weight_method: str
+    save_dir: str
+    render: str
+    fig_format: str
+    checkpoint_dir: Optional[str]
+    cache_dir: Optional[str]
+
+
+def _save_district_map(
+    point_set: ColorPointSet, result: tuple, k: int, save_path: str, render: str
+):
+    _, _, cut_segments, points_on_cuts, _ = result
+    fig = plt.figure()
+    plot_point_set(
+        point_set,
+        show=False,
+        special_indices=point_set.get_matching_indices(points_on_cuts),
+        plot_bbox=True,
+        hide_ticks=True,
+        hide_weighted_pts=True,
+        render=render,
+    )
+    plot_k_cuts(cut_segments, k, save_path=save_path, segments_only=True, show=False)
+    plt.close(fig)
+
+
+def render_job(job: RenderJob) -> list[str]:
+    """
+    Compute the cuts of job.seed for each k in job.k_vals and save their figures, returns the saved paths.
+    """
+    np.random.seed(job.seed)
+    point_set = ColorPointSet(
+        points_per_color=job.points_per_color,
+        color_method=job.color_method,
+        weighting_method=job.weight_method,
+        k=max(job.k_vals),
+    )
+    cache = CutCache(job.cache_dir) if job.cache_dir is not None else None
+    checkpoints = None
+    if job.checkpoint_dir is not None:
+        checkpoints = LevelCheckpoints(job.checkpoint_dir)
+    saved = []
+    for k, result in iterative_hs_cuts_over_k(
+        point_set, job.k_vals, False, cache=cache, checkpoints=checkpoints
+    ):
+        if result[-1]:
+            logging.error(f"Could not compute cuts for seed {job.seed} with k={k}")
+            continue
+        ppc = "_".join(map(str, job.points_per_color))
+        save_path = os.path.join(
+            job.save_dir, f"ppc{ppc}_k{k}_seed{job.seed}.{job.fig_format}"
+        )
+        _save_district_map(point_set, result, k, save_path, job.render)
+        saved.append(save_path)
+    return saved
+
+
+def get_render_jobs(
+    points_per_color: list[int],
+    seeds: list[int],
+    k_vals: list[int],
+    weight_method: str,
+    save_dir: str,
+    color_method: str = RANDOM,
+    render: str = RENDER_AUTO,
+    fig_format: str = "png",
+    checkpoint_dir: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+) -> list[RenderJob]:
+    if _k_dependent_point_set(weight_method):
+        k_groups = [[k] for k in k_vals]
+    else:
+        k_groups = [list(k_vals)]
+    return [
+        RenderJob(
+            points_per_color,
+            int(seed),
+            ks,
+            color_method,
+            weight_method,
+            save_dir,
+            render,
+            fig_format,
+            checkpoint_dir,
+            cache_dir,
+        )
+        for seed in seeds
+        for ks in k_groups
+    ]
+
+
+def render_jobs(jobs: list[RenderJob], workers: int = 1) -> list[str]:
+    """
+    Run the jobs in a pool of workers (in this process if workers == 1), returns all saved paths.
+    """
+    if workers == 1:
+        _init_worker()
+        return [p for job in jobs for p in render_job(job)]
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        return [p for paths in pool.imap_unordered(render_job, jobs) for p in paths]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="render_main",
+        description="Render the district maps of a sweep over seeds and k in parallel",
+    )
+    parser.add_argument(
+        "--points_per_color",
+        required=True,
+        type=list_of_int,
+        help="number of points to use for each color",
+    )
+    parser.add_argument(
+        "--seeds",
+        type=list_of_int,
+        default=list(range(10)),
+        help="random seeds to render (comma separated)",
+    )
+    parser.add_argument(
+        "--k_vals",
+        type=list_of_int,
+        default=[1, 2, 3, 4],
+        help="numbers of iterations to render (comma separated)",
+    )
+    parser.add_argument(
+        "--color_method",
+        type=str,
+        default=RANDOM,
+        help=f"method for sampling color points, choose from: {RANDOM, CLUSTERED, POPULATION_CENTERS, GRADIENT}",
+    )
+    parser.add_argument(
+        "--weight_method",
+        type=str,
+        default=WEIGHT_UNIFORM,
+        help=f"how to weight points, choose from: {WEIGHT_UNIFORM, WEIGHT_MAJORITY, WEIGHT_POPULATION}",
+    )
+    parser.add_argument(
+        "--save_dir",
+        type=str,
+        required=True,
+        help="directory to save figures to",
+    )
+    parser.add_argument(
+        "--fig_format",
+        type=str,
+        default="png",
+        help="file format of the figures (e.g., png, pdf, svg)",
+    )
+    parser.add_argument(
+        "--render",
+        type=str,
+        default=RENDER_AUTO,
+        help=f"how to draw points, choose from: {RENDER_AUTO, RENDER_SCATTER, RENDER_RASTER}",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of processes used to render figures",
+    )
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=None,
+        help="directory of per-level checkpoints to resume the cuts from (optional)",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="directory used to cache computed cuts between runs (optional)",
+    )
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.makedirs(args.save_dir, exist_ok=True)
+    jobs = get_render_jobs(
+        args.points_per_color,
+        args.seeds,
+        args.k_vals,
+        args.weight_method,
+        args.save_dir,
+        args.color_method,
+        args.render,
+        args.fig_format,
+        args.checkpoint_dir,
+        args.cache_dir,
+    )
+    saved = render_jobs(jobs, args.workers)
+    print(f"Saved {len(saved)} figures to: {args.save_dir}")
@@ -0,0 +1,159 @@
+"""
+Description:
+Typed columnar storage of evaluation results (see eval_main.py/ensemble_main.py).
+
+Rows are written in batches as they are produced to Parquet (.parquet) or Arrow IPC (.arrow/.feather) files,
+with list/int columns stored as such (no stringified lists to parse back), so large result files load quickly
+and can be filtered on read. CSV (.csv) is still supported through pandas.
+pyarrow is optional and only imported when a Parquet/Arrow file is written or read.
+"""
+
+import ast
+import os
+from typing import Iterable, Optional
+
+PARQUET = "parquet"
+ARROW = "arrow"
+CSV = "csv"
+_FORMATS = {".parquet": PARQUET, ".arrow": ARROW, ".feather": ARROW, ".csv": CSV}
+
+# columns holding lists (stringified in csv files)
+LIST_COLUMNS = ["points_per_color", "region_counts"]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required to write/read .parquet and .arrow results "
+            "(pip install pyarrow), or use a .csv path instead"
+        ) from e
+    return pyarrow
+
+
+def get_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _FORMATS:
+        raise NotImplementedError(f"Given results format not supported: {ext}")
+    return _FORMATS[ext]
+
+
+def get_eval_schema():
+    """
+    Schema of the rows of eval_main.evaluate_params.
+    """
+    pa = _import_pyarrow()
+    return pa.schema(
+        [
+            ("k", pa.int32()),
+            ("points_per_color", pa.list_(pa.int64())),
+            ("seed", pa.int64()),
+            ("weight_method", pa.string()),
+            ("use_subsampling", pa.bool_()),
+            ("subsample_ratio", pa.float64()),
+            ("majority_share", pa.float64()),
+            ("runtime", pa.float64()),
+            # stages of runtime (in seconds)
+            ("generate_time", pa.float64()),
+            ("cut_time", pa.float64()),
+            ("stats_time", pa.float64()),
+        ]
+    )
+
+
+class ResultsWriter:
+    """
+    Write rows (dicts) to a Parquet/Arrow file, batch_size rows at a time.
+    If schema is None it is inferred from the first batch.
+    """
+
+    def __init__(self, path: str, schema=None, batch_size: int = 10_000) -> None:
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.format = get_format(path)
+        assert self.format != CSV, "use save_results to write csv files"
+        self.schema = schema
+        self.batch_size = batch_size
+        self.n_rows = 0
+        self._rows = []
+        self._writer = None
+
+    def write(self, row: dict):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows: Iterable[dict]):
+        for row in rows:
+            self.write(row)
+
+    def _open(self, schema):
+        self.schema = schema
+        if self.format == PARQUET:
+            self._writer = self.pa.parquet.ParquetWriter(self.path, schema)
+        else:
+            self._writer = self.pa.ipc.new_file(self.path, schema)
+
+    def flush(self):
+        if len(self._rows) == 0:
+            return
+        table = self.pa.Table.from_pylist(self._rows, schema=self.schema)
+        if self._writer is None:
+            self._open(table.schema)
+        self._writer.write_table(table)
+        self.n_rows += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        if self._writer is None:
+            # no rows were written, still create the file
+            self._open(self.schema if self.schema is not None else self.pa.schema([]))
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_results(rows: Iterable[dict], save_path: str, schema=None) -> int:
+    """
+    Save rows to save_path (format based on its extension), returns the number of rows written.
+    Rows are only collected in memory for csv files.
+    """
+    if get_format(save_path) == CSV:
+        import pandas as pd
+
+        df = pd.DataFrame.from_dict(list(rows))
+        df.to_csv(save_path)
+        return len(df)
+    with ResultsWriter(save_path, schema) as writer:
+        writer.write_rows(rows)
+    return writer.n_rows
+
+
+def read_results(
+    path: str, columns: Optional[list[str]] = None, filters: Optional[list] = None
+):
+    """
+    Load a results file as a DataFrame. filters are only applied when reading Parquet/Arrow files and are
+    given in pyarrow's DNF form, e.g., [("k", "==", 3), ("weight_method", "==", "uniform")].
+    """
+    if get_format(path) == CSV:
+        import pandas as pd
+
+        assert filters is None, "filters are not supported for csv files"
+        header = pd.read_csv(path, nrows=0).columns
+        converters = {c: ast.literal_eval for c in LIST_COLUMNS if c in header}
+        return pd.read_csv(path, usecols=columns, converters=converters)
+    pa = _import_pyarrow()
+    fmt = "parquet" if get_format(path) == PARQUET else "ipc"
+    dataset = pa.dataset.dataset(path, format=fmt)
+    expr = None if filters is None else pa.parquet.filters_to_expression(filters)
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
@@ -0,0 +1,188 @@
+"""
+Description:
+Point columns (coordinates, colors, weights, multiplicities) stored in shared memory for multi-process work.
+
+The owner copies the columns of a ColorPointSet into multiprocessing.shared_memory blocks once.
+Workers are only sent a small PointsHandle (block names + row indices), so fanning out regions costs
+no pickling of shapely Points and there is a single copy of the points regardless of worker count.
+"""
+
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from point_set import ColorPointSet
+from utils.geometry import get_rectangular_region, xy_to_points
+
+# name -> dtype of each shared column
+COLUMNS = {
+    "x": np.float64,
+    "y": np.float64,
+    "color": np.int64,
+    # is_weight[i] == if point i is just a "weight" (see ColorPointSet._cluster)
+    "is_weight": np.bool_,
+    # row of the original point of each weight point (own row for original points)
+    "og_index": np.int64,
+    # number of points represented by each row (see ColorPointSet.multiplicities)
+    "multiplicity": np.int64,
+}
+
+
+class PointsHandle(NamedTuple):
+    """
+    Picklable reference to (a subset of) the rows of a SharedPointArrays.
+    """
+
+    block_names: dict
+    n_rows: int
+    bounds: tuple
+    n_colors: int
+    # rows of each color, in the same order as the color sets they were taken from
+    rows: Optional[dict] = None
+    has_multiplicities: bool = False
+
+
+class SharedPointArrays:
+    """
+    Columns of a point set in shared memory. Create with from_point_set (owner) or attach (workers).
+    The owner should call unlink() once all workers are done.
+    """
+
+    def __init__(self, handle: PointsHandle, blocks: dict, owner: bool) -> None:
+        self.handle = handle
+        self._blocks = blocks
+        self._owner = owner
+        self.columns = {
+            name: np.ndarray((handle.n_rows,), dtype=COLUMNS[name], buffer=blocks[name].buf)
+            for name in COLUMNS
+        }
+        # maps id(Point) -> row, only available to the owner (see rows_of)
+        self._row_of_point = {}
+
+    @classmethod
+    def from_point_set(cls, point_set: ColorPointSet):
+        """
+        Copy the points of point_set into new shared memory blocks. Rows are ordered by color, then
+        by position within point_set.color_sets.
+        """
+        colors = sorted(point_set.color_sets)
+        points = [p for c in colors for p in point_set.color_sets[c]]
+        n_rows = len(points)
+        data = {
+            "x": np.array([p.x for p in points], dtype=np.float64),
+            "y": np.array([p.y for p in points], dtype=np.float64),
+            "color": np.repeat(colors, [len(point_set.color_sets[c]) for c in colors]),
+            "is_weight": np.zeros(n_rows, dtype=np.bool_),
+            "og_index": np.arange(n_rows),
+            "multiplicity": np.ones(n_rows, dtype=np.int64),
+        }
+        if point_set.multiplicities is not None:
+            data["multiplicity"] = np.concatenate(
+                [point_set.multiplicities[c] for c in colors]
+            )
+        weighted_to_og = getattr(point_set, "weighted_to_og", None)
+        if weighted_to_og is not None:
+            # color sets were built from the point_set.x/y arrays, map those indices to rows
+            point_idx = np.concatenate(
+                [np.flatnonzero(point_set.colors == c) for c in colors]
+            )
+            row_of_idx = np.empty(len(point_set.colors), dtype=np.int64)
+            row_of_idx[point_idx] = np.arange(n_rows)
+            data["is_weight"] = point_set.is_weight[point_idx]
+            data["og_index"] = np.array(
+                [row_of_idx[weighted_to_og.get(i, i)] for i in point_idx]
+            )
+        blocks = {}
+        try:
+            for name, dtype in COLUMNS.items():
+                nbytes = max(n_rows * np.dtype(dtype).itemsize, 1)
+                blocks[name] = shared_memory.SharedMemory(create=True, size=nbytes)
+        except Exception:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        handle = PointsHandle(
+            block_names={name: block.name for name, block in blocks.items()},
+            n_rows=n_rows,
+            bounds=(
+                point_set.lower_x,
+                point_set.upper_x,
+                point_set.lower_y,
+                point_set.upper_y,
+            ),
+            n_colors=len(colors),
+            has_multiplicities=point_set.multiplicities is not None,
+        )
+        arrays = cls(handle, blocks, owner=True)
+        for name in COLUMNS:
+            arrays.columns[name][:] = data[name]
+        arrays._row_of_point = {id(p): i for i, p in enumerate(points)}
+        return arrays
+
+    @classmethod
+    def attach(cls, handle: PointsHandle):
+        blocks = {}
+        for name, block_name in handle.block_names.items():
+            # worker processes share the resource tracker of the owner, so attaching here does
+            # not cause the block to be unlinked when the worker exits
+            blocks[name] = shared_memory.SharedMemory(name=block_name)
+        return cls(handle, blocks, owner=False)
+
+    def rows_of(self, point_set: ColorPointSet) -> dict:
+        """
+        Get the rows (per color) of the points of point_set, which must be a region of the point set
+        these arrays were created from (i.e., contain the same Point objects).
+        """
+        return {
+            c: np.array([self._row_of_point[id(p)] for p in c_points], dtype=np.int64)
+            for c, c_points in point_set.color_sets.items()
+        }
+
+    def handle_for(self, rows: dict) -> PointsHandle:
+        return self.handle._replace(rows=rows)
+
+    def point_set(
+        self, rows: Optional[dict] = None, multiplicities: Optional[dict] = None
+    ) -> ColorPointSet:
+        """
+        Build a ColorPointSet from the given rows (per color), defaults to the rows of the handle
+        or all rows. multiplicities default to the stored ones, they differ for points which were
+        split by a cut (see iterative_ham._get_new_point_sets).
+        """
+        if rows is None:
+            rows = self.handle.rows
+        x, y, color = self.columns["x"], self.columns["y"], self.columns["color"]
+        if rows is None:
+            rows = {c: np.flatnonzero(color == c) for c in range(self.handle.n_colors)}
+        color_sets = {c: list(xy_to_points(x[r], y[r])) for c, r in rows.items()}
+        if multiplicities is None and self.handle.has_multiplicities:
+            multiplicities = {c: self.columns["multiplicity"][r] for c, r in rows.items()}
+        return ColorPointSet(
+            color_sets=color_sets,
+            defining_poly=get_rectangular_region(*self.handle.bounds),
+            multiplicities=multiplicities,
+        )
+
+    def close(self):
+        # views into the blocks must be released before closing them
+        self.columns = {}
+        for block in self._blocks.values():
+            block.close()
+
+    def unlink(self):
+        self.close()
+        if self._owner:
+            for block in self._blocks.values():
+                block.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._owner:
+            self.unlink()
+        else:
+            self.close()
@@ -0,0 +1,287 @@
+"""
+Description:
+Out-of-core version of the (unweighted) ham-sandwich algo in ham_sandwich.py, for point sets that are too
+large to hold as dual lines.
+
+The points are only read in chunks (e.g., from a memory-mapped .npy file) and the median level at x is found
+in two passes: the first builds a quantile sketch (see utils/quantile_sketch.py) of the dual lines at x, the
+second keeps only the lines whose level is near the sketch's median and selects the exact (perturbed)
+median among them. If the sketch was off by more than expected the second pass is repeated with a wider
+window, so the levels (and signs) are the same as find_perturbed_median_level.
+
+The final step solves the cut exactly on the dual lines near the median levels, and checks the cut
+against all of the points with another pass (again widening the window if the check fails).
+"""
+
+from functools import partial
+
+import numpy as np
+
+from ham_sandwich import _perturbed_sign, median_intersection
+from utils.geometry import Line
+from utils.quantile_sketch import KLLSketch
+
+DEFAULT_SKETCH_K = 200
+
+
+class CoordinateChunks:
+    """
+    Re-iterable view of the (n, 2) array coords as chunks of (x-coordinates, y-coordinates).
+    coords can be a memory-mapped array (see from_npy) so only one chunk is in memory at a time.
+    """
+
+    def __init__(self, coords: np.ndarray, chunk_size: int = 1_000_000) -> None:
+        self.coords = coords
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_npy(cls, path: str, chunk_size: int = 1_000_000) -> "CoordinateChunks":
+        return cls(np.load(path, mmap_mode="r"), chunk_size)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __iter__(self):
+        for start in range(0, len(self.coords), self.chunk_size):
+            chunk = np.asarray(self.coords[start : start + self.chunk_size])
+            yield chunk[:, 0], chunk[:, 1]
+
+
+def _dual_levels(x: float, chunk: tuple) -> np.ndarray:
+    # level at x of the dual lines (slope px, y-intercept -py) of the points of chunk
+    px, py = chunk
+    return px * x - py
+
+
+def _chunk_xs(chunk: tuple) -> np.ndarray:
+    return chunk[0]
+
+
+def _sketch(values, chunks: CoordinateChunks, k: int) -> KLLSketch:
+    sketch = KLLSketch(k, seed=0)
+    for chunk in chunks:
+        sketch.update(values(chunk))
+    return sketch
+
+
+def _window(sketch: KLLSketch, ranks: list[int], margin: int) -> tuple[float, float]:
+    # values bracketing the given ranks, if the sketch's rank error is below margin
+    lo_rank = min(ranks) - margin
+    hi_rank = max(ranks) + margin
+    lo = sketch.rank_value(lo_rank) if lo_rank > 0 else -np.inf
+    hi = sketch.rank_value(hi_rank) if hi_rank < len(sketch) - 1 else np.inf
+    return lo, hi
+
+
+def _select_ranks(
+    values,
+    chunks: CoordinateChunks,
+    ranks: list[int],
+    first_index: int,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (values, indices) of the items with the given ranks in the perturbed order (by value, for
+    tied values the item with the smaller index is higher), where the i-th item of chunks has
+    index first_index + i.
+    """
+    sketch = _sketch(values, chunks, k)
+    margin = 2 * len(sketch) // k + 1
+    while True:
+        lo, hi = _window(sketch, ranks, margin)
+        n_below = 0
+        window_vals = []
+        window_idx = []
+        offset = first_index
+        for chunk in chunks:
+            vals = values(chunk)
+            n_below += np.count_nonzero(vals < lo)
+            inside = np.flatnonzero((vals >= lo) & (vals <= hi))
+            window_vals.append(vals[inside])
+            window_idx.append(offset + inside)
+            offset += len(vals)
+        window_vals = np.concatenate(window_vals)
+        window_idx = np.concatenate(window_idx)
+        if n_below <= min(ranks) and max(ranks) < n_below + len(window_vals):
+            order = np.lexsort((-window_idx, window_vals))
+            selected = order[np.asarray(ranks) - n_below]
+            return window_vals[selected], window_idx[selected]
+        margin *= 4
+
+
+def streaming_median_level(
+    x: float, chunks: CoordinateChunks, first_index: int = 0, k: int = DEFAULT_SKETCH_K
+):
+    """
+    Same as ham_sandwich.find_perturbed_median_level for the dual lines of the points in chunks.
+    """
+    n = len(chunks)
+    mid = n // 2
+    levels = partial(_dual_levels, x)
+    if n % 2 == 1:
+        vals, idx = _select_ranks(levels, chunks, [mid], first_index, k)
+        return float(vals[0]), int(idx[0])
+    vals, idx = _select_ranks(levels, chunks, [mid - 1, mid], first_index, k)
+    return float((vals[0] + vals[1]) / 2), int(min(idx))
+
+
+def _streaming_level_sign(
+    x: float, c1_chunks: CoordinateChunks, c2_chunks: CoordinateChunks, k: int
+) -> int:
+    return _perturbed_sign(
+        streaming_median_level(x, c1_chunks, k=k),
+        streaming_median_level(x, c2_chunks, len(c1_chunks), k),
+    )
+
+
+def _streaming_bracket(
+    c1_chunks: CoordinateChunks,
+    c2_chunks: CoordinateChunks,
+    k: int,
+    max_doublings: int,
+):
+    """
+    Get an interval with an odd number of crossings of the median levels (so at least one), or None if
+    none was found. The interval is doubled until the signs at its ends differ.
+    """
+    y_range = 0.0
+    for chunks in (c1_chunks, c2_chunks):
+        for _, py in chunks:
+            y_range = max(y_range, float(np.max(np.abs(py))))
+    bound = 2 * y_range + 1
+    for _ in range(max_doublings):
+        left_sign = _streaming_level_sign(-bound, c1_chunks, c2_chunks, k)
+        right_sign = _streaming_level_sign(bound, c1_chunks, c2_chunks, k)
+        if left_sign != right_sign:
+            return (-bound, bound), left_sign
+        bound *= 2
+    return None
+
+
+def _candidate_duals(
+    interval: tuple,
+    chunks: CoordinateChunks,
+    sketches: tuple[KLLSketch, KLLSketch],
+    margin: int,
+):
+    """
+    Split the dual lines into the lines below (above) the window around the median at both ends of
+    interval and the remaining candidates. Returns (candidate lines, number below, number above).
+    """
+    n = len(chunks)
+    ranks = [(n - 1) // 2, n // 2]
+    windows = [_window(sketch, ranks, margin) for sketch in sketches]
+    n_below = 0
+    n_above = 0
+    candidates = []
+    for chunk in chunks:
+        left = _dual_levels(interval[0], chunk)
+        right = _dual_levels(interval[1], chunk)
+        below = (left < windows[0][0]) & (right < windows[1][0])
+        above = (left > windows[0][1]) & (right > windows[1][1])
+        n_below += np.count_nonzero(below)
+        n_above += np.count_nonzero(above)
+        keep = ~(below | above)
+        candidates.extend(
+            Line(slope=float(px), y_int=-float(py))
+            for px, py in zip(chunk[0][keep], chunk[1][keep])
+        )
+    return candidates, n_below, n_above
+
+
+def _pad_candidates(interval: tuple, candidates: list[Line], n_below: int, n_above: int):
+    """
+    Add horizontal lines below (or above) all of the candidates so that as many lines are removed
+    below as above, then the median level of the candidates is the median level of all lines.
+    """
+    if n_below == n_above or len(candidates) == 0:
+        return candidates
+    ends = [l.get_y(x) for l in candidates for x in interval]
+    if n_below > n_above:
+        y = min(ends) - 1
+    else:
+        y = max(ends) + 1
+    return candidates + [Line(slope=0.0, y_int=y)] * abs(n_below - n_above)
+
+
+def _bisects(cut: Line, chunks: CoordinateChunks, atol: float = 1e-8) -> bool:
+    # at most half of the points of chunks are on either side of cut (see geometry._on_line)
+    n_below = 0
+    n_above = 0
+    for px, py in chunks:
+        if cut.is_vertical():
+            offset = px - cut.x_int
+            on_cut = np.isclose(px, cut.x_int, atol=atol)
+        else:
+            line_y = px * cut.slope + cut.y_int
+            offset = py - line_y
+            on_cut = np.isclose(line_y, py, atol)
+        n_below += np.count_nonzero((offset < 0) & ~on_cut)
+        n_above += np.count_nonzero((offset > 0) & ~on_cut)
+    half = len(chunks) // 2
+    return n_below <= half and n_above <= half
+
+
+def _streaming_vertical_cut(
+    c1_chunks: CoordinateChunks, c2_chunks: CoordinateChunks, k: int
+) -> list[Line]:
+    # see ham_sandwich._vertical_cut
+    lower, upper = -np.inf, np.inf
+    for chunks in (c1_chunks, c2_chunks):
+        n = len(chunks)
+        xs, _ = _select_ranks(_chunk_xs, chunks, [(n - 1) // 2, n // 2], 0, k)
+        lower = max(lower, xs[0])
+        upper = min(upper, xs[1])
+    if lower > upper:
+        return []
+    return [Line(x_int=float(lower))]
+
+
+def get_streaming_ham_sandwich_cut(
+    c1_chunks: CoordinateChunks,
+    c2_chunks: CoordinateChunks,
+    k: int = DEFAULT_SKETCH_K,
+    max_steps: int = 40,
+    max_doublings: int = 64,
+) -> list[Line]:
+    """
+    Ham-sandwich cut of the points in c1_chunks and c2_chunks, without holding all of them in memory.
+    Each median level is evaluated with passes over the chunks and memory proportional to n / k, where
+    k is the size of the quantile sketch. The interval containing a crossing of the median levels is
+    halved max_steps times before solving for the cut, so more steps leave fewer candidate lines.
+    Unlike get_ham_sandwich_cut only one cut is returned even if there are several.
+    """
+    if len(c1_chunks) == 0 or len(c2_chunks) == 0:
+        raise ValueError("Both colors need at least one point!")
+    bracket = _streaming_bracket(c1_chunks, c2_chunks, k, max_doublings)
+    if bracket is None:
+        return _streaming_vertical_cut(c1_chunks, c2_chunks, k)
+    (left, right), left_sign = bracket
+    for _ in range(max_steps):
+        mid = (left + right) / 2.0
+        if not (left < mid < right):
+            break
+        if _streaming_level_sign(mid, c1_chunks, c2_chunks, k) != left_sign:
+            right = mid
+        else:
+            left = mid
+    interval = (left, right)
+    sketches = [
+        [_sketch(partial(_dual_levels, x), chunks, k) for x in interval]
+        for chunks in (c1_chunks, c2_chunks)
+    ]
+    margin = 2 * (len(c1_chunks) + len(c2_chunks)) // k + 1
+    while True:
+        duals = []
+        for chunks, c_sketches in zip((c1_chunks, c2_chunks), sketches):
+            candidates, n_below, n_above = _candidate_duals(
+                interval, chunks, c_sketches, margin
+            )
+            duals.append(_pad_candidates(interval, candidates, n_below, n_above))
+        for cut in median_intersection(interval, duals[0], duals[1]):
+            if _bisects(cut, c1_chunks) and _bisects(cut, c2_chunks):
+                return [cut]
+        if margin >= max(len(c1_chunks), len(c2_chunks)):
+            # already solved with every line
+            return []
+        margin *= 4
@@ -11,8 +11,11 @@ HAM_SANDWICH = "ham_sandwich"
 ITERATIVE_HAM_SANDWICH = "iterative_ham_sandwich"
 VISUALIZE_POINTS = "visualize_points"
 
-# color sampling methods
+# color sampling methods, see generators.py
 RANDOM = "random"
+CLUSTERED = "clustered"  # segregated clusters, each dominated by one color
+POPULATION_CENTERS = "population_centers"  # clusters around centers of varying population
+GRADIENT = "gradient"  # share of each color changes gradually across the domain
 
 # weighting
 WEIGHT_UNIFORM = "uniform"  # all weights the same
@@ -20,12 +23,35 @@ WEIGHT_MAJORITY = "majority"  # increase weight on subset of majority points to
 WEIGHT_POPULATION = (
     "population"  # treat given points as population centers and sample around them
 )
+# WEIGHT_POPULATION: mean population of a center, and spread (radius) of a center with the mean population
+POPULATION_MEAN = 100
+POPULATION_SPREAD = 0.05
+
+# subsampling methods
+SUBSAMPLE_RANDOM = "random"
+SUBSAMPLE_VORONOI = "voronoi"  # weighted sites of a voronoi diagram, see voronoi.py
+
+# weighting of voronoi sites
+VORONOI_WEIGHT_POPULATION = "population"  # number of points in the cell of the site
+VORONOI_WEIGHT_AREA = "area"  # area of the cell of the site
+
+# arithmetic used for computing cuts
+ARITHMETIC_AUTO = "auto"  # exact only if input is degenerate (e.g., shared x-coordinates)
+ARITHMETIC_FLOAT = "float"
+ARITHMETIC_EXACT = "exact"  # rational arithmetic
+ARITHMETIC_TO_EXACT = {ARITHMETIC_AUTO: None, ARITHMETIC_FLOAT: False, ARITHMETIC_EXACT: True}
+
+# rendering of point sets, see visualization.plot_point_set
+RENDER_AUTO = "auto"  # raster for large point sets, else scatter
+RENDER_SCATTER = "scatter"  # one marker per point
+RENDER_RASTER = "raster"  # density of each color binned into an image
+RENDER_RASTER_MIN_POINTS = 200_000  # point sets at least this large are rasterized by RENDER_AUTO
 
 # math
 EPSILON = np.finfo(np.float64).eps
 
 # define domain
-# be careful that points are in general position for small domain if using random sampling
+# points don't need to be in general position, degenerate cases are handled in ham_sandwich.py
 LOWER_X = -10.0
 UPPER_X = 10.0
 LOWER_Y = -10.0
@@ -0,0 +1,139 @@
+"""
+Description:
+Content-addressed on-disk cache for ham-sandwich cuts.
+
+Every node of the cut tree is keyed by a hash of the points in its region (plus any algorithm
+parameters), so the key does not depend on k, the seed or the position of the node in the tree.
+Running with a larger k (or re-running the same configuration) will therefore reuse every
+cut that was already computed for a shallower level.
+"""
+
+import hashlib
+import os
+import tempfile
+import zipfile
+from typing import Optional
+
+import numpy as np
+from shapely import get_coordinates
+
+from utils.geometry import Line, decode_lines, encode_lines
+
+# bump if the cut algorithm changes in a way that invalidates stored cuts
+CACHE_VERSION = 3
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+_ENTRY_EXT = ".npz"
+
+
+def hash_point_set(point_set, **params) -> str:
+    """
+    Get a hash of the points (per color) in point_set and the given algorithm parameters.
+    """
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_VERSION}".encode())
+    h.update(repr(sorted(params.items())).encode())
+    for color in sorted(point_set.color_sets):
+        coords = get_coordinates(list(point_set.color_sets[color])).astype(np.float64)
+        h.update(f"c{color}:{len(coords)}".encode())
+        h.update(np.ascontiguousarray(coords).tobytes())
+        if getattr(point_set, "multiplicities", None) is not None:
+            mults = np.asarray(point_set.multiplicities[color], dtype=np.int64)
+            h.update(b"m" + np.ascontiguousarray(mults).tobytes())
+    return h.hexdigest()
+
+
+class CutCache:
+    """
+    Directory of cut entries (.npz files of line coefficients, see encode_lines) with an LRU size cap.
+    Entry access times are tracked using the file modification times so the cache can be shared between
+    processes/runs. The size of the directory is tracked as entries are written and it is only scanned
+    (to evict entries) once that total crosses the cap, entries written by other processes are counted
+    at the next scan.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + _ENTRY_EXT)
+
+    def get(self, key: str) -> Optional[list[Line]]:
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                cuts = decode_lines(f["coefs"], f["exact_coefs"], f["exact"])
+        except (FileNotFoundError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            self.misses += 1
+            return None
+        # mark as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return cuts
+
+    def put(self, key: str, cuts: list[Line]):
+        path = self._path(key)
+        # write to a temp file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **encode_lines(cuts))
+        size = os.path.getsize(tmp_path)
+        try:
+            # replacing an existing entry
+            size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+        self.total_bytes += size
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _scan(self) -> list[tuple]:
+        # (modification time, size, path) of each entry
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(_ENTRY_EXT):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        self.total_bytes = total
+        if total <= self.max_bytes:
+            return
+        # least recently used first
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total_bytes = total
+
+    def get_cuts(self, point_set, cut_fn, **params) -> list[Line]:
+        """
+        Get the cuts for point_set from the cache, calling cut_fn(point_set) on a miss.
+        """
+        key = hash_point_set(point_set, **params)
+        cuts = self.get(key)
+        if cuts is None:
+            cuts = cut_fn(point_set)
+            self.put(key, cuts)
+        return cuts
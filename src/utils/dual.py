@@ -6,6 +6,7 @@ Description: Duality transforms
 
 from shapely import Point
 
+from utils.exact import to_fraction
 from utils.geometry import Line
 
 
@@ -35,3 +36,12 @@ def uw_dual_to_line(p: Point):
 
 def uw_dual_to_lines(ps: list[Point]):
     return list(map(uw_dual_to_line, ps))
+
+
+def uw_dual_to_exact_line(p: Point):
+    # same as uw_dual_to_line, but with rational coefficients
+    return Line(slope=to_fraction(p.x), y_int=-to_fraction(p.y))
+
+
+def uw_dual_to_exact_lines(ps: list[Point]):
+    return list(map(uw_dual_to_exact_line, ps))
@@ -0,0 +1,85 @@
+"""
+Description:
+Exact (rational) arithmetic and adaptive-precision predicates.
+
+Input coordinates are floats, and every float is exactly representable as a Fraction, so
+converting to Fractions loses nothing. The predicates below first evaluate in floating-point
+and only fall back to exact arithmetic when the result is within the rounding error bound,
+in the spirit of: https://www.cs.cmu.edu/~quake/robust.html
+"""
+
+from fractions import Fraction
+
+import numpy as np
+from shapely import get_coordinates
+
+# unit roundoff for float64 (2^-53)
+_U = np.finfo(np.float64).eps / 2
+# error bound for orient2d, see Shewchuk's ccwerrboundA
+_ORIENT_ERRBOUND = (3.0 + 16.0 * _U) * _U
+# conservative bound for the 3 floating-point operations in side_of_line
+_SIDE_ERRBOUND = (4.0 + 16.0 * _U) * _U
+
+
+def to_fraction(v) -> Fraction:
+    if isinstance(v, Fraction):
+        return v
+    return Fraction(float(v))
+
+
+def is_exact(v) -> bool:
+    return isinstance(v, Fraction)
+
+
+def _sign(v) -> int:
+    return int(v > 0) - int(v < 0)
+
+
+def orient2d(ax, ay, bx, by, cx, cy) -> int:
+    """
+    Return +1 if a, b, c are in counter-clockwise order, -1 if clockwise, 0 if collinear.
+    """
+    if not any(map(is_exact, (ax, ay, bx, by, cx, cy))):
+        detleft = (ax - cx) * (by - cy)
+        detright = (ay - cy) * (bx - cx)
+        det = detleft - detright
+        if abs(det) > _ORIENT_ERRBOUND * (abs(detleft) + abs(detright)):
+            return _sign(det)
+    ax, ay, bx, by, cx, cy = map(to_fraction, (ax, ay, bx, by, cx, cy))
+    return _sign((ax - cx) * (by - cy) - (ay - cy) * (bx - cx))
+
+
+def side_of_line(slope, y_int, x, y) -> int:
+    """
+    Return +1 if (x, y) is above the line y = slope * x + y_int, -1 if below, 0 if on it.
+    """
+    if not any(map(is_exact, (slope, y_int, x, y))):
+        sx = slope * x
+        d = y - (sx + y_int)
+        if abs(d) > _SIDE_ERRBOUND * (abs(sx) + abs(y_int) + abs(y)):
+            return _sign(d)
+    slope, y_int, x, y = map(to_fraction, (slope, y_int, x, y))
+    return _sign(y - (slope * x + y_int))
+
+
+def exact_median(vals: list):
+    # same convention as np.median (average of the middle values for even length)
+    vals = sorted(vals)
+    n = len(vals)
+    mid = n // 2
+    if n % 2 == 1:
+        return vals[mid]
+    return (vals[mid - 1] + vals[mid]) / 2
+
+
+def has_degenerate_duals(point_set) -> bool:
+    """
+    True if any two points share an x-coordinate (incl. duplicate points), i.e., some of the
+    dual lines are parallel. Grid-snapped data will typically hit this.
+    """
+    xs = [
+        get_coordinates(list(c_set))[:, 0]
+        for c_set in point_set.color_sets.values()
+    ]
+    xs = np.concatenate(xs) if len(xs) > 0 else np.empty(0)
+    return len(np.unique(xs)) < len(xs)
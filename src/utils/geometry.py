@@ -4,13 +4,15 @@ Date: 4/2/2024
 Description: Generic utilities
 """
 
+from fractions import Fraction
 from functools import cmp_to_key
 from typing import Union
 
 import numpy as np
-from shapely import LineString, Point, Polygon, intersection
+from shapely import LineString, Point, Polygon, dwithin, intersection, points
 
 from utils.constants import *
+from utils.exact import is_exact, orient2d, side_of_line
 
 
 class Line:
@@ -20,11 +22,19 @@ class Line:
         p2: Point = None,
         slope: float = None,
         y_int: float = None,
+        x_int: float = None,
     ) -> None:
         self.p1 = None
         self.p2 = None
         self.slope = None
         self.y_int = None
+        # only set for vertical lines (x = x_int)
+        self.x_int = None
+        if x_int is not None or (
+            p1 is not None and p2 is not None and slope is None and p1.x == p2.x
+        ):
+            self._init_vertical(p1, p2, x_int)
+            return
         if slope is not None and y_int is not None:
             self.slope = slope
             self.y_int = y_int
@@ -32,7 +42,6 @@ class Line:
             self.slope = slope
             self.p1 = p1
         elif p1 is not None and p2 is not None:
-            assert p1.x != p2.x
             self.p1 = p1
             self.p2 = p2
             self.slope = (self.p2.y - self.p1.y) / (self.p2.x - self.p1.x)
@@ -54,33 +63,122 @@ class Line:
 
         # need to cover entire domain for get_line_poly_intersection() to work
         # noticed that domain_lower must be < 0 and domain_upper_x > 0 -> why?
-        domain_lower_x = -abs(LOWER_X) - 10
-        domain_upper_x = abs(UPPER_X) + 10
-        lower_y = self.slope * (domain_lower_x) + self.y_int
-        upper_y = self.slope * (domain_upper_x) + self.y_int
-        self.lstring = LineString(
-            [(domain_lower_x, lower_y), (domain_upper_x, upper_y)]
-        )
+        self.lstring = self.get_lstring(-abs(LOWER_X) - 10, abs(UPPER_X) + 10)
+
+    def _init_vertical(self, p1: Point, p2: Point, x_int: float):
+        self.x_int = x_int if x_int is not None else p1.x
+        self.slope = np.inf
+        self.p1 = p1 if p1 is not None else Point(self.x_int, 0)
+        self.p2 = p2 if p2 is not None else Point(self.x_int, 1)
+        self.lstring = self.get_lstring(-abs(LOWER_Y) - 10, abs(UPPER_Y) + 10)
+
+    def get_lstring(self, lower: float, upper: float) -> LineString:
+        # segment of the line between x = lower and x = upper (y for vertical lines)
+        if self.is_vertical():
+            return LineString([(self.x_int, lower), (self.x_int, upper)])
+        lower_y = self.slope * (lower) + self.y_int
+        upper_y = self.slope * (upper) + self.y_int
+        return LineString([(lower, lower_y), (upper, upper_y)])
+
+    def is_vertical(self) -> bool:
+        return self.x_int is not None
 
     def get_y(self, x: float):
         return self.y_int + (x * self.slope)
 
     def __str__(self):
+        if self.is_vertical():
+            return f"Line(x_int={self.x_int})"
         return f"Line(slope={self.slope}, y_int={self.y_int})"
 
 
-def get_line_intersection(l1: Line, l2: Line) -> Union[None, Point]:
-    if np.isclose(l1.slope, l2.slope):
+def line_to_coefs(l: Line) -> tuple:
+    # compact (picklable) representation of a line, see line_from_coefs
+    return (l.slope, l.y_int, l.x_int)
+
+
+def line_from_coefs(coefs: tuple) -> Line:
+    slope, y_int, x_int = coefs
+    if x_int is not None:
+        return Line(x_int=x_int)
+    return Line(slope=slope, y_int=y_int)
+
+
+def encode_lines(lines: list[Line]) -> dict:
+    """
+    Arrays (e.g., for np.savez) of the (slope, y_int, x_int) of each line, see decode_lines.
+    Floats are stored as float64 and exact (rational) values as strings, so both are restored unchanged.
+    """
+    coefs = [(None, None, l.x_int) if l.is_vertical() else line_to_coefs(l) for l in lines]
+    exact = np.array([[is_exact(v) for v in c] for c in coefs], dtype=bool).reshape(-1, 3)
+    float_coefs = np.array(
+        [[np.nan if v is None or is_exact(v) else v for v in c] for c in coefs],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    exact_coefs = np.array(
+        [[str(v) if is_exact(v) else "" for v in c] for c in coefs], dtype=str
+    ).reshape(-1, 3)
+    return {"coefs": float_coefs, "exact_coefs": exact_coefs, "exact": exact}
+
+
+def decode_lines(
+    coefs: np.ndarray, exact_coefs: np.ndarray, exact: np.ndarray
+) -> list[Line]:
+    lines = []
+    for float_c, exact_c, exact_mask in zip(coefs, exact_coefs, exact):
+        c = [
+            Fraction(e) if is_e else (None if np.isnan(f) else float(f))
+            for f, e, is_e in zip(float_c, exact_c, exact_mask)
+        ]
+        lines.append(line_from_coefs(tuple(c)))
+    return lines
+
+
+def _is_exact_line(l: Line) -> bool:
+    # lines with rational coefficients come from exact arithmetic mode
+    return is_exact(l.slope) and is_exact(l.y_int)
+
+
+def get_line_intersection_x(l1: Line, l2: Line):
+    """
+    Get the x-coordinate of the intersection of l1 and l2 (None if parallel).
+    Result is exact if both lines are exact.
+    """
+    if l1.is_vertical() or l2.is_vertical():
+        if l1.is_vertical() and l2.is_vertical():
+            return None
+        return l1.x_int if l1.is_vertical() else l2.x_int
+    if _is_exact_line(l1) and _is_exact_line(l2):
+        if l1.slope == l2.slope:
+            return None
+    elif np.isclose(l1.slope, l2.slope):
         # limitations of floating-point precision could cause incorrect results in extreme cases,
         # but not a problem practically-speaking
         return None
-    x = (l2.y_int - l1.y_int) / (l1.slope - l2.slope)
-    y = l1.slope * x + l1.y_int
+    return (l2.y_int - l1.y_int) / (l1.slope - l2.slope)
+
+
+def get_line_intersection(l1: Line, l2: Line) -> Union[None, Point]:
+    x = get_line_intersection_x(l1, l2)
+    if x is None:
+        return None
+    y = l2.get_y(x) if l1.is_vertical() else l1.get_y(x)
     return Point(x, y)
 
 
 def get_line_poly_intersection(l: Line, poly: Polygon):
-    coords = intersection(poly, l.lstring).coords
+    lstring = l.lstring
+    lower_x, lower_y, upper_x, upper_y = poly.bounds
+    if l.is_vertical():
+        lower, upper = lower_y, upper_y
+        domain_lower, domain_upper = -abs(LOWER_Y) - 10, abs(UPPER_Y) + 10
+    else:
+        lower, upper = lower_x, upper_x
+        domain_lower, domain_upper = -abs(LOWER_X) - 10, abs(UPPER_X) + 10
+    if lower < domain_lower or upper > domain_upper:
+        # poly is (partly) outside of the default domain (see ColorPointSet bounds)
+        lstring = l.get_lstring(min(lower, domain_lower) - 10, max(upper, domain_upper) + 10)
+    coords = intersection(poly, lstring).coords
     return list(map(Point, coords))
 
 
@@ -109,6 +207,16 @@ def get_points_inside(ps: list[Point], poly: Polygon) -> list[Point]:
     return [p for p in ps if (poly.contains(p))]
 
 
+def get_points_near(ps: list[Point], poly: Polygon, atol: float = 1e-8) -> list[Point]:
+    """
+    Get the subset of ps which are inside poly or within atol of its boundary
+    """
+    if len(ps) == 0:
+        return []
+    near = dwithin(poly, np.asarray(ps, dtype=object), atol)
+    return [p for p, is_near in zip(ps, near) if is_near]
+
+
 def get_rectangular_region(
     lower_x: float, upper_x: float, lower_y: float, upper_y: float
 ) -> Polygon:
@@ -127,6 +235,13 @@ def get_rectangular_region(
 
 
 def _on_line(p: Point, line: Line, atol: float = 1e-8):
+    if line.is_vertical():
+        if is_exact(line.x_int):
+            return line.x_int == p.x
+        return np.isclose(p.x, line.x_int, atol=atol)
+    if _is_exact_line(line):
+        # no tolerance needed for exact lines
+        return side_of_line(line.slope, line.y_int, p.x, p.y) == 0
     return np.isclose((p.x * line.slope + line.y_int), p.y, atol)
 
 
@@ -147,7 +262,7 @@ def get_points_near_cuts(points: list, cuts: list, atol: float):
 
 
 def xy_to_points(x: np.ndarray, y: np.ndarray) -> list[Point]:
-    return np.array(list(map(lambda coords: Point(*coords), zip(x, y))))
+    return points(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
 
 
 def clockwise_compare(p1: Point, p2: Point, center: Point) -> int:
@@ -160,12 +275,13 @@ def clockwise_compare(p1: Point, p2: Point, center: Point) -> int:
     if (p1.x - center.x) < 0 and (p2.x - center.x >= 0):
         return -1
     if (p1.x - center.x) == 0 and (p2.x - center.x) == 0:
+        # both points directly above/below the center
         if (p1.y - center.y) >= 0 or (p2.y - center.y) >= 0:
-            return p1.y > p2.y
-        return p2.y > p1.y
+            return 1 if p1.y > p2.y else -1
+        return 1 if p2.y > p1.y else -1
 
-    # compute the cross product of vectors (center -> p1) x (center -> p2)
-    det = (p1.x - center.x) * (p2.y - center.y) - (p2.x - center.x) * (p1.y - center.y)
+    # sign of the cross product of vectors (center -> p1) x (center -> p2)
+    det = orient2d(p1.x, p1.y, p2.x, p2.y, center.x, center.y)
     if det < 0:
         return 1
     if det > 0:
@@ -0,0 +1,77 @@
+"""
+Description:
+Mergeable quantile sketch, used to estimate median levels in one streaming pass.
+Based on: Karnin, Lang, Liberty. Optimal Quantile Approximation in Streams (https://arxiv.org/abs/1603.05346)
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+class KLLSketch:
+    """
+    KLL sketch of a stream of values. The rank of any value is estimated to within about 2n/k
+    (with high probability) using O(k) memory. Sketches of different parts of a stream can be merged.
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None) -> None:
+        self.k = k
+        self.n = 0
+        # items at level h each stand for 2^h values of the stream
+        self.compactors = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.compactors):
+            items = self.compactors[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+                items = np.sort(items)
+                # with an odd number of items the largest stays at this level
+                n_kept = len(items) % 2
+                promoted = items[self.rng.integers(2) : len(items) - n_kept : 2]
+                self.compactors[level] = items[len(items) - n_kept :]
+                self.compactors[level + 1] = np.concatenate(
+                    (self.compactors[level + 1], promoted)
+                )
+            level += 1
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.n += len(values)
+        self.compactors[0] = np.concatenate((self.compactors[0], values))
+        self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        for level, items in enumerate(other.compactors):
+            if level == len(self.compactors):
+                self.compactors.append(np.empty(0))
+            self.compactors[level] = np.concatenate((self.compactors[level], items))
+        self.n += other.n
+        self._compress()
+
+    def rank_value(self, rank: float) -> float:
+        """
+        Estimate of the value with the given rank (0 is the smallest value of the stream).
+        """
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate(
+            [np.full(len(c), 2**level) for level, c in enumerate(self.compactors)]
+        )
+        order = np.argsort(items, kind="stable")
+        cum_weights = np.cumsum(weights[order])
+        i = np.searchsorted(cum_weights, rank, side="right")
+        return items[order[min(i, len(items) - 1)]]
+
+    def quantile(self, q: float) -> float:
+        return self.rank_value(q * (self.n - 1))
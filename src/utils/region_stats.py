@@ -3,56 +3,128 @@
 Date: 4/29/2024
 Description:
 Code for calculating statistics of regions.
+
+The points of all regions are flattened into label/color/weight arrays so the statistics of every region
+are found with a single np.bincount over (region, color) keys.
 """
 
+from typing import NamedTuple, Optional
 
-def get_sub_color_set(cset: dict, cset_query: dict, exclude_pts: list):
-    final_set = {}
-    for color in cset.keys():
-        sub_cset = cset[color]
-        sub_query_cset = cset_query[color]
-        for p in sub_query_cset:
-            if any(
-                p.equals_exact(p_prime, tolerance=1e-8) for p_prime in sub_cset
-            ) and not (
-                any(p.equals_exact(p_prime, tolerance=1e-8) for p_prime in exclude_pts)
-            ):
-                final_set[color] = final_set.get(color, []) + [p]
-    return final_set
+import numpy as np
+from shapely import STRtree, get_coordinates, points
 
 
-def get_original_pts(og_point_set, color_sets: dict, points_on_cuts=None):
-    if points_on_cuts is None:
-        points_on_cuts = []
-    og_cset = get_sub_color_set(og_point_set.og_color_sets, color_sets, points_on_cuts)
-    return og_cset
+class RegionStats(NamedTuple):
+    """
+    Statistics of regions, see get_region_stats. Row i is region i, column c is color c.
+    """
 
+    # number of points (rows of the label array)
+    counts: np.ndarray
+    # sum of the weights of the points
+    populations: np.ndarray
+    # color with the largest population, -1 if there is a tie
+    majority: np.ndarray
+    # population of the majority color minus the population of the runner-up
+    margin: np.ndarray
 
-def get_majority_color(og_point_set, points_on_cuts, point_set, exclude_weights: bool):
-    cset = point_set.color_sets
-    if exclude_weights:
-        cset = get_original_pts(og_point_set, cset, points_on_cuts)
-    color_sizes = {k: len(cset[k]) for k in cset}
-    first_majority = max(color_sizes, key=color_sizes.get)
-    # check for tie
-    first_size = color_sizes[first_majority]
-    color_sizes[first_majority] = -1
-    second_majority = max(color_sizes, key=color_sizes.get)
-    if first_size == color_sizes[second_majority]:
-        return -1  # no majority
-    return first_majority
+
+def get_region_stats(
+    labels: np.ndarray,
+    colors: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+    n_regions: Optional[int] = None,
+    n_colors: Optional[int] = None,
+) -> RegionStats:
+    """
+    Statistics of all regions at once, where point i is in region labels[i], has color colors[i] and
+    weight weights[i] (default 1). Points with a negative label are ignored.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    colors = np.asarray(colors, dtype=np.int64)
+    if n_regions is None:
+        n_regions = int(labels.max()) + 1 if len(labels) > 0 else 0
+    if n_colors is None:
+        n_colors = int(colors.max()) + 1 if len(colors) > 0 else 0
+    keep = labels >= 0
+    # one bin per (region, color) pair
+    keys = labels[keep] * n_colors + colors[keep]
+    size = n_regions * n_colors
+    counts = np.bincount(keys, minlength=size).reshape(n_regions, n_colors)
+    if weights is None:
+        populations = counts
+    else:
+        populations = np.bincount(
+            keys, weights=np.asarray(weights)[keep], minlength=size
+        ).reshape(n_regions, n_colors)
+    # compare the two largest populations, a single color is compared to 0
+    padded = np.column_stack((populations, np.zeros(n_regions)))
+    top_two = -np.partition(-padded, 1, axis=1)[:, :2]
+    majority = np.argmax(populations, axis=1) if n_colors > 0 else np.zeros(n_regions)
+    majority = np.where(top_two[:, 0] == top_two[:, 1], -1, majority).astype(int)
+    return RegionStats(counts, populations, majority, top_two[:, 0] - top_two[:, 1])
+
+
+def get_region_labels(point_sets: list) -> tuple:
+    """
+    Flatten regions into (labels, colors, weights, xy) arrays for get_region_stats, where the weights are the
+    multiplicities of the points (see ColorPointSet.multiplicities) and xy their coordinates.
+    """
+    labels, colors, weights, xy = [], [], [], []
+    for i, p_s in enumerate(point_sets):
+        for c, c_points in p_s.color_sets.items():
+            labels.append(np.full(len(c_points), i))
+            colors.append(np.full(len(c_points), c))
+            if p_s.multiplicities is not None:
+                weights.append(p_s.multiplicities[c])
+            else:
+                weights.append(np.ones(len(c_points), dtype=int))
+            xy.append(get_coordinates(list(c_points)).reshape(-1, 2))
+    if len(labels) == 0:
+        return (np.empty(0, dtype=int),) * 3 + (np.empty((0, 2)),)
+    return (
+        np.concatenate(labels).astype(np.int64),
+        np.concatenate(colors).astype(np.int64),
+        np.concatenate(weights),
+        np.concatenate(xy),
+    )
+
+
+def _near(xy: np.ndarray, query_points: list, atol: float = 1e-8) -> np.ndarray:
+    # mask of the coordinates xy within atol of any of query_points
+    near = np.zeros(len(xy), dtype=bool)
+    if len(xy) > 0 and len(query_points) > 0:
+        tree = STRtree(np.asarray(list(query_points), dtype=object))
+        idx, _ = tree.query(points(xy), predicate="dwithin", distance=atol)
+        near[idx] = True
+    return near
 
 
 def get_region_majorities(
     og_point_set, points_on_cuts: list, point_sets: list, exclude_weights: bool
 ):
-    # regions: list[ColorPointSet]
-    majorities = list(
-        map(
-            lambda p_set: get_majority_color(
-                og_point_set, points_on_cuts, p_set, exclude_weights
-            ),
-            point_sets,
-        )
-    )
-    return majorities
+    """
+    Majority color of each region (-1 if there is a tie) by population, i.e. points are counted with their
+    multiplicities. If exclude_weights, only the original points of og_point_set (see ColorPointSet._cluster)
+    that are not on a cut are counted.
+    """
+    labels, colors, weights, xy = get_region_labels(point_sets)
+    if exclude_weights:
+        original = np.zeros(len(labels), dtype=bool)
+        for c, c_points in og_point_set.og_color_sets.items():
+            is_c = colors == c
+            original[is_c] = _near(xy[is_c], c_points)
+        labels = np.where(original & ~_near(xy, points_on_cuts), labels, -1)
+    n_colors = max((max(p_s.color_sets) + 1 for p_s in point_sets), default=0)
+    stats = get_region_stats(labels, colors, weights, len(point_sets), n_colors)
+    return stats.majority.tolist()
+
+
+def get_region_color_counts(point_sets: list) -> np.ndarray:
+    """
+    counts[i, c] = number of points of color c in point_sets[i] (including multiplicities)
+    """
+    labels, colors, weights, _ = get_region_labels(point_sets)
+    n_colors = max((max(p_s.color_sets) + 1 for p_s in point_sets), default=0)
+    stats = get_region_stats(labels, colors, weights, len(point_sets), n_colors)
+    return stats.populations.astype(int)
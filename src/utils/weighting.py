@@ -37,3 +37,14 @@ def get_biased_weights_random(
     # our workaround implementation of weighted cuts want to avoid excess weight
     weights[chosen_indices] = points_per_color[majority_color]
     return weights
+
+
+def get_population_weights(
+    n_points: int, mean_population: float, sigma: float = 1.0
+) -> np.ndarray:
+    """
+    Log-normal (integer) populations with the given mean, each point has a population of at least 1.
+    """
+    mu = np.log(mean_population) - sigma**2 / 2
+    populations = np.rint(np.random.lognormal(mu, sigma, n_points)).astype(int)
+    return np.maximum(populations, 1)
@@ -4,12 +4,30 @@ Date: 3/31/2024
 Description: Methods for visualizing colored point sets
 """
 
+from typing import Optional
+
 import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection
 
+from cut_export import get_level_colors, segments_to_array
+from utils.constants import (
+    LOWER_X,
+    LOWER_Y,
+    RENDER_AUTO,
+    RENDER_RASTER,
+    RENDER_RASTER_MIN_POINTS,
+    RENDER_SCATTER,
+    UPPER_X,
+    UPPER_Y,
+    WEIGHT_POPULATION,
+)
 from utils.geometry import Line
 
+# number of points binned at once when rasterizing, bounds the memory used for large point sets
+_RASTER_CHUNK_SIZE = 1_000_000
+
 
 def _save_show(show: bool, save_path):
     if save_path is not None:
@@ -18,54 +36,131 @@ def _save_show(show: bool, save_path):
         plt.show()
 
 
+def _full_lines_to_array(lines, bounds: Optional[tuple] = None) -> np.ndarray:
+    """
+    Endpoints of each line extended beyond bounds = (lower_x, upper_x, lower_y, upper_y), which defaults to
+    the domain in utils/constants.py (then the same as Line.lstring).
+    """
+    if bounds is None:
+        bounds = (LOWER_X, UPPER_X, LOWER_Y, UPPER_Y)
+    lower_x, upper_x, lower_y, upper_y = bounds
+    ends_x = np.array([-abs(lower_x) - 10, abs(upper_x) + 10])
+    ends_y = np.array([-abs(lower_y) - 10, abs(upper_y) + 10])
+    if not isinstance(lines, np.ndarray):
+        return np.array(
+            [l.get_lstring(*(ends_y if l.is_vertical() else ends_x)).coords for l in lines],
+            dtype=np.float64,
+        ).reshape(-1, 2, 2)
+    segments = segments_to_array(lines)
+    (x1, y1), (x2, y2) = segments[:, 0].T, segments[:, 1].T
+    vertical = x1 == x2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (y2 - y1) / (x2 - x1)
+    full_x = np.where(vertical[:, None], x1[:, None], ends_x)
+    full_y = np.where(
+        vertical[:, None], ends_y, y1[:, None] + slope[:, None] * (ends_x - x1[:, None])
+    )
+    return np.stack((full_x, full_y), axis=-1)
+
+
 def plot_lines(
     lines: list[Line],
     show: bool = True,
     save_path=None,
     color: str = "r",
+    bounds: Optional[tuple] = None,
 ):
-    for l in lines:
-        x1, y1 = l.p1.x, l.p1.y
-        x2, y2 = l.p2.x, l.p2.y
-        plt.axline((x1, y1), (x2, y2), color=color)
+    # extended lines are drawn without changing the axis limits, like plt.axline
+    # bounds is the domain the lines must cover, see _full_lines_to_array
+    collection = LineCollection(_full_lines_to_array(lines, bounds), colors=color)
+    plt.gca().add_collection(collection, autolim=False)
     _save_show(show, save_path)
 
 
 def plot_k_cuts(
-    cut_lines: dict[int, Line],
+    cut_lines: dict,
     k: int,
     segments_only: bool = False,
     show: bool = True,
     save_path=None,
     colors: list[str] = None,
     labels: list[str] = None,
+    bounds: Optional[tuple] = None,
 ):
+    """
+    Plot the cuts of each level (cut_lines[level] is a list of Line or an (n, 2, 2) array of segments,
+    see segments_to_array) as a single collection per level. If not segments_only, the full lines are drawn
+    across bounds (see _full_lines_to_array).
+    """
     if colors is None:
-        # want to show each level in diff color, use a continuous colorspace
-        cmap = plt.cm.get_cmap("winter")
-        cmap_colors = [cmap(i) for i in np.linspace(0, 1, k)]
-        colors = cmap_colors[:k]
+        colors = get_level_colors(k)
         labels = np.arange(1, k + 1)
+    ax = plt.gca()
     for level in cut_lines.keys():
-        first_l = True  # needed because matplotlib can't identify unique labels
-        for line in cut_lines[level]:
-            x1, y1 = line.p1.x, line.p1.y
-            x2, y2 = line.p2.x, line.p2.y
-            if labels is not None and first_l:
-                label = labels[level]
-                first_l = False
-            else:
-                label = None
-            if segments_only:
-                plt.plot([x1, x2], [y1, y2], color=colors[level], label=label)
-            else:
-                plt.axline((x1, y1), (x2, y2), color=colors[level], label=label)
+        if len(cut_lines[level]) == 0:
+            continue
+        label = labels[level] if labels is not None else None
+        if segments_only:
+            collection = LineCollection(
+                segments_to_array(cut_lines[level]), colors=colors[level], label=label
+            )
+            ax.add_collection(collection)
+        else:
+            collection = LineCollection(
+                _full_lines_to_array(cut_lines[level], bounds),
+                colors=colors[level],
+                label=label,
+            )
+            ax.add_collection(collection, autolim=False)
+    ax.autoscale_view()
     if labels is not None:
         plt.legend(title="Cut Level", bbox_to_anchor=(1, 0.5), loc="center left")
         plt.tight_layout()
     _save_show(show, save_path)
 
 
+def get_density_raster(
+    x: np.ndarray,
+    y: np.ndarray,
+    colors: np.ndarray,
+    n_colors: int,
+    bounds: tuple,
+    resolution: int = 1024,
+) -> np.ndarray:
+    """
+    counts[c, i, j] = number of points of color c in pixel (row i, column j) of a resolution x resolution
+    grid over bounds = (lower_x, upper_x, lower_y, upper_y), row 0 is at lower_y.
+    """
+    lower_x, upper_x, lower_y, upper_y = bounds
+    counts = np.zeros(n_colors * resolution * resolution, dtype=np.int64)
+    for start in range(0, len(x), _RASTER_CHUNK_SIZE):
+        end = start + _RASTER_CHUNK_SIZE
+        col = (x[start:end] - lower_x) / (upper_x - lower_x) * resolution
+        row = (y[start:end] - lower_y) / (upper_y - lower_y) * resolution
+        col = np.clip(col.astype(np.int64), 0, resolution - 1)
+        row = np.clip(row.astype(np.int64), 0, resolution - 1)
+        keys = (colors[start:end] * resolution + row) * resolution + col
+        counts += np.bincount(keys, minlength=len(counts))
+    return counts.reshape(n_colors, resolution, resolution)
+
+
+def shade_density_raster(counts: np.ndarray, color_names: list) -> np.ndarray:
+    """
+    RGBA image of a density raster (see get_density_raster). The color of a pixel is the mix of the colors
+    of its points, its opacity grows with the log of its number of points (empty pixels are transparent).
+    """
+    rgb = np.array([mcolors.to_rgb(name) for name in color_names])
+    total = counts.sum(axis=0)
+    image = np.zeros(total.shape + (4,))
+    filled = total > 0
+    image[..., :3] = np.einsum("cij,cd->ijd", counts, rgb)
+    image[filled, :3] /= total[filled, None]
+    # keep single points visible next to dense pixels
+    density = np.log1p(total) / np.log1p(max(int(total.max()), 1))
+    image[..., 3] = np.where(filled, 0.25 + 0.75 * density, 0)
+    return image
+
+
 def plot_point_set(
     point_set,
     show: bool = True,
@@ -74,23 +169,64 @@ def plot_point_set(
     plot_bbox: bool = False,
     hide_ticks: bool = False,
     hide_weighted_pts: bool = False,
+    render: str = RENDER_AUTO,
+    raster_resolution: int = 1024,
+    sample_population: bool = True,
+    max_population_points: int = 1_000_000,
 ):
+    """
+    Plot the points of point_set colored by color. Points are drawn as markers (render=scatter) or binned
+    into a density image (render=raster), which is much faster and smaller for large point sets but does
+    not mark the special_indices. render=auto rasterizes point sets with at least RENDER_RASTER_MIN_POINTS.
+    If sample_population, the population centers of a WEIGHT_POPULATION point set are replaced by (up to
+    max_population_points of) their individual points, which are only sampled here (special_indices are ignored).
+    """
     cmap = list(mcolors.TABLEAU_COLORS.keys())
     if point_set.n_colors > len(cmap):
         raise NotImplementedError(
             f"Don't currently support visualizing more than {len(cmap)} colors"
         )
-    colors = np.array([cmap[c] for c in point_set.colors])
-    # use opacity to mark special points (e.g., those on a cut-line)
-    alpha_vals = np.ones(len(colors))
-    if special_indices is not None and len(special_indices) > 0:
-        alpha_vals[special_indices] = 0.5
-    pts_x, pts_y = point_set.x, point_set.y
+    pts_x, pts_y, pt_colors = point_set.x, point_set.y, point_set.colors
+    is_weight = point_set.is_weight
+    if sample_population and point_set.weighting_method == WEIGHT_POPULATION:
+        pts_x, pts_y, pt_colors = point_set.sample_population(max_population_points)
+        is_weight = np.zeros(len(pts_x), dtype="bool")
+        special_indices = None
+    if render == RENDER_AUTO:
+        large = len(pts_x) >= RENDER_RASTER_MIN_POINTS
+        render = RENDER_RASTER if large else RENDER_SCATTER
+    all_colors = pt_colors
     if hide_weighted_pts:
-        pts_x, pts_y = pts_x[~point_set.is_weight], pts_y[~point_set.is_weight]
-        colors = colors[~point_set.is_weight]
-        alpha_vals = alpha_vals[~point_set.is_weight]
-    plt.scatter(pts_x, pts_y, c=colors, alpha=alpha_vals)
+        pts_x, pts_y, pt_colors = pts_x[~is_weight], pts_y[~is_weight], pt_colors[~is_weight]
+    if render == RENDER_RASTER:
+        bounds = (
+            point_set.lower_x,
+            point_set.upper_x,
+            point_set.lower_y,
+            point_set.upper_y,
+        )
+        counts = get_density_raster(
+            pts_x, pts_y, pt_colors, point_set.n_colors, bounds, raster_resolution
+        )
+        plt.imshow(
+            shade_density_raster(counts, cmap[: point_set.n_colors]),
+            extent=bounds,
+            origin="lower",
+            interpolation="nearest",
+            zorder=0,
+        )
+    elif render == RENDER_SCATTER:
+        colors = np.array([cmap[c] for c in all_colors])
+        # use opacity to mark special points (e.g., those on a cut-line)
+        alpha_vals = np.ones(len(colors))
+        if special_indices is not None and len(special_indices) > 0:
+            alpha_vals[special_indices] = 0.5
+        if hide_weighted_pts:
+            colors = colors[~is_weight]
+            alpha_vals = alpha_vals[~is_weight]
+        plt.scatter(pts_x, pts_y, c=colors, alpha=alpha_vals)
+    else:
+        raise NotImplementedError(f"Given render method not supported: {render}")
     if plot_bbox:
         plt.gca().add_patch(
             plt.Rectangle(
@@ -3,43 +3,104 @@
 Date: 4/13/2024
 Description:
 Jack's idea for voronoi sampling
+
+Instead of subsampling points uniformly at random (see point_set.subsample), a random subset of each color
+is used as the sites of a Voronoi diagram and every site stands for the points of its cell. The sites are
+weighted either by the number of points in their cell (population) or by the area of their cell, and are
+returned as a Coreset (see coreset.py) so the cuts can be computed on the weighted sites.
+A site on a cut has its weight split between the regions on both sides, see iterative_ham._get_new_point_sets.
 """
 
 import numpy as np
-from shapely import MultiPoint, Point, normalize
-from shapely.ops import voronoi_diagram
-
-from utils.constants import PERTURB_MAX
+from shapely import (
+    MultiPoint,
+    Polygon,
+    STRtree,
+    area,
+    get_coordinates,
+    get_parts,
+    intersection,
+    points,
+    voronoi_polygons,
+)
 
+from coreset import Coreset
 from point_set import ColorPointSet
-from utils.dual import uw_dual_to_lines
-from utils.geometry import Line, get_line_intersection
-
-def get_voronoi_sample(point_set: ColorPointSet):
-    #points = MultiPoint(point_set.x.ravel(),point_set.y.ravel())
-
-    points = [(x, y) for x, y in zip(point_set.x, point_set.y)]
-
-    regions = voronoi_diagram(MultiPoint(points))
-    v_polygons = list(regions.geoms)
-    lines = polygons_to_lines(polygons=v_polygons)
-    return (point_set, lines)
-
-
-def polygons_to_lines(polygons):
-    lines = []
-    for polygon in polygons:
-        exterior_coords = list(polygon.exterior.coords)
-        for i in range(len(exterior_coords) - 1):
-            p1 = exterior_coords[i]
-            p2 = exterior_coords[i + 1]
-            lines.append(Line(p1=perturb_point(p1), p2=perturb_point(p2)))
-    return lines
-
-def perturb_point(point : tuple):    
-    point_array = np.array(point)
-    
-    displacements = np.random.uniform(-PERTURB_MAX, PERTURB_MAX, size=point_array.shape)
-    perturbed_point_array = point_array + displacements 
-    
-    return Point(perturbed_point_array)
+from utils.constants import VORONOI_WEIGHT_AREA, VORONOI_WEIGHT_POPULATION
+from utils.geometry import get_rectangular_region, xy_to_points
+
+
+def get_voronoi_cells(sites: np.ndarray, domain: Polygon) -> np.ndarray:
+    """
+    Get the Voronoi cell (clipped to domain) of each of the (distinct) sites, in the same order as sites.
+    """
+    if len(sites) == 1:
+        return np.array([domain])
+    cells = get_parts(voronoi_polygons(MultiPoint(sites), extend_to=domain))
+    # the diagram is not ordered like its input, but each site is inside of its own cell
+    site_idx, cell_idx = STRtree(cells).query(points(sites), predicate="within")
+    ordered = np.empty(len(sites), dtype=object)
+    ordered[site_idx] = cells[cell_idx]
+    return intersection(ordered, domain)
+
+
+def _site_owners(xy: np.ndarray, sites: np.ndarray) -> np.ndarray:
+    # index of the nearest site (i.e., the Voronoi cell) of each point
+    point_idx, site_idx = STRtree(points(sites)).query_nearest(points(xy))
+    owners = np.empty(len(xy), dtype=int)
+    owners[point_idx] = site_idx
+    return owners
+
+
+def get_voronoi_sample(
+    point_set: ColorPointSet,
+    ratio: float,
+    weight_by: str = VORONOI_WEIGHT_POPULATION,
+) -> Coreset:
+    """
+    Sample floor(ratio * n) points of each color (at least one) as Voronoi sites. The multiplicity of a site is the
+    number of points of its color in its cell (weight_by=population) or proportional to the area of its cell
+    (weight_by=area, scaled so the multiplicities add up to about n). Points are counted with their multiplicities.
+    """
+    if weight_by not in (VORONOI_WEIGHT_AREA, VORONOI_WEIGHT_POPULATION):
+        raise NotImplementedError(f"Given voronoi weighting not supported: {weight_by}")
+    domain = get_rectangular_region(
+        point_set.lower_x, point_set.upper_x, point_set.lower_y, point_set.upper_y
+    )
+    color_sets = {}
+    original_sets = {}
+    members = {}
+    multiplicities = {}
+    max_error = 0.0
+    for c, c_points in point_set.color_sets.items():
+        original_sets[c] = np.array(list(c_points), dtype=object)
+        xy = get_coordinates(list(c_points)).reshape(-1, 2)
+        if len(xy) == 0:
+            color_sets[c], members[c] = [], []
+            multiplicities[c] = np.empty(0, dtype=int)
+            continue
+        n_sites = max(int(np.floor(ratio * len(xy))), 1)
+        site_idx = np.random.choice(len(xy), size=n_sites, replace=False)
+        sites = np.unique(xy[site_idx], axis=0)
+        owners = _site_owners(xy, sites)
+        counts = np.bincount(owners, minlength=len(sites))
+        members[c] = np.split(np.argsort(owners, kind="stable"), np.cumsum(counts)[:-1])
+        mults = np.ones(len(xy), dtype=int)
+        if point_set.multiplicities is not None:
+            mults = point_set.multiplicities[c]
+        if weight_by == VORONOI_WEIGHT_AREA:
+            cell_areas = area(get_voronoi_cells(sites, domain))
+            scaled = np.rint(np.sum(mults) * cell_areas / np.sum(cell_areas))
+            multiplicities[c] = np.maximum(scaled, 1).astype(int)
+        else:
+            multiplicities[c] = np.bincount(
+                owners, weights=mults, minlength=len(sites)
+            ).astype(int)
+        max_error = max(max_error, float(np.max(np.hypot(*(xy - sites[owners]).T))))
+        color_sets[c] = list(xy_to_points(sites[:, 0], sites[:, 1]))
+    sample = ColorPointSet(
+        color_sets=color_sets, defining_poly=domain, multiplicities=multiplicities
+    )
+    return Coreset(
+        sample, original_sets, members, max_error, point_set.multiplicities
+    )